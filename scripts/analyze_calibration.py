@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Анализ качества калибровки: ошибка скользящего контроля (leave-one-out)
+каждой точки, выбросы (в том числе перепутанные местами google/yandex),
+дубликаты и сводка ошибок по районам.
+
+    python scripts/analyze_calibration.py                  # data/calibration.json
+    python scripts/analyze_calibration.py --size 100000 --neighbors 16 -o quality.json
+    python scripts/analyze_calibration.py --fail-on-outliers   # код 1, если есть выбросы
+    python scripts/analyze_calibration.py --compare quality.json   # код 1 при ухудшении
+
+С --compare сводка сравнивается с прошлым отчётом: ухудшением считается рост
+ошибки (RMS, p90) или времени анализа больше --threshold, а также новые
+выбросы, дубликаты и повторы. --max-rms-m — абсолютный порог ошибки.
+
+Без --size берётся калибровочный файл (--calibration), с --size — синтетический
+набор из scripts/benchmark.py. Ошибки на карте: scripts/generate_map.py --quality.
+"""
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from benchmark import make_training_data  # noqa: E402
+from gootoya.core import load_training_data  # noqa: E402
+from gootoya.quality import QUALITY_NEIGHBORS, analyze  # noqa: E402
+
+DEFAULT_CALIBRATION = Path(__file__).resolve().parent.parent / 'data' / 'calibration.json'
+
+# Сколько выбросов, дубликатов и районов печатать в таблицах
+TABLE_LIMIT = 20
+
+REASONS = {"swapped": "перепутаны google/yandex", "error": "большая ошибка"}
+
+# Ошибки, сравниваемые с прошлым отчётом (рост больше threshold), и счётчики (любой рост)
+COMPARED_ERRORS = ('rms_m', 'p90_m')
+COMPARED_COUNTS = ('outliers', 'duplicates', 'repeated')
+
+# Время анализа сравнивается, только если прошлый анализ шёл не меньше стольких секунд
+MIN_COMPARED_ELAPSED_S = 1.0
+
+
+def compare(summary, baseline_path, threshold):
+    """Сравнивает сводку с прошлым отчётом; возвращает число ухудшений."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['summary']
+    regressions = 0
+    print(f"Сравнение с {baseline_path}:", file=sys.stderr)
+    keys = list(COMPARED_ERRORS)
+    if baseline.get('elapsed_s', 0) >= MIN_COMPARED_ELAPSED_S:
+        keys.append('elapsed_s')
+    for key in keys:
+        prev, value = baseline.get(key), summary[key]
+        if prev is None:
+            continue
+        ratio = value / prev if prev else (1.0 if not value else math.inf)
+        mark = "  ✗ ухудшение" if ratio > 1 + threshold else ""
+        regressions += bool(mark)
+        print(f"  {key:<12} {prev} → {value}  ×{ratio:.2f}{mark}", file=sys.stderr)
+    for key in COMPARED_COUNTS:
+        prev, value = baseline.get(key), summary[key]
+        if prev is None:
+            continue
+        mark = "  ✗ ухудшение" if value > prev else ""
+        regressions += bool(mark)
+        print(f"  {key:<12} {prev} → {value}{mark}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Анализ качества калибровки")
+    parser.add_argument('--calibration', default=str(DEFAULT_CALIBRATION),
+                        help="калибровочный файл (если не задан --size)")
+    parser.add_argument('--size', type=int, help="синтетический набор этого размера")
+    parser.add_argument('--neighbors', type=int, default=QUALITY_NEIGHBORS,
+                        help="k ближайших точек IDW (0 — все точки)")
+    parser.add_argument('--max-radius-km', type=float, help="радиус IDW (км)")
+    parser.add_argument('--all-points', action='store_true',
+                        help="все точки в JSON (по умолчанию только выбросы)")
+    parser.add_argument('--fail-on-outliers', action='store_true',
+                        help="код возврата 1, если найдены выбросы или дубликаты")
+    parser.add_argument('--max-rms-m', type=float,
+                        help="код возврата 1, если RMS скользящего контроля больше (м)")
+    parser.add_argument('--compare', help="JSON прошлого отчёта для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="допустимый рост ошибки и времени при сравнении (доля)")
+    parser.add_argument('-o', '--output', help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    if args.size:
+        training_data = make_training_data(args.size)
+    else:
+        training_data = load_training_data(args.calibration)
+    report = analyze(training_data, args.neighbors or None, args.max_radius_km)
+    summary = report['summary']
+
+    print(f"Калибровочных точек: {summary['points']} (пропущено {summary['skipped']}, "
+          f"повторов {summary['repeated']}), "
+          f"районов: {summary['regions']}, анализ {summary['elapsed_s']} с", file=sys.stderr)
+    print(f"Скользящий контроль: RMS {summary['rms_m']} м, медиана {summary['median_m']} м, "
+          f"p90 {summary['p90_m']} м, макс {summary['max_m']} м", file=sys.stderr)
+    print(f"Выбросов: {summary['outliers']} (порог {summary['outlier_threshold_m']} м, "
+          f"перепутанных {summary['swapped']}), дубликатов: {summary['duplicates']}",
+          file=sys.stderr)
+
+    outliers = sorted((p for p in report['points'] if p['outlier']), key=lambda p: -p['error_m'])
+    for p in outliers[:TABLE_LIMIT]:
+        print(f"  ✗ {p['id']}  {p['google']:<24} → {p['yandex']:<24} "
+              f"{p['error_m']:>9.2f} м  {REASONS[p['reason']]}", file=sys.stderr)
+    for d in report['duplicates'][:TABLE_LIMIT]:
+        print(f"  ≡ {d['ids'][0]} / {d['ids'][1]}  расстояние {d['distance_m']} м, "
+              f"разница Yandex {d['yandex_diff_m']} м", file=sys.stderr)
+    print(f"  {'центр':<22} {'точек':>6} {'RMS, м':>9} {'p90, м':>9} {'макс, м':>9} "
+          f"{'выбросов':>9}", file=sys.stderr)
+    for r in report['regions'][:TABLE_LIMIT]:
+        center = f"{r['center'][0]:.4f}, {r['center'][1]:.4f}"
+        print(f"  {center:<22} {r['points']:>6} {r['rms_m']:>9.3f} {r['p90_m']:>9.3f} "
+              f"{r['max_m']:>9.3f} {r['outliers']:>9}", file=sys.stderr)
+
+    if not args.all_points:
+        report['points'] = outliers
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    failed = False
+    if args.fail_on_outliers and (summary['outliers'] or summary['duplicates']
+                                  or summary['repeated']):
+        print("✗ Найдены выбросы или дубликаты", file=sys.stderr)
+        failed = True
+    if args.max_rms_m is not None and summary['rms_m'] > args.max_rms_m:
+        print(f"✗ RMS {summary['rms_m']} м больше {args.max_rms_m} м", file=sys.stderr)
+        failed = True
+    if args.compare and compare(summary, args.compare, args.threshold):
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк индекса калибровочных точек: импорт с проверкой дубликатов и
+удаление — линейный поиск (как было) против хэш-индекса PointIndex.
+
+    python scripts/bench_calibration_index.py --points 100000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from gootoya.storage import PointIndex, point_id  # noqa: E402
+
+
+def make_points(n, seed=1):
+    rnd = random.Random(seed)
+    points = []
+    for _ in range(n):
+        lat, lon = rnd.uniform(40, 70), rnd.uniform(20, 140)
+        points.append({
+            "google": f"{lat:.6f}, {lon:.6f}",
+            "yandex": f"{lat + 0.0004:.6f}, {lon + 0.0007:.6f}",
+            "location": "",
+        })
+    return points
+
+
+def copy_points(points):
+    return [dict(p) for p in points]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+# === ЛИНЕЙНЫЙ ПОИСК (прежняя реализация) ===
+
+def linear_import(data, items):
+    added = 0
+    for item in items:
+        if not any(x['google'] == item['google'] and x['yandex'] == item['yandex'] for x in data):
+            data.append(item)
+            added += 1
+    return added
+
+
+def linear_delete(data, items):
+    kept = []
+    for item in data:
+        if not any(item['google'].strip() == d['google'].strip() and
+                   item['yandex'].strip() == d['yandex'].strip() for d in items):
+            kept.append(item)
+    return len(data) - len(kept)
+
+
+# === ХЭШ-ИНДЕКС ===
+
+def indexed_import(data, index, items):
+    added = 0
+    for item in items:
+        if index.add(item):
+            data.append(item)
+            added += 1
+    return added
+
+
+def indexed_delete(data, index, ids):
+    ids = {pid for pid in ids if pid in index}
+    for pid in ids:
+        index.remove(pid)
+    kept = [p for p in data if p['id'] not in ids]
+    return len(data) - len(kept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=100000, help="точек в наборе")
+    parser.add_argument('--batch', type=int, default=1000,
+                        help="точек в импорте/удалении (половина импорта — дубликаты)")
+    parser.add_argument('--skip-linear', action='store_true',
+                        help="не измерять линейный поиск (он квадратичный)")
+    args = parser.parse_args()
+
+    base = make_points(args.points)
+    fresh = make_points(args.batch // 2, seed=2)
+    dups = random.Random(3).sample(base, args.batch - len(fresh))
+    to_import = fresh + dups
+    to_delete = random.Random(4).sample(base, args.batch)
+    # Клиент присылает id, уже назначенные сервером
+    delete_ids = [point_id(p) for p in to_delete]
+
+    print(f"Точек: {args.points}, пакет: {args.batch}")
+
+    t, index = timed(PointIndex, copy_points(base))
+    print(f"  построение индекса:     {t * 1000:9.1f} мс")
+
+    data = copy_points(base)
+    index = PointIndex(data)
+    t, added = timed(indexed_import, data, index, copy_points(to_import))
+    print(f"  импорт (индекс):        {t * 1000:9.1f} мс, добавлено {added}")
+    t, removed = timed(indexed_delete, data, index, delete_ids)
+    print(f"  удаление (индекс):      {t * 1000:9.1f} мс, удалено {removed}")
+
+    if not args.skip_linear:
+        data = copy_points(base)
+        t, added = timed(linear_import, data, copy_points(to_import))
+        print(f"  импорт (линейный):      {t * 1000:9.1f} мс, добавлено {added}")
+        t, removed = timed(linear_delete, copy_points(base), to_delete)
+        print(f"  удаление (линейный):    {t * 1000:9.1f} мс, удалено {removed}")
+
+
+if __name__ == '__main__':
+    main()
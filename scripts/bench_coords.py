@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора координат на больших входных данных: прежний разбор
+(coord_re + guess_source_type по findall) против однопроходного
+токенизатора gootoya.coords.
+
+    python scripts/bench_coords.py --lines 100000 --repeat 5
+
+Замеры (лучшее время из --repeat запусков):
+- первая пара и источник в большом тексте (буфер обмена): прежний разбор
+  всегда проходит весь текст вторым выражением, токенизатор — до первой пары;
+  пара в конце текста с номерами и телефонами — худший случай токенизатора;
+- все пары текста и источник каждой;
+- построчный разбор (пакетная конвертация, CLI): здесь токенизатор медленнее
+  на создании Coords — цена числа записей и метаданных точности.
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from benchmark import make_clipboard_texts  # noqa: E402
+from gootoya.coords import TEXT_KINDS, parse_coords, tokenize  # noqa: E402
+from gootoya.core import coord_re  # noqa: E402
+
+# Абзац текста без координат (номера домов и телефонов — тоже числа)
+PROSE = ("Встреча у главного входа, дом 12, подъезд 3. Телефон 8 912 345-67-89, "
+         "стоимость 1500.50 руб., время 10.30. ")
+
+
+# === ПРЕЖНИЙ РАЗБОР ===
+
+def old_guess_source_type(text):
+    matches = re.findall(r'\.(\d+)', text)
+    if not matches:
+        return "Неизвестно"
+    return "Google" if max(len(x) for x in matches) > 7 else "Yandex"
+
+
+def old_first(text):
+    m = coord_re.search(text)
+    if not m:
+        return None
+    return float(m.group(1)), float(m.group(2)), old_guess_source_type(text)
+
+
+def old_all(text):
+    return [(m.start(), m.end(), float(m.group(1)), float(m.group(2)),
+             old_guess_source_type(m.group()))
+            for m in coord_re.finditer(text)]
+
+
+def old_lines(lines):
+    out = []
+    for line in lines:
+        m = coord_re.search(line)
+        out.append((float(m.group(1)), float(m.group(2))) if m else None)
+    return out
+
+
+# === ТОКЕНИЗАТОР ===
+
+def new_first(text):
+    coords = parse_coords(text)
+    if coords is None:
+        return None
+    return coords.lat, coords.lon, coords.source
+
+
+def new_all(text):
+    return [(c.start, c.end, c.lat, c.lon, c.source) for c in tokenize(text)]
+
+
+def new_lines(lines):
+    out = []
+    for line in lines:
+        c = parse_coords(line, TEXT_KINDS)
+        out.append((c.lat, c.lon) if c else None)
+    return out
+
+
+def best(func, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=100000, help="строк во входных данных")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    lines = make_clipboard_texts(args.lines)
+    text = "\n".join(lines)
+    head_text = lines[0] + PROSE * args.lines
+    tail_text = PROSE * args.lines + lines[0]
+
+    print(f"Строк: {args.lines}, текст {len(text) / 1e6:.1f} МБ")
+    for name, old, new, arg, points in [
+        ("первая пара (в начале)", old_first, new_first, head_text, 1),
+        ("первая пара (в конце)", old_first, new_first, tail_text, 1),
+        ("все пары и источник", old_all, new_all, text, args.lines),
+        ("построчно", old_lines, new_lines, lines, args.lines),
+    ]:
+        t_old = best(old, arg, args.repeat)
+        t_new = best(new, arg, args.repeat)
+        rate = f"  ({points / t_new:,.0f} пар/с)" if points > 1 else ""
+        print(f"  {name:<22} прежний {t_old * 1000:9.2f} мс  токенизатор {t_new * 1000:9.2f} мс  "
+              f"×{t_old / t_new:.2f}{rate}")
+
+
+if __name__ == '__main__':
+    main()
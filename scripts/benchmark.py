@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк горячих путей: конвертация (по одной точке и пакетом, прямая,
+обратная и с проверкой обратным ходом),
+построение модели калибровки (get_calib_list), разбор координат coord_re и parse_coords,
+guess_source_type, изменения набора, сохранение и загрузка calibration.json.
+
+    python scripts/benchmark.py -o bench.json
+    python scripts/benchmark.py --sizes 100 1000 --compare bench.json
+
+Калибровочные наборы и запросы синтетические и воспроизводимые (seed):
+точки сгруппированы вокруг крупных городов, как в реальных данных.
+Результат — JSON; с --compare печатается сравнение с прошлым запуском,
+а при замедлении больше --threshold код возврата 1.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from gootoya.calibration import CalibrationData  # noqa: E402
+from gootoya.core import (  # noqa: E402
+    HAS_NUMPY, CalibrationModel, ConversionCache, coord_re,
+    convert_coords_advanced, convert_coords_batch, convert_roundtrip, guess_source_type,
+)
+from gootoya.coords import parse_coords  # noqa: E402
+from gootoya.storage import CalibrationStore  # noqa: E402
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+DEFAULT_QUERIES = 1000
+DEFAULT_REPEAT = 3
+
+# Не больше стольких «точка × калибровочная точка» на один замер одиночного режима
+SINGLE_MODE_BUDGET = 20_000_000
+
+# Центры городов и их «вес» в наборе (доля точек)
+CITIES = [
+    ("Москва", 55.7558, 37.6173, 0.30),
+    ("Санкт-Петербург", 59.9343, 30.3351, 0.15),
+    ("Новосибирск", 55.0084, 82.9357, 0.08),
+    ("Екатеринбург", 56.8389, 60.6057, 0.08),
+    ("Казань", 55.7961, 49.1064, 0.07),
+    ("Нижний Новгород", 56.3269, 44.0059, 0.06),
+    ("Краснодар", 45.0355, 38.9753, 0.06),
+    ("Владивосток", 43.1155, 131.8855, 0.05),
+    ("Минск", 53.9006, 27.5590, 0.05),
+    ("Алматы", 43.2220, 76.8512, 0.05),
+]
+# Доля точек вне городов и разброс вокруг центра города (градусы)
+RURAL_SHARE = 0.05
+CITY_SPREAD = 0.15
+
+
+def random_location(rnd):
+    if rnd.random() < RURAL_SHARE:
+        return rnd.uniform(42, 65), rnd.uniform(25, 135)
+    weights = [c[3] for c in CITIES]
+    _, lat, lon, _ = rnd.choices(CITIES, weights)[0]
+    return rnd.gauss(lat, CITY_SPREAD), rnd.gauss(lon, CITY_SPREAD * 1.7)
+
+
+def make_training_data(size, seed=1):
+    """Синтетический набор: Google-координаты с 15 знаками, Yandex — с 6."""
+    rnd = random.Random(seed)
+    points = []
+    for _ in range(size):
+        lat, lon = random_location(rnd)
+        points.append({
+            "google": f"{lat:.15f}, {lon:.15f}",
+            "yandex": f"{lat + 0.0004 + rnd.gauss(0, 1e-5):.6f}, "
+                      f"{lon + 0.0007 + rnd.gauss(0, 1e-5):.6f}",
+            "location": "",
+        })
+    return points
+
+
+def make_queries(count, seed=2):
+    rnd = random.Random(seed)
+    return [random_location(rnd) for _ in range(count)]
+
+
+def make_clipboard_texts(count, seed=3):
+    """Типичное содержимое буфера: чистые координаты, ссылки, текст с координатами."""
+    rnd = random.Random(seed)
+    texts = []
+    for i in range(count):
+        lat, lon = random_location(rnd)
+        kind = i % 4
+        if kind == 0:
+            texts.append(f"{lat:.15f}, {lon:.15f}")
+        elif kind == 1:
+            texts.append(f"{lat:.6f}, {lon:.6f}")
+        elif kind == 2:
+            texts.append(f"https://www.google.com/maps/@{lat:.7f},{lon:.7f},17z")
+        else:
+            texts.append(f"Встреча у входа, координаты {lat:.6f}, {lon:.6f}. Позвоните заранее.")
+    return texts
+
+
+def measure(func, repeat, setup=None):
+    """
+    Время выполнения func (сек.): минимум и медиана по repeat запускам.
+    setup вызывается перед каждым запуском и в замер не входит.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+class Bench:
+    """Собирает результаты замеров; only — имена замеров, которые нужно выполнить."""
+
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = set(only) if only else None
+        self.results = []
+
+    def run(self, name, func, ops, points=None, mode=None, setup=None):
+        if self.only is not None and name not in self.only:
+            return None
+        best, median = measure(func, self.repeat, setup)
+        result = {
+            "name": name,
+            "points": points,
+            "mode": mode,
+            "ops": ops,
+            "best_s": round(best, 6),
+            "median_s": round(median, 6),
+            "per_op_us": round(best / ops * 1e6, 3),
+            "ops_per_s": round(ops / best, 1),
+        }
+        self.results.append(result)
+        label = f"{name}[{mode}]" if mode else name
+        size = f"N={points}" if points is not None else ""
+        print(f"  {label:<28} {size:<9} {result['per_op_us']:>12.3f} мкс/оп "
+              f"{result['ops_per_s']:>14.1f} оп/с", file=sys.stderr)
+        return result
+
+
+def bench_conversion(bench, size, queries):
+    training_data = make_training_data(size)
+    model = CalibrationModel.from_training_data(training_data, version=1)
+    if HAS_NUMPY:
+        model.as_numpy()
+
+    single = queries[:max(10, min(len(queries), SINGLE_MODE_BUDGET // size))]
+    bench.run("convert", lambda: [convert_coords_advanced(lat, lon, model) for lat, lon in single],
+              len(single), size, "single")
+    bench.run("convert", lambda: convert_coords_batch(queries, model),
+              len(queries), size, "batch")
+    bench.run("convert_k16", lambda: [convert_coords_advanced(lat, lon, model, 16)
+                                      for lat, lon in queries],
+              len(queries), size, "single")
+    bench.run("convert_k16", lambda: convert_coords_batch(queries, model, 16),
+              len(queries), size, "batch")
+
+    # Обратная модель строится один раз, со своим индексом по точкам Yandex
+    inverse = model.inverse()
+    if HAS_NUMPY:
+        inverse.as_numpy()
+    bench.run("convert_inverse_k16", lambda: [convert_coords_advanced(lat, lon, inverse, 16)
+                                              for lat, lon in queries],
+              len(queries), size, "single")
+    bench.run("convert_inverse_k16", lambda: convert_coords_batch(queries, inverse, 16),
+              len(queries), size, "batch")
+    bench.run("convert_roundtrip_k16", lambda: convert_roundtrip(queries, model, 16),
+              len(queries), size, "batch")
+
+    cache = ConversionCache(size=len(queries) * 2)
+    for lat, lon in single:
+        cache.convert_advanced(lat, lon, model)
+    bench.run("convert_cached", lambda: [cache.convert_advanced(lat, lon, model)
+                                         for lat, lon in single],
+              len(single), size, "single")
+
+    bench.run("get_calib_list", lambda: list(CalibrationModel.from_training_data(training_data)),
+              1, size)
+    return training_data
+
+
+def bench_calibration_data(bench, training_data, size):
+    fresh = make_training_data(max(1, size // 100), seed=5)
+    state = {}
+
+    def setup():
+        state['data'] = CalibrationData([dict(p) for p in training_data])
+
+    bench.run("calibration_add", lambda: state['data'].add(fresh), len(fresh), size, setup=setup)
+
+    def setup_remove():
+        setup()
+        state['ids'] = [p['id'] for p in state['data'].snapshot.points[::100]]
+
+    bench.run("calibration_remove", lambda: state['data'].remove(state['ids']),
+              max(1, size // 100), size, setup=setup_remove)
+
+
+def bench_persistence(bench, training_data, size, tmp):
+    store = CalibrationStore(Path(tmp) / f"calibration_{size}.json")
+    bench.run("save_config", lambda: store.compact(training_data), 1, size)
+    bench.run("load_config", lambda: store.load(), 1, size)
+    point = [training_data[0]]
+    journal_ops = 100
+    bench.run("journal_append", lambda: [store.append_added(point) for _ in range(journal_ops)],
+              journal_ops, size)
+
+
+def bench_parsing(bench, count):
+    texts = make_clipboard_texts(count)
+    bench.run("coord_re", lambda: [coord_re.search(t) for t in texts], len(texts))
+    bench.run("parse_coords", lambda: [parse_coords(t) for t in texts], len(texts))
+    coords = [f"{m.group(1)}, {m.group(2)}" for m in map(coord_re.search, texts) if m]
+    bench.run("guess_source_type", lambda: [guess_source_type(c) for c in coords], len(coords))
+
+
+def compare(results, baseline_path, threshold):
+    """Сравнивает с прошлым запуском; возвращает число замедлений больше threshold."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r['name'], r['points'], r['mode']): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nСравнение с {baseline_path}:", file=sys.stderr)
+    for r in results:
+        prev = old.get((r['name'], r['points'], r['mode']))
+        if not prev:
+            continue
+        ratio = r['per_op_us'] / prev['per_op_us'] if prev['per_op_us'] else 1.0
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  ✗ замедление"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            mark = "  ✓ ускорение"
+        label = f"{r['name']}[{r['mode']}]" if r['mode'] else r['name']
+        size = f"N={r['points']}" if r['points'] is not None else ""
+        print(f"  {label:<28} {size:<9} ×{ratio:.2f}{mark}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк GooToYaConverter")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="размеры калибровочных наборов")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES,
+                        help="точек в наборе запросов")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help="повторов каждого замера (берётся лучший)")
+    parser.add_argument('--only', nargs='+',
+                        help="запускать только эти замеры (по имени)")
+    parser.add_argument('-o', '--output', help="файл для JSON (по умолчанию stdout)")
+    parser.add_argument('--compare', help="JSON прошлого запуска для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="допустимое замедление при сравнении (доля)")
+    args = parser.parse_args(argv)
+
+    bench = Bench(args.repeat, args.only)
+    queries = make_queries(args.queries)
+
+    print("Разбор координат", file=sys.stderr)
+    bench_parsing(bench, args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            print(f"Калибровочный набор: {size} точек", file=sys.stderr)
+            training_data = bench_conversion(bench, size, queries)
+            bench_calibration_data(bench, training_data, size)
+            bench_persistence(bench, training_data, size, tmp)
+
+    results = bench.results
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": HAS_NUMPY,
+            "sizes": args.sizes,
+            "queries": args.queries,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Проверка импорта и удаления калибровочных точек через веб-API
+(тестовый клиент Flask, набор во временной папке, data/ не трогается).
+
+    python scripts/check_calibration_api.py
+
+- повтор одной пары в calibration.json загружается одной точкой,
+  файл при загрузке не меняется, повтор учтён в duplicates;
+- POST /api/calibration/import считает добавленные, дубликаты (с уже
+  имеющимися точками, внутри импорта, в другой записи чисел) и
+  неверные элементы;
+- DELETE /api/calibration/data удаляет ровно запрошенные точки (по id
+  и по паре координат), неизвестные id ничего не удаляют;
+- после перезагрузки из снимка и журнала набор тот же.
+"""
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import app as webapp  # noqa: E402
+from gootoya.calibration import CalibrationData  # noqa: E402
+from gootoya.core import base_training_data  # noqa: E402
+from gootoya.storage import CalibrationStore, point_id  # noqa: E402
+
+# Новые точки для импорта
+NEW_POINTS = [
+    {"google": "55.750001, 37.610001", "yandex": "55.750401, 37.610701", "location": ""},
+    {"google": "59.930001, 30.310001", "yandex": "59.930401, 30.310701", "location": ""},
+]
+
+
+def check(errors, condition, message):
+    if not condition:
+        errors.append(message)
+
+
+def make_state(path):
+    """Состояние приложения с набором в path (вместо data/calibration.json)."""
+    state = webapp.AppState()
+    state.config_dir = path.parent
+    state.config_path = path
+    state.store = CalibrationStore(path)
+    state.calibration = CalibrationData(store=state.store)
+    return state
+
+
+def snapshot_ids(state):
+    return [p['id'] for p in state.training_data]
+
+
+def check_load(state, base, errors):
+    check(errors, state.load_config(), "набор не загрузился")
+    ids = snapshot_ids(state)
+    check(errors, len(ids) == len(base), f"после загрузки {len(ids)} точек, ожидалось {len(base)}")
+    check(errors, len(set(ids)) == len(ids), "повторяющиеся id в снимке")
+    check(errors, state.calibration.duplicates == 1,
+          f"повторов {state.calibration.duplicates}, ожидался 1")
+    with open(state.config_path, encoding='utf-8') as f:
+        saved = json.load(f)
+    check(errors, len(saved) == len(base) + 1, f"файл изменён при загрузке: {len(saved)} точек")
+
+
+def check_import(client, state, base, errors):
+    spaced = dict(NEW_POINTS[1], google=NEW_POINTS[1]['google'].replace(', ', ',   '))
+    items = [NEW_POINTS[0], NEW_POINTS[1], dict(NEW_POINTS[0]), spaced, dict(base[0]),
+             {"google": "55.1, 37.1"}, "55.1, 37.1"]
+    result = client.post('/api/calibration/import', json=items).get_json()
+    expected = {"success": True, "count": 2, "duplicates": 3, "invalid": 2}
+    got = {key: result.get(key) for key in expected}
+    check(errors, got == expected, f"импорт: {got}, ожидалось {expected}")
+
+    ids = snapshot_ids(state)
+    check(errors, len(ids) == len(base) + 2, f"после импорта {len(ids)} точек")
+    check(errors, len(set(ids)) == len(ids), "повторяющиеся id после импорта")
+
+    again = client.post('/api/calibration/import', json=NEW_POINTS).get_json()
+    check(errors, (again.get('count'), again.get('duplicates')) == (0, 2),
+          f"повторный импорт: {again}")
+
+
+def check_delete(client, state, errors):
+    before = snapshot_ids(state)
+    targets = [point_id(NEW_POINTS[0]), point_id(NEW_POINTS[1])]
+    request = [targets[0],
+               {"google": NEW_POINTS[1]['google'], "yandex": NEW_POINTS[1]['yandex']},
+               "0000000000000000"]
+    result = client.delete('/api/calibration/data', json=request).get_json()
+    check(errors, result.get('count') == 2, f"удалено {result.get('count')}, ожидалось 2")
+
+    after = snapshot_ids(state)
+    expected = [pid for pid in before if pid not in targets]
+    check(errors, after == expected, "удалены не те точки или нарушен порядок")
+
+    first = before[0]
+    result = client.delete('/api/calibration/data', json=[first, first]).get_json()
+    check(errors, result.get('count') == 1, f"id дважды в запросе: удалено {result.get('count')}")
+    result = client.delete('/api/calibration/data', json=[first]).get_json()
+    check(errors, result.get('count') == 0, f"повторное удаление: удалено {result.get('count')}")
+    check(errors, snapshot_ids(state) == expected[1:], "набор после удаления по id изменился иначе")
+
+
+def check_reload(state, errors):
+    expected = snapshot_ids(state)
+    reloaded = CalibrationData(store=CalibrationStore(state.config_path))
+    check(errors, [p['id'] for p in reloaded.load()] == expected,
+          "после перезагрузки из снимка и журнала набор другой")
+
+
+def main():
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / webapp.CONFIG_FILENAME
+        base = base_training_data()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(base + [dict(base[1])], f, ensure_ascii=False)
+
+        state = make_state(path)
+        webapp.state = state  # init_app не создаёт своё состояние с data/
+        client = webapp.app.test_client()
+        for name, run in [("загрузка с повтором", lambda: check_load(state, base, errors)),
+                          ("импорт", lambda: check_import(client, state, base, errors)),
+                          ("удаление", lambda: check_delete(client, state, errors)),
+                          ("перезагрузка", lambda: check_reload(state, errors))]:
+            before = len(errors)
+            run()
+            print(f"  {name:<22} ошибок {len(errors) - before}")
+
+    if errors:
+        for error in errors:
+            print(f"    {error}")
+        print(f"✗ Ошибок: {len(errors)}")
+        return 1
+    print("✓ Импорт и удаление калибровочных точек корректны")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Проверка геокодинга и его кэша на локальной заглушке Nominatim.
+
+    python scripts/check_geocode_cache.py
+
+Заглушка (http.server в этом же процессе) подставляется через
+GOOTOYA_NOMINATIM_URL; ответ выбирается по целой части широты.
+Проверяется, что:
+- повторный запрос той же ячейки берётся из кэша, провайдер не вызывается;
+- «Город не найден» живёт в кэше negative_ttl, обычный ответ — ttl;
+- при переполнении вытесняются давно не использованные записи (LRU);
+- ошибки (500, таймаут, обрыв соединения, битый JSON) дают
+  FETCH_FAILED и не кэшируются: следующий запрос снова идёт к провайдеру.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+# Таймаут меньше задержки медленного ответа заглушки
+TIMEOUT = 0.5
+SLOW_DELAY = TIMEOUT * 3
+
+# Целая часть широты → поведение заглушки
+OK, EMPTY, ERROR, SLOW, RESET, BROKEN = 10, 20, 30, 40, 50, 60
+
+
+class StubNominatim(BaseHTTPRequestHandler):
+    """Отдаёт заготовленные ответы и считает запросы по поведению."""
+
+    requests = Counter()
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        kind = int(float(query['lat'][0]))
+        StubNominatim.requests[kind] += 1
+        if kind == ERROR:
+            self.send_error(500)
+            return
+        if kind == SLOW:
+            time.sleep(SLOW_DELAY)
+        if kind == RESET:
+            self.close_connection = True
+            return
+        body = {
+            OK: b'{"address": {"city": "Stubville", "country": "Stubland"}}',
+            EMPTY: b'{"address": {}}',
+            BROKEN: b'{"address": {"city": ',
+        }.get(kind, b'{}')
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass  # клиент уже ушёл по таймауту
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubNominatim)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check(errors, condition, message):
+    if not condition:
+        errors.append(message)
+
+
+def check_hits(geo, errors):
+    requests = StubNominatim.requests
+    first = geo.locate(OK + 0.001, 30.001)
+    check(errors, first == "Stubville, Stubland", f"ответ заглушки: {first!r}")
+    again = geo.locate(OK + 0.001, 30.001)
+    near = geo.locate(OK + 0.002, 30.002)  # та же ячейка GEOCODE_CELL_DEG
+    check(errors, again == near == first, f"из кэша: {again!r}, {near!r}")
+    check(errors, requests[OK] == 1, f"запросов к провайдеру {requests[OK]}, ожидался 1")
+    check(errors, geo.cache.hits == 2, f"попаданий в кэш {geo.cache.hits}, ожидалось 2")
+
+
+def check_negative_ttl(geo, geocode, errors):
+    requests = StubNominatim.requests
+    found = geo.locate(EMPTY + 0.5, 30.5)
+    check(errors, found == geocode.NOT_FOUND, f"пустой адрес: {found!r}")
+    geo.locate(EMPTY + 0.5, 30.5)
+    check(errors, requests[EMPTY] == 1, f"NOT_FOUND не закэширован: {requests[EMPTY]} запроса")
+
+    time.sleep(geo.cache.negative_ttl + 0.1)
+    geo.locate(EMPTY + 0.5, 30.5)
+    check(errors, requests[EMPTY] == 2,
+          f"NOT_FOUND не истёк за negative_ttl: {requests[EMPTY]} запроса")
+    geo.locate(OK + 0.001, 30.001)
+    check(errors, requests[OK] == 1, "обычный ответ истёк вместе с NOT_FOUND")
+
+
+def check_failures(geo, geocode, errors):
+    requests = StubNominatim.requests
+    for kind, name in [(ERROR, "500"), (SLOW, "таймаут"), (RESET, "обрыв"), (BROKEN, "битый JSON")]:
+        lat = kind + 0.5
+        results = [geo.locate(lat, 30.5) for _ in range(2)]
+        check(errors, results == [geocode.FETCH_FAILED] * 2, f"{name}: {results!r}")
+        check(errors, requests[kind] == 2, f"{name}: закэширован ({requests[kind]} запрос)")
+        check(errors, geo.cache.get(lat, 30.5) is None, f"{name}: есть запись в кэше")
+
+
+def check_lru(geocode, path, errors):
+    cache = geocode.GeocodeCache(path, max_size=10)
+    points = [(i * 0.1, 0.0) for i in range(11)]
+    for lat, lon in points[:10]:
+        cache.put(lat, lon, f"Город {lat:.1f}")
+        time.sleep(0.002)
+    cache.get(*points[0])  # первая запись становится самой свежей
+    time.sleep(0.002)
+    cache.put(*points[10], "Город 1.0")
+
+    kept = [cache.get(lat, lon) is not None for lat, lon in points]
+    check(errors, cache.stats()['size'] <= cache.max_size,
+          f"размер кэша {cache.stats()['size']} больше {cache.max_size}")
+    check(errors, kept[0] and kept[10], "вытеснена недавно использованная запись")
+    check(errors, not kept[1] and not kept[2], f"не вытеснены самые старые записи: {kept}")
+    cache.close()
+
+
+def main():
+    server = start_stub()
+    os.environ['GOOTOYA_NOMINATIM_URL'] = f"http://127.0.0.1:{server.server_port}/reverse"
+    os.environ['GOOTOYA_NOMINATIM_TIMEOUT'] = str(TIMEOUT)
+    from gootoya import geocode
+
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = geocode.GeocodeCache(Path(tmp) / "cache.sqlite3", ttl=3600, negative_ttl=1)
+        geo = geocode.Geocoder(cache, rate=0)
+        for name, run in [("попадания в кэш", lambda: check_hits(geo, errors)),
+                          ("negative TTL", lambda: check_negative_ttl(geo, geocode, errors)),
+                          ("ошибки не кэшируются", lambda: check_failures(geo, geocode, errors)),
+                          ("вытеснение LRU",
+                           lambda: check_lru(geocode, Path(tmp) / "lru.sqlite3", errors))]:
+            before = len(errors)
+            run()
+            print(f"  {name:<22} ошибок {len(errors) - before}")
+        cache.close()
+    server.shutdown()
+
+    if errors:
+        for error in errors:
+            print(f"    {error}")
+        print(f"✗ Ошибок: {len(errors)}")
+        return 1
+    print("✓ Геокодинг и кэш работают корректно")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Отчёт о районных аппроксимациях: какие районы выделены, ошибка скользящего
+контроля (leave-one-out) для IDW и каждого вида аппроксимации, что выбрано,
+и скорость конвертации аппроксимацией и точным IDW.
+
+    python scripts/fit_report.py                           # data/calibration.json
+    python scripts/fit_report.py --size 10000 --neighbors 16 -o fit.json
+
+Код возврата 1, если выбранные аппроксимации по скользящему контролю хуже
+IDW (в целом больше чем в --max-cv-ratio раз или в каком-либо районе) или
+аппроксимация не быстрее IDW в --min-speedup раз.
+
+Без --size берётся калибровочный файл (--calibration), с --size — синтетический
+набор из scripts/benchmark.py.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from benchmark import make_queries, make_training_data  # noqa: E402
+from gootoya.core import (  # noqa: E402
+    HAS_NUMPY, CalibrationModel, convert_coords_pairs, load_training_data,
+)
+from gootoya.fit import FIT_KINDS, FittedTransform  # noqa: E402
+
+DEFAULT_CALIBRATION = Path(__file__).resolve().parent.parent / 'data' / 'calibration.json'
+DEFAULT_QUERIES = 20000
+
+# Сколько районов печатать в таблице (по убыванию числа точек)
+TABLE_LIMIT = 20
+
+# Пороги по умолчанию: общая ошибка с выбором относительно только IDW и ускорение относительно IDW
+DEFAULT_MAX_CV_RATIO = 1.0
+DEFAULT_MIN_SPEEDUP = 1.0
+
+
+def pooled_rms(regions, key):
+    """Общая ошибка по районам, взвешенная числом точек (м)."""
+    total = sum(r['points'] for r in regions if key(r) is not None)
+    if not total:
+        return None
+    return math.sqrt(sum(key(r) ** 2 * r['points'] for r in regions if key(r) is not None) / total)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчёт о районных аппроксимациях")
+    parser.add_argument('--calibration', default=str(DEFAULT_CALIBRATION),
+                        help="калибровочный файл (если не задан --size)")
+    parser.add_argument('--size', type=int, help="синтетический набор этого размера")
+    parser.add_argument('--kinds', nargs='+', choices=FIT_KINDS, default=list(FIT_KINDS),
+                        help="виды аппроксимации")
+    parser.add_argument('--neighbors', type=int, help="k ближайших точек IDW")
+    parser.add_argument('--max-radius-km', type=float, help="радиус IDW (км)")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--max-cv-ratio', type=float, default=DEFAULT_MAX_CV_RATIO,
+                        help="допустимое отношение ошибки с выбором к ошибке только IDW")
+    parser.add_argument('--min-speedup', type=float, default=DEFAULT_MIN_SPEEDUP,
+                        help="во сколько раз аппроксимация должна быть быстрее IDW")
+    parser.add_argument('-o', '--output', help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    if args.size:
+        training_data = make_training_data(args.size)
+    else:
+        training_data = load_training_data(args.calibration)
+    model = CalibrationModel.from_training_data(training_data, version=1)
+    if HAS_NUMPY:
+        model.as_numpy()
+
+    start = time.perf_counter()
+    fitted = FittedTransform.fit(model, args.neighbors, args.max_radius_km, kinds=args.kinds)
+    fit_s = time.perf_counter() - start
+    regions = fitted.report()
+
+    print(f"Калибровочных точек: {len(model)}, районов: {len(regions)}, "
+          f"построение {fit_s:.2f} с", file=sys.stderr)
+    print(f"  {'центр':<22} {'точек':>6}  {'выбрано':<9}"
+          + "".join(f"{k:>10}" for k in ['idw'] + args.kinds), file=sys.stderr)
+    for r in sorted(regions, key=lambda r: -r['points'])[:TABLE_LIMIT]:
+        errors = "".join(f"{r['cv_rms_m'][k]:>10.3f}" if k in r['cv_rms_m'] else f"{'—':>10}"
+                         for k in ['idw'] + args.kinds)
+        center = f"{r['center'][0]:.4f}, {r['center'][1]:.4f}"
+        print(f"  {center:<22} {r['points']:>6}  {r['kind']:<9}{errors}", file=sys.stderr)
+
+    idw_rms = pooled_rms(regions, lambda r: r['cv_rms_m'].get('idw'))
+    chosen_rms = pooled_rms(regions, lambda r: r['cv_rms_m'].get(r['kind']))
+    if idw_rms is not None:
+        print(f"Скользящий контроль (RMS, м): только IDW {idw_rms:.3f}, "
+              f"с выбором {chosen_rms:.3f}", file=sys.stderr)
+
+    queries = make_queries(args.queries)
+    covered = [p for p in queries if fitted.region_for(*p) is not None]
+    rates = {}
+    if covered:
+        for name, func in (("fit", lambda: fitted.convert_pairs(covered)),
+                           ("idw", lambda: convert_coords_pairs(
+                               covered, model, args.neighbors, args.max_radius_km))):
+            start = time.perf_counter()
+            func()
+            rates[name] = round(len(covered) / (time.perf_counter() - start))
+        print(f"Запросов в районах с аппроксимацией: {len(covered)} из {len(queries)}; "
+              f"аппроксимация {rates['fit']} т/с, IDW {rates['idw']} т/с", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "points": len(model),
+            "regions": len(regions),
+            "kinds": dict(Counter(r['kind'] for r in regions)),
+            "neighbors": args.neighbors,
+            "max_radius_km": args.max_radius_km,
+            "fit_s": round(fit_s, 3),
+            "cv_rms_idw_m": round(idw_rms, 4) if idw_rms is not None else None,
+            "cv_rms_selected_m": round(chosen_rms, 4) if chosen_rms is not None else None,
+            "covered_queries": len(covered),
+            "pts_per_s": rates,
+            "numpy": HAS_NUMPY,
+        },
+        "regions": regions,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    failures = []
+    if idw_rms is not None and chosen_rms > idw_rms * args.max_cv_ratio:
+        failures.append(f"ошибка с выбором {chosen_rms:.3f} м больше "
+                        f"{args.max_cv_ratio}× IDW ({idw_rms:.3f} м)")
+    for r in regions:
+        idw, chosen = r['cv_rms_m'].get('idw'), r['cv_rms_m'].get(r['kind'])
+        if idw is not None and chosen is not None and chosen > idw:
+            failures.append(f"район {r['center']}: {r['kind']} {chosen:.3f} м хуже IDW {idw:.3f} м")
+    if rates and rates['fit'] < rates['idw'] * args.min_speedup:
+        failures.append(f"аппроксимация {rates['fit']} т/с, "
+                        f"меньше {args.min_speedup}× IDW ({rates['idw']} т/с)")
+    for failure in failures:
+        print(f"✗ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Проверка разбора координат (gootoya.coords) на случайных данных.
+
+    python scripts/fuzz_coords.py --cases 20000 --seed 1
+
+- все поддерживаемые записи (десятичные пары, ссылки Google и Яндекса, DMS)
+  внутри случайного текста разбираются в исходные числа, вид и источник;
+- на случайном мусоре из цифр и знаков разбор не падает, пары в диапазоне,
+  не пересекаются и идут по порядку;
+- на тексте из пар "lat, lon" с дробной частью find_coords находит те же
+  пары, что и прежний coord_re;
+- числа через пробел, не похожие на координаты (версии, цены, колонки
+  таблицы через табуляцию, строки из нескольких числовых полей), парой
+  не считаются.
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from gootoya.coords import SPACED_MIN_PRECISION, parse_coords, tokenize  # noqa: E402
+from gootoya.core import coord_re, find_coords  # noqa: E402
+
+# Слова вокруг координат (без цифр: цифры рядом меняют смысл записи)
+WORDS = ["Встреча", "у", "входа", "координаты", "точка", "см.", "—", "(", ")", "Note:",
+         "here", "адрес:", "улица", "Ленина", "\t", "\n", "…", "→", "«дом»"]
+
+# Символы случайного мусора
+NOISE = "0123456789.,;-+ \t@!?&=%°'\"NSEWСЮВЗdqll"
+
+# Тексты, в которых нет пар координат (числа через пробел или табуляцию)
+NEGATIVE_TEXTS = [
+    "version 1.2 3.4",
+    "Товар\t10.50\t20.00\nТовар2\t3.25\t4.75",
+    "Обновление 2.10 3.0.1, сборка 1.5 2.25",
+    "56.828118\t60.614261",
+    "12 56.828118 60.614261",
+    "56.828118 60.614261 15.5",
+]
+
+# Формат записи → (вид, источник или None — по точности)
+FORMATS = {
+    'decimal': ('decimal', None),
+    'spaced': ('decimal', None),
+    'google_at': ('google_url', "Google"),
+    'google_data': ('google_url', "Google"),
+    'google_query': ('google_url', "Google"),
+    'yandex_ll': ('yandex_url', "Yandex"),
+    'dms': ('dms', "Неизвестно"),
+}
+
+
+def random_number(rnd, limit, digits):
+    return round(rnd.uniform(-limit, limit), digits)
+
+
+def dms_text(value, positive, negative, rnd):
+    hemisphere = positive if value >= 0 else negative
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round(((value - degrees) * 60 - minutes) * 60, 1)
+    sep = rnd.choice(["", " "])
+    return f"{degrees}°{sep}{minutes}'{sep}{seconds}\"{hemisphere}"
+
+
+def make_case(rnd, fmt):
+    """Запись пары в формате fmt: (текст, lat, lon, допуск)."""
+    digits = rnd.choice([1, 4, 6, 7, 13, 15])
+    lat, lon = random_number(rnd, 89.9, digits), random_number(rnd, 179.9, digits)
+    tolerance = 10 ** -digits
+    if fmt == 'decimal':
+        text = f"{lat}{rnd.choice([',', ', ', ' , ', ',  '])}{lon}"
+    elif fmt == 'spaced':
+        # Через пробел — только с длинной дробной частью (иначе это не пара)
+        digits = max(digits, SPACED_MIN_PRECISION)
+        text = f"{lat:.{digits}f}{rnd.choice([' ', '  '])}{lon:.{digits}f}"
+    elif fmt == 'google_at':
+        text = f"https://www.google.com/maps/@{lat},{lon},17z"
+    elif fmt == 'google_data':
+        text = f"https://www.google.com/maps/place/X/data=!3m1!4b1!3d{lat}!4d{lon}!16s"
+    elif fmt == 'google_query':
+        sep = rnd.choice([',', '%2C'])
+        text = f"https://maps.google.com/?{rnd.choice(['q', 'query', 'center'])}={lat}{sep}{lon}"
+    elif fmt == 'yandex_ll':
+        sep = rnd.choice([',', '%2C'])
+        key = rnd.choice(['ll', 'pt', 'whatshere%5Bpoint%5D'])
+        text = f"https://yandex.ru/maps/?{key}={lon}{sep}{lat}&z=16"
+    else:
+        latin = rnd.random() < 0.5
+        ns = ('N', 'S') if latin else ('С', 'Ю')
+        ew = ('E', 'W') if latin else ('В', 'З')
+        parts = [dms_text(lat, *ns, rnd), dms_text(lon, *ew, rnd)]
+        if rnd.random() < 0.3:
+            parts.reverse()
+        text = rnd.choice([" ", ", ", " "]).join(parts)
+        # Секунды с одним знаком: ошибка до 0.05″
+        tolerance = 0.0001
+    return text, lat, lon, tolerance
+
+
+def surround(rnd, text):
+    before = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 4)))
+    after = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 4)))
+    return f"{before} {text} {after}" if before or after else text
+
+
+def check_formats(rnd, cases, errors):
+    for i in range(cases):
+        fmt = list(FORMATS)[i % len(FORMATS)]
+        kind, source = FORMATS[fmt]
+        text, lat, lon, tolerance = make_case(rnd, fmt)
+        text = surround(rnd, text)
+        coords = parse_coords(text)
+        if coords is None:
+            errors.append(f"{fmt}: пара не найдена в {text!r}")
+            continue
+        if abs(coords.lat - lat) > tolerance or abs(coords.lon - lon) > tolerance:
+            errors.append(f"{fmt}: {coords.lat}, {coords.lon} вместо {lat}, {lon} в {text!r}")
+        if coords.kind != kind:
+            errors.append(f"{fmt}: вид {coords.kind} в {text!r}")
+        if source is not None and coords.source != source:
+            errors.append(f"{fmt}: источник {coords.source} в {text!r}")
+
+
+def check_noise(rnd, cases, errors):
+    for _ in range(cases):
+        text = "".join(rnd.choice(NOISE) for _ in range(rnd.randint(1, 60)))
+        try:
+            found = list(tokenize(text))
+        except Exception as e:
+            errors.append(f"исключение {e!r} на {text!r}")
+            continue
+        end = 0
+        for coords in found:
+            if abs(coords.lat) > 90 or abs(coords.lon) > 180:
+                errors.append(f"вне диапазона {coords!r} в {text!r}")
+            if coords.start < end or coords.end <= coords.start:
+                errors.append(f"пары пересекаются или пусты в {text!r}")
+            end = coords.end
+
+
+def check_differential(rnd, cases, errors):
+    for _ in range(cases):
+        pairs = []
+        for _ in range(rnd.randint(1, 6)):
+            digits = rnd.randint(1, 15)
+            lat, lon = random_number(rnd, 89.9, digits), random_number(rnd, 179.9, digits)
+            pairs.append(f"{lat:.{digits}f}{rnd.choice([',', ', ', ',  '])}{lon:.{digits}f}")
+        text = surround(rnd, f" {rnd.choice(WORDS)} ".join(pairs))
+        expected = [(m.start(), m.end(), float(m.group(1)), float(m.group(2)))
+                    for m in coord_re.finditer(text)]
+        actual = find_coords(text)
+        if actual != expected:
+            errors.append(f"find_coords {actual} вместо {expected} в {text!r}")
+
+
+def negative_case(rnd):
+    """Текст с числами через пробел или табуляцию, который не должен стать парой."""
+    def number(digits):
+        return f"{rnd.uniform(-89.9, 89.9):.{digits}f}"
+
+    kind = rnd.randrange(3)
+    if kind == 0:
+        # Короткая дробная часть: версии, цены, размеры
+        digits = rnd.randint(1, SPACED_MIN_PRECISION - 1)
+        return surround(rnd, f"{number(digits)}{rnd.choice([' ', '  '])}{number(digits)}")
+    if kind == 1:
+        # Колонки таблицы через табуляцию
+        rows = [rnd.choice(WORDS[:4]) + "".join(f"\t{number(rnd.randint(1, 8))}"
+                                               for _ in range(rnd.randint(2, 4)))
+                for _ in range(rnd.randint(1, 4))]
+        return "\n".join(rows)
+    # Строка из трёх и более числовых полей через пробел
+    fields = [number(rnd.randint(SPACED_MIN_PRECISION, 8)) for _ in range(rnd.randint(3, 5))]
+    return surround(rnd, " ".join(fields))
+
+
+def check_negatives(rnd, cases, errors):
+    texts = NEGATIVE_TEXTS + [negative_case(rnd) for _ in range(cases - len(NEGATIVE_TEXTS))]
+    for text in texts:
+        found = list(tokenize(text))
+        if found:
+            errors.append(f"ложная пара {found[0]!r} в {text!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', type=int, default=20000, help="случаев каждой проверки")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    errors = []
+    for name, check in [("форматы", check_formats), ("мусор", check_noise),
+                        ("сравнение с coord_re", check_differential),
+                        ("не координаты", check_negatives)]:
+        before = len(errors)
+        check(rnd, args.cases, errors)
+        print(f"  {name:<22} {args.cases} случаев, ошибок {len(errors) - before}")
+    if errors:
+        for error in errors[:10]:
+            print(f"    {error}")
+        print(f"✗ Ошибок: {len(errors)}")
+        return 1
+    print("✓ Разбор координат корректен")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,15 +1,102 @@
 #!/usr/bin/env python3
 """
 Генератор GeoJSON карты из calibration.json для отображения в GitHub README.
+
+    python scripts/generate_map.py                      # data/calibration_map.geojson
+    python scripts/generate_map.py --quality            # + ошибки скользящего контроля и районы
+    python scripts/generate_map.py --format ndjson -o map.geojsonl
+    python scripts/generate_map.py --tiles              # + подробные плитки в data/calibration_map_tiles/
+
+Точки читаются из calibration.json потоково и пишутся по объекту на строку:
+FeatureCollection остаётся валидным GeoJSON, а diff при изменении калибровки
+затрагивает только изменившиеся строки (--format ndjson — построчный GeoJSON
+без обёртки). id объекта — хэш его содержимого: объекты, которые не
+изменились с прошлого запуска, берутся из прежнего файла без повторной
+сборки, а файл без изменений не перезаписывается.
+
+Если объектов больше --max-features, близкие точки объединяются в кластеры
+(ячейка подбирается автоматически, --cluster задаёт её вручную), чтобы карта
+отрисовывалась и при 100 000 точек. --tiles дополнительно раскладывает все
+точки по плиткам --tile-deg градусов для подробного просмотра.
+
+С --quality у каждой точки появляются error_m / outlier / reason (выбросы
+отмечены другим цветом), а центры районов — отдельными точками со сводкой
+ошибок (см. scripts/analyze_calibration.py). Для анализа точки загружаются в память.
 """
+import argparse
+import filecmp
+import hashlib
 import json
+import math
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from array import array
+from collections import Counter
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+# Цвета маркеров: обычная точка, выброс, центр района, кластер
+POINT_COLOR = "#FF6B6B"
+OUTLIER_COLOR = "#7B1FA2"
+REGION_COLOR = "#1E88E5"
+CLUSTER_COLOR = "#FB8C00"
+
+# Форматы вывода: geojson — FeatureCollection по объекту на строку,
+# ndjson — объекты по строкам без обёртки (GeoJSONSeq, .geojsonl)
+FORMATS = ('geojson', 'ndjson')
+
+# Больше объектов — точки объединяются в кластеры (GitHub не отрисует десятки тысяч маркеров)
+MAP_MAX_FEATURES = 5000
+
+# Размеры ячеек кластеризации, от мелкой к крупной (градусы)
+CLUSTER_STEPS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+# Размер плитки подробных файлов (градусы) и строк плитки в памяти до сброса на диск
+TILE_DEG = 1.0
+TILE_BUFFER_LINES = 1000
 
-def load_calibration_data(file_path):
-    """Загружает данные калибровки из JSON файла."""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+# Версия оформления объектов: входит в хэш, при изменении кода оформления
+# все объекты пересобираются
+MAP_FEATURE_VERSION = 2
+
+# Длина хэша содержимого (байт) и блок чтения calibration.json
+HASH_SIZE = 8
+READ_CHUNK = 1 << 16
+
+FEATURE_PREFIX = b'{"type":"Feature","id":"'
+
+
+# === ЧТЕНИЕ ===
+
+def iter_calibration(path, chunk_size=READ_CHUNK):
+    """Точки calibration.json (JSON-массив) по одной, без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = f.read(chunk_size).lstrip('\ufeff \t\r\n')
+        if not buf.startswith('['):
+            raise ValueError(f"{path}: ожидается JSON-массив")
+        pos = 1
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            try:
+                if pos >= len(buf):
+                    raise json.JSONDecodeError("нужны данные", buf, pos)
+                point, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Объект не поместился в буфер — дочитываем
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield point
 
 
 def parse_coordinates(coord_string):
@@ -18,61 +105,397 @@ def parse_coordinates(coord_string):
     return [lon, lat]
 
 
-def create_geojson(calibration_data):
-    """Создает GeoJSON структуру из данных калибровки."""
-    features = []
-    
-    for idx, point in enumerate(calibration_data, 1):
-        google_coords = parse_coordinates(point['google'])
-        yandex_coords_str = point['yandex']
-        
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": google_coords
-            },
-            "properties": {
-                "title": f"Калибровочная точка #{idx}",
-                "google": point['google'],
-                "yandex": yandex_coords_str,
-                "marker-color": "#FF6B6B",
-                "marker-size": "medium",
-                "marker-symbol": "circle"
-            }
-        }
-        features.append(feature)
-    
+# === ОБЪЕКТЫ КАРТЫ ===
+
+def content_hash(*parts):
+    """Хэш содержимого объекта (его id в GeoJSON)."""
+    data = json.dumps([MAP_FEATURE_VERSION, *parts], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=HASH_SIZE).hexdigest()
+
+
+def dump_feature(key, feature):
+    """Строка объекта: компактный JSON, id сразу после type (см. FeatureCache)."""
+    return json.dumps({"type": "Feature", "id": key, **feature},
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def point_feature(point, lon_lat, error=None):
+    """Объект калибровочной точки; error — запись отчёта quality по ней (или None)."""
+    location = point.get('location')
+    properties = {
+        "title": f"Калибровочная точка: {location}" if location else "Калибровочная точка",
+        "google": point['google'],
+        "yandex": point['yandex'],
+        "marker-color": POINT_COLOR,
+        "marker-size": "medium",
+        "marker-symbol": "circle"
+    }
+    if error:
+        properties.update({
+            "error_m": error['error_m'],
+            "outlier": error['outlier'],
+            "reason": error['reason'],
+        })
+        if error['outlier']:
+            properties["marker-color"] = OUTLIER_COLOR
+            properties["marker-size"] = "large"
+    return {"geometry": {"type": "Point", "coordinates": lon_lat}, "properties": properties}
+
+
+def region_feature(idx, region):
+    """Объект центра района со сводкой ошибок скользящего контроля."""
+    lat, lon = region['center']
     return {
-        "type": "FeatureCollection",
-        "features": features
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": {
+            "title": f"Район #{idx}: точек {region['points']}, RMS {region['rms_m']} м",
+            "points": region['points'],
+            "outliers": region['outliers'],
+            "rms_m": region['rms_m'],
+            "median_m": region['median_m'],
+            "p90_m": region['p90_m'],
+            "max_m": region['max_m'],
+            "marker-color": REGION_COLOR,
+            "marker-size": "small",
+            "marker-symbol": "star"
+        }
     }
 
 
-def generate_map_file(output_path, geojson_data):
-    """Сохраняет GeoJSON в файл."""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(geojson_data, f, ensure_ascii=False, indent=2)
-    print(f"✓ Карта сохранена: {output_path}")
-    print(f"✓ Всего точек: {len(geojson_data['features'])}")
+class Cluster:
+    """Накопитель точек одной ячейки кластеризации."""
+
+    __slots__ = ('count', 'sum_lat', 'sum_lon', 'bbox', 'outliers', 'sum_sq')
+
+    def __init__(self, lat, lon):
+        self.count = 0
+        self.sum_lat = self.sum_lon = self.sum_sq = 0.0
+        self.bbox = [lat, lat, lon, lon]
+        self.outliers = 0
+
+    def add(self, lat, lon, error=None):
+        self.count += 1
+        self.sum_lat += lat
+        self.sum_lon += lon
+        bbox = self.bbox
+        bbox[0], bbox[1] = min(bbox[0], lat), max(bbox[1], lat)
+        bbox[2], bbox[3] = min(bbox[2], lon), max(bbox[3], lon)
+        if error:
+            self.outliers += error['outlier']
+            self.sum_sq += error['error_m'] ** 2
+
+    def feature(self, with_quality):
+        size = "small" if self.count < 10 else "medium" if self.count < 100 else "large"
+        properties = {
+            "title": f"Кластер, точек: {self.count}",
+            "points": self.count,
+            "bbox": [round(v, 6) for v in self.bbox],
+            "marker-color": CLUSTER_COLOR,
+            "marker-size": size,
+            "marker-symbol": "circle"
+        }
+        if with_quality:
+            properties["outliers"] = self.outliers
+            properties["rms_m"] = round(math.sqrt(self.sum_sq / self.count), 4)
+        center = [round(self.sum_lon / self.count, 6), round(self.sum_lat / self.count, 6)]
+        return {"geometry": {"type": "Point", "coordinates": center}, "properties": properties}
+
+
+class FeatureCache:
+    """
+    Строки объектов из прежних файлов карты по id (хэшу содержимого).
+    Файлы отображаются в память (mmap): в словаре только границы строк,
+    сама строка берётся срезом при совпадении хэша.
+    """
+
+    def __init__(self, paths):
+        self.maps = []
+        self.lines = {}
+        self.hits = self.misses = 0
+        key_start = len(FEATURE_PREFIX)
+        key_end = key_start + 2 * HASH_SIZE
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # нет файла или он пустой
+                continue
+            self.maps.append(mm)
+            pos, size = 0, len(mm)
+            while pos < size:
+                end = mm.find(b'\n', pos)
+                if end < 0:
+                    end = size
+                if mm[pos:pos + key_start] == FEATURE_PREFIX:
+                    key = mm[pos + key_start:pos + key_end].decode('ascii', 'replace')
+                    self.lines[key] = (mm, pos, end)
+                pos = end + 1
+
+    def line(self, key, build):
+        """Строка объекта key: из прежнего файла или собранная заново build()."""
+        entry = self.lines.get(key)
+        if entry is not None:
+            mm, start, end = entry
+            self.hits += 1
+            return mm[start:end].decode('utf-8').rstrip('\r,')
+        self.misses += 1
+        return dump_feature(key, build())
+
+    def close(self):
+        for mm in self.maps:
+            mm.close()
 
 
-def main():
+def point_line(point, cache, errors):
+    """(lat, lon, ошибка, строка объекта) точки или None, если координаты не разбираются."""
+    try:
+        google, yandex = point['google'], point['yandex']
+        lon_lat = parse_coordinates(google)
+    except (KeyError, ValueError, AttributeError, TypeError):
+        return None
+    error = errors.get((google, yandex))
+    error_fields = [error['error_m'], error['outlier'], error['reason']] if error else None
+    key = content_hash('point', google, yandex, point.get('location'), error_fields)
+    return lon_lat[1], lon_lat[0], error, cache.line(key, lambda: point_feature(point, lon_lat, error))
+
+
+def cell_key(lat, lon, step):
+    return math.floor(lat / step), math.floor(lon / step)
+
+
+def choose_cluster_step(points, max_features, steps=CLUSTER_STEPS):
+    """
+    Наименьшая ячейка из steps, при которой объектов не больше max_features:
+    (ячейка, число точек по ячейкам) или (None, None), если точек и так
+    не больше max_features.
+    """
+    lats, lons = array('d'), array('d')
+    for point in points:
+        try:
+            lon, lat = parse_coordinates(point['google'])
+        except (KeyError, ValueError, AttributeError, TypeError):
+            continue
+        lats.append(lat)
+        lons.append(lon)
+    if len(lats) <= max_features:
+        return None, None
+    for step in steps:
+        cells = Counter(cell_key(lat, lon, step) for lat, lon in zip(lats, lons))
+        if len(cells) <= max_features:
+            break
+    return step, cells
+
+
+def map_lines(points, cache, quality=None, step=None, cells=None, stats=None):
+    """
+    Строки объектов основной карты: точки в порядке файла, затем кластеры
+    (точки ячеек step, где их больше одной) и районы из отчёта quality.
+    """
+    errors = {(p['google'], p['yandex']): p for p in quality['points']} if quality else {}
+    clusters = {}
+    for point in points:
+        if step:
+            try:
+                lon, lat = parse_coordinates(point['google'])
+            except (KeyError, ValueError, AttributeError, TypeError):
+                stats['skipped'] += 1
+                continue
+            key = cell_key(lat, lon, step)
+            if cells[key] > 1:
+                error = errors.get((point['google'], point.get('yandex')))
+                clusters.setdefault(key, Cluster(lat, lon)).add(lat, lon, error)
+                stats['clustered'] += 1
+                continue
+        item = point_line(point, cache, errors)
+        if item is None:
+            stats['skipped'] += 1
+            continue
+        stats['points'] += 1
+        yield item[3]
+
+    for key in sorted(clusters):
+        feature = clusters[key].feature(quality is not None)
+        stats['clusters'] += 1
+        yield dump_feature(content_hash('cluster', feature), feature)
+
+    for idx, region in enumerate(quality['regions'] if quality else [], 1):
+        feature = region_feature(idx, region)
+        yield dump_feature(content_hash('region', feature), feature)
+
+
+# === ЗАПИСЬ ===
+
+def write_features(path, lines, fmt):
+    """
+    Пишет объекты (строки JSON) во временный файл рядом с path:
+    FeatureCollection по объекту на строку или NDJSON. Возвращает (файл, объектов).
+    """
+    tmp = path.with_name(path.name + '.tmp')
+    count = 0
+    with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+        if fmt == 'geojson':
+            f.write('{"type":"FeatureCollection","features":[\n')
+        for line in lines:
+            if fmt == 'geojson' and count:
+                f.write(',\n')
+            f.write(line)
+            if fmt != 'geojson':
+                f.write('\n')
+            count += 1
+        if fmt == 'geojson':
+            f.write('\n]}\n' if count else ']}\n')
+    return tmp, count
+
+
+def replace_if_changed(tmp, path):
+    """Заменяет path временным файлом, если содержимое отличается. True — файл изменён."""
+    if path.exists() and filecmp.cmp(tmp, path, shallow=False):
+        tmp.unlink()
+        return False
+    os.replace(tmp, path)
+    return True
+
+
+def tile_name(key, tile_deg, fmt):
+    ext = 'geojson' if fmt == 'geojson' else 'geojsonl'
+    return f"{key[0] * tile_deg:g}_{key[1] * tile_deg:g}.{ext}"
+
+
+def write_tiles(tiles_dir, points, cache, quality, fmt, tile_deg=TILE_DEG):
+    """
+    Раскладывает все точки по плиткам tile_deg°: строки копятся по плиткам
+    не больше TILE_BUFFER_LINES и сбрасываются во временные части на диске.
+    Возвращает [(временный файл, итоговый файл)] и число плиток.
+    """
+    errors = {(p['google'], p['yandex']): p for p in quality['points']} if quality else {}
+    tiles_dir.mkdir(parents=True, exist_ok=True)
+    parts_dir = Path(tempfile.mkdtemp(prefix='.parts-', dir=tiles_dir))
+    buffers = {}
+    names = {}
+
+    def flush(key):
+        with open(parts_dir / names[key], 'a', encoding='utf-8', newline='\n') as f:
+            f.writelines(line + '\n' for line in buffers[key])
+        buffers[key] = []
+
+    try:
+        for point in points:
+            item = point_line(point, cache, errors)
+            if item is None:
+                continue
+            key = cell_key(item[0], item[1], tile_deg)
+            if key not in names:
+                names[key] = tile_name(key, tile_deg, fmt)
+                buffers[key] = []
+            buffers[key].append(item[3])
+            if len(buffers[key]) >= TILE_BUFFER_LINES:
+                flush(key)
+
+        outputs = []
+        for key in sorted(names):
+            flush(key)
+            with open(parts_dir / names[key], 'r', encoding='utf-8') as part:
+                tmp, _ = write_features(tiles_dir / names[key],
+                                        (line.rstrip('\n') for line in part), fmt)
+            outputs.append((tmp, tiles_dir / names[key]))
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    return outputs
+
+
+def main(argv=None):
     # Корень проекта — на уровень выше папки scripts
     project_root = Path(__file__).resolve().parent.parent
     data_dir = project_root / 'data'
-    calibration_file = data_dir / 'calibration.json'
-    output_file = data_dir / 'calibration_map.geojson'
-    
+
+    parser = argparse.ArgumentParser(description="GeoJSON карта калибровочных точек")
+    parser.add_argument('--calibration', default=str(data_dir / 'calibration.json'),
+                        help="калибровочный файл")
+    parser.add_argument('-o', '--output', default=str(data_dir / 'calibration_map.geojson'),
+                        help="файл карты")
+    parser.add_argument('--format', choices=FORMATS, default='geojson',
+                        help="geojson — FeatureCollection, ndjson — объект на строку")
+    parser.add_argument('--max-features', type=int, default=MAP_MAX_FEATURES,
+                        help="больше объектов — точки объединяются в кластеры")
+    parser.add_argument('--cluster', type=float,
+                        help="ячейка кластеризации (градусы), 0 — без кластеров")
+    parser.add_argument('--tiles', nargs='?', const=str(data_dir / 'calibration_map_tiles'),
+                        help="папка подробных плиток (все точки, по файлу на плитку)")
+    parser.add_argument('--tile-deg', type=float, default=TILE_DEG, help="размер плитки (градусы)")
+    parser.add_argument('--full', action='store_true',
+                        help="собрать все объекты заново, не беря их из прежних файлов")
+    parser.add_argument('--quality', action='store_true',
+                        help="добавить ошибки скользящего контроля и сводку по районам")
+    parser.add_argument('--neighbors', type=int, help="k ближайших точек IDW для --quality")
+    args = parser.parse_args(argv)
+
+    calibration_file = Path(args.calibration)
+    output_file = Path(args.output)
+    tiles_dir = Path(args.tiles) if args.tiles else None
+
     if not calibration_file.exists():
         print(f"❌ Файл {calibration_file} не найден!")
-        return
-    
+        return 1
+
     print("🗺️  Генерация карты калибровочных точек...")
-    calibration_data = load_calibration_data(calibration_file)
-    geojson_data = create_geojson(calibration_data)
-    generate_map_file(output_file, geojson_data)
+
+    def points():
+        return iter_calibration(calibration_file)
+
+    quality = None
+    if args.quality:
+        from gootoya.quality import QUALITY_NEIGHBORS, analyze
+        data = list(points())
+        neighbors = QUALITY_NEIGHBORS if args.neighbors is None else args.neighbors
+        quality = analyze(data, neighbors or None)
+        summary = quality['summary']
+        print(f"✓ Скользящий контроль: RMS {summary['rms_m']} м, "
+              f"выбросов {summary['outliers']}, районов {summary['regions']}")
+
+        def points():
+            return iter(data)
+
+    step, cells = None, None
+    if args.cluster is None:
+        step, cells = choose_cluster_step(points(), args.max_features)
+    elif args.cluster > 0:
+        step, cells = choose_cluster_step(points(), 0, (args.cluster,))
+
+    previous = [] if args.full else [output_file]
+    if tiles_dir is not None and not args.full and tiles_dir.exists():
+        previous += sorted(p for p in tiles_dir.iterdir() if p.is_file())
+    cache = FeatureCache(previous)
+    stats = Counter(points=0, clustered=0, clusters=0, skipped=0)
+    try:
+        tmp, count = write_features(
+            output_file, map_lines(points(), cache, quality, step, cells, stats), args.format)
+        outputs = [(tmp, output_file)]
+        if tiles_dir is not None:
+            outputs += write_tiles(tiles_dir, points(), cache, quality, args.format, args.tile_deg)
+    finally:
+        # Прежние файлы закрываются до замены (на Windows открытый файл не заменить)
+        cache.close()
+
+    changed = [path for tmp, path in outputs if replace_if_changed(tmp, path)]
+    if tiles_dir is not None:
+        current = {path for _, path in outputs}
+        for stale in tiles_dir.iterdir():
+            if stale.is_file() and stale not in current:
+                stale.unlink()
+                changed.append(stale)
+
+    state = "сохранена" if output_file in changed else "без изменений"
+    print(f"✓ Карта {state}: {output_file}")
+    print(f"✓ Всего объектов: {count} (точек {stats['points']}, кластеров {stats['clusters']}"
+          + (f" из {stats['clustered']} точек, ячейка {step}°" if step else "") + ")")
+    if stats['skipped']:
+        print(f"⚠️ Пропущено точек с неверными координатами: {stats['skipped']}")
+    if tiles_dir is not None:
+        print(f"✓ Плиток: {len(outputs) - 1} в {tiles_dir}, изменено файлов: "
+              f"{len([p for p in changed if p != output_file])}")
+    print(f"✓ Объектов из прежних файлов: {cache.hits}, собрано заново: {cache.misses}")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
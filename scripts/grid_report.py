@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Отчёт о сетке поправок: время построения, число узлов и размер, отклонение
+от точного IDW (метры) и скорость конвертации по сетке (на покрытых ею
+точках) и точным IDW.
+
+    python scripts/grid_report.py                          # data/calibration.json
+    python scripts/grid_report.py --size 10000 --neighbors 16 --steps 0.04 0.02 0.01
+    python scripts/grid_report.py --max-deviation 1.0      # и порог максимального отклонения
+
+Код возврата 1, если p99 отклонения больше --max-p99-deviation, сетка
+не быстрее точного IDW в --min-speedup раз или сетка из файла считает
+иначе, чем построенная.
+
+Без --size берётся калибровочный файл (--calibration), с --size — синтетический
+набор из scripts/benchmark.py. Запросы — синтетические точки вокруг городов
+и случайные точки рядом с калибровочными.
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from benchmark import make_queries, make_training_data  # noqa: E402
+from gootoya.core import (  # noqa: E402
+    HAS_NUMPY, KM_PER_DEGREE, CalibrationModel, convert_coords_pairs, get_distance,
+    load_training_data,
+)
+from gootoya.grid import GRID_BASE_STEP, GRID_MAX_LEVEL, CorrectionGrid  # noqa: E402
+
+DEFAULT_CALIBRATION = Path(__file__).resolve().parent.parent / 'data' / 'calibration.json'
+DEFAULT_QUERIES = 20000
+
+# Точек для сравнения с точным IDW (он медленный) и разброс запросов вокруг калибровочных точек
+EXACT_SAMPLE = 5000
+NEAR_SPREAD = 0.05
+
+# Пороги по умолчанию: p99 отклонения от точного IDW (м) и ускорение сетки относительно IDW
+DEFAULT_MAX_P99_DEVIATION = 1.0
+DEFAULT_MIN_SPEEDUP = 1.0
+
+
+def make_near_queries(model, count, seed=4):
+    """Запросы рядом с калибровочными точками — там, где сетка мельче всего."""
+    rnd = random.Random(seed)
+    return [(model.glat[i] + rnd.uniform(-NEAR_SPREAD, NEAR_SPREAD),
+             model.glon[i] + rnd.uniform(-NEAR_SPREAD, NEAR_SPREAD))
+            for i in (rnd.randrange(len(model)) for _ in range(count))]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def report_step(model, step, args, queries, sample, exact, exact_rate):
+    grid, build_s = timed(lambda: CorrectionGrid.build(
+        model, base_step=step, max_level=args.max_level,
+        k=args.neighbors, max_radius_km=args.max_radius_km))
+
+    approx = grid.convert_pairs(sample)
+    deviation = [get_distance(a[0], a[1], b[0], b[1]) * KM_PER_DEGREE * 1000
+                 for a, b in zip(exact, approx)]
+
+    # Скорость по сетке — на покрытых точках; остальные считаются точным IDW
+    covered = [p for p in queries if grid.lookup(*p) is not None]
+    if HAS_NUMPY:
+        lats = [p[0] for p in covered]
+        lons = [p[1] for p in covered]
+        _, grid_s = timed(lambda: grid.convert_arrays(lats, lons))
+    else:
+        _, grid_s = timed(lambda: grid.convert_pairs(covered))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'grid.bin'
+        _, save_s = timed(lambda: grid.save(path))
+        loaded, load_s = timed(lambda: CorrectionGrid.load(path, model))
+        same = loaded.convert_pairs(sample[:1000]) == grid.convert_pairs(sample[:1000])
+        del loaded  # memmap держит файл открытым
+
+    return {
+        "base_step": step,
+        "tiles": len(grid.tiles),
+        "nodes": len(grid),
+        "bytes": grid.nbytes(),
+        "build_s": round(build_s, 3),
+        "save_s": round(save_s, 4),
+        "load_s": round(load_s, 4),
+        "load_matches": same,
+        "max_dev_m": round(max(deviation), 4),
+        "p99_dev_m": round(percentile(deviation, 0.99), 4),
+        "mean_dev_m": round(sum(deviation) / len(deviation), 5),
+        "coverage": round(len(covered) / len(queries), 4),
+        "grid_pts_per_s": round(len(covered) / grid_s) if covered else None,
+        "exact_pts_per_s": round(exact_rate),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Отчёт о сетке поправок")
+    parser.add_argument('--calibration', default=str(DEFAULT_CALIBRATION),
+                        help="калибровочный файл (если не задан --size)")
+    parser.add_argument('--size', type=int, help="синтетический набор этого размера")
+    parser.add_argument('--steps', type=float, nargs='+', default=[GRID_BASE_STEP],
+                        help="начальные шаги сетки (градусы)")
+    parser.add_argument('--max-level', type=int, default=GRID_MAX_LEVEL,
+                        help="уровней измельчения в плотных плитках")
+    parser.add_argument('--neighbors', type=int, help="k ближайших точек IDW")
+    parser.add_argument('--max-radius-km', type=float, help="радиус IDW (км)")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES)
+    parser.add_argument('--max-deviation', type=float,
+                        help="допустимое отклонение (м): при превышении код возврата 1")
+    parser.add_argument('--max-p99-deviation', type=float, default=DEFAULT_MAX_P99_DEVIATION,
+                        help="допустимый p99 отклонения (м)")
+    parser.add_argument('--min-speedup', type=float, default=DEFAULT_MIN_SPEEDUP,
+                        help="во сколько раз сетка должна быть быстрее точного IDW")
+    parser.add_argument('-o', '--output', help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    if args.size:
+        training_data = make_training_data(args.size)
+    else:
+        training_data = load_training_data(args.calibration)
+    model = CalibrationModel.from_training_data(training_data, version=1)
+    if HAS_NUMPY:
+        model.as_numpy()
+
+    queries = make_queries(args.queries // 2) + make_near_queries(model, args.queries // 2)
+    sample = queries[::max(1, len(queries) // EXACT_SAMPLE)]
+    exact, exact_s = timed(lambda: convert_coords_pairs(
+        sample, model, args.neighbors, args.max_radius_km))
+
+    print(f"Калибровочных точек: {len(model)}, запросов: {len(queries)}, "
+          f"сравнение с точным IDW по {len(sample)}", file=sys.stderr)
+    results = []
+    for step in args.steps:
+        result = report_step(model, step, args, queries, sample, exact, len(sample) / exact_s)
+        results.append(result)
+        print(f"  шаг {step:<7} узлов {result['nodes']:>9} {result['bytes'] / 1e6:>8.2f} МБ "
+              f"постр. {result['build_s']:>7.2f} с  откл. макс {result['max_dev_m']:.3f} м "
+              f"p99 {result['p99_dev_m']:.3f} м  покрыто {result['coverage']:.0%} "
+              f"сетка {result['grid_pts_per_s']:>10} т/с "
+              f"IDW {result['exact_pts_per_s']:>8} т/с", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "points": len(model),
+            "queries": len(queries),
+            "sample": len(sample),
+            "neighbors": args.neighbors,
+            "max_radius_km": args.max_radius_km,
+            "numpy": HAS_NUMPY,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    failures = []
+    for r in results:
+        step = f"шаг {r['base_step']}"
+        if args.max_deviation is not None and r['max_dev_m'] > args.max_deviation:
+            failures.append(f"{step}: отклонение {r['max_dev_m']} м больше {args.max_deviation} м")
+        if r['p99_dev_m'] > args.max_p99_deviation:
+            failures.append(f"{step}: p99 отклонения {r['p99_dev_m']} м "
+                            f"больше {args.max_p99_deviation} м")
+        if r['grid_pts_per_s'] is not None and \
+                r['grid_pts_per_s'] < r['exact_pts_per_s'] * args.min_speedup:
+            failures.append(f"{step}: сетка {r['grid_pts_per_s']} т/с, "
+                            f"меньше {args.min_speedup}× IDW ({r['exact_pts_per_s']} т/с)")
+        if not r['load_matches']:
+            failures.append(f"{step}: сетка из файла считает иначе, чем построенная")
+    for failure in failures:
+        print(f"✗ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
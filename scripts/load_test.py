@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест веб-API: параллельные клиенты (потоки, у каждого своё
+keep-alive соединение) заданное время отправляют запросы по сценариям;
+на выходе — запросов в секунду и задержки (p50/p90/p99/макс) по каждому
+сценарию и в целом.
+
+    python scripts/load_test.py --start                          # поднять src/wsgi.py и замерить
+    python scripts/load_test.py --url http://192.168.1.10:5002 -c 32 -d 30
+    python scripts/load_test.py --start --scenarios batch --batch-mode grid -o load.json
+    python scripts/load_test.py --start --max-p99-ms 50          # код 1, если p99 выше
+
+Сценарии: convert — POST /api/convert (по одной точке), batch — POST
+/api/convert/batch (--batch-size точек текстом), status — GET /api/status.
+Запросы — синтетические точки вокруг городов из scripts/benchmark.py.
+Клиенты работают в этом же процессе и тоже тратят процессор: на одной машине
+с сервером результат занижен, для честных цифр запускайте с другой машины.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from benchmark import make_queries
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ('convert', 'batch', 'status')
+DEFAULT_SCENARIOS = ['convert', 'status']
+DEFAULT_CONCURRENCY = 16
+DEFAULT_DURATION = 10.0
+DEFAULT_BATCH_SIZE = 1000
+
+# Различных точек в запросах convert (больше кэша конвертаций по умолчанию)
+QUERY_POOL = 20000
+
+# Ожидание запуска сервера с --start и таймаут одного запроса (сек.)
+START_TIMEOUT = 60.0
+REQUEST_TIMEOUT = 30.0
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, threads):
+    """Запускает src/wsgi.py на порту port и ждёт, пока он начнёт отвечать."""
+    process = subprocess.Popen(
+        [sys.executable, str(ROOT / 'src' / 'wsgi.py'), '--port', str(port),
+         '--threads', str(threads)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=dict(os.environ))
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/status')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Сервер не запустился")
+
+
+class Scenario:
+    """Запрос сценария: метод, путь, тело и число точек в нём."""
+
+    def __init__(self, name, args, queries):
+        self.name = name
+        self.queries = queries
+        self.batch_size = args.batch_size
+        self.batch_path = f"/api/convert/batch?mode={args.batch_mode}"
+
+    def request(self, n):
+        """n-й запрос: (метод, путь, тело, заголовки, точек)."""
+        if self.name == 'convert':
+            lat, lon = self.queries[n % len(self.queries)]
+            body = json.dumps({"coords": f"{lat:.15f}, {lon:.15f}"})
+            return 'POST', '/api/convert', body, {'Content-Type': 'application/json'}, 1
+        if self.name == 'batch':
+            start = (n * self.batch_size) % len(self.queries)
+            lines = (self.queries[(start + i) % len(self.queries)] for i in range(self.batch_size))
+            body = "\n".join(f"{lat:.15f}, {lon:.15f}" for lat, lon in lines)
+            return 'POST', self.batch_path, body, {'Content-Type': 'text/plain'}, self.batch_size
+        return 'GET', '/api/status', None, {}, 0
+
+    @staticmethod
+    def check(name, status, payload):
+        """Успешен ли ответ сценария."""
+        if status != 200:
+            return False
+        if name == 'convert':
+            return json.loads(payload).get('success', False)
+        if name == 'batch':
+            return b'"success": false' not in payload
+        return True
+
+
+def client(host, port, scenarios, deadline, offset, results):
+    """Цикл одного клиента: запросы по кругу сценариев до deadline."""
+    conn = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+    n = offset
+    while time.perf_counter() < deadline:
+        scenario = scenarios[n % len(scenarios)]
+        method, path, body, headers, points = scenario.request(n // len(scenarios))
+        n += 1
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            ok = Scenario.check(scenario.name, response.status, response.read())
+        except (OSError, http.client.HTTPException, ValueError):
+            ok = False
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+        results.append((scenario.name, time.perf_counter() - start, ok, points))
+    conn.close()
+
+
+def run(host, port, scenarios, concurrency, duration):
+    """Запускает concurrency клиентов на duration секунд; возвращает (результаты, время)."""
+    results = []  # list.append потокобезопасен
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=client,
+                                args=(host, port, scenarios, deadline, i, results))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    """Сводка: запросов/с, доля ошибок, задержки (мс), точек/с."""
+    latencies = [r[1] * 1000 for r in results]
+    ok = sum(r[2] for r in results)
+    points = sum(r[3] for r in results if r[2])
+    return {
+        "requests": len(results),
+        "errors": len(results) - ok,
+        "rps": round(len(results) / elapsed, 1),
+        "pts_per_s": round(points / elapsed) if points else None,
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p90_ms": round(percentile(latencies, 0.9), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "max_ms": round(max(latencies), 2) if latencies else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест веб-API")
+    parser.add_argument('--url', default='http://127.0.0.1:5002', help="адрес сервера")
+    parser.add_argument('--start', action='store_true',
+                        help="запустить src/wsgi.py на свободном порту (вместо --url)")
+    parser.add_argument('--server-threads', type=int, default=16,
+                        help="потоков сервера с --start")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=DEFAULT_SCENARIOS)
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="параллельных клиентов")
+    parser.add_argument('-d', '--duration', type=float, default=DEFAULT_DURATION,
+                        help="длительность (сек.)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--batch-mode', choices=('idw', 'grid', 'fit'), default='idw')
+    parser.add_argument('--max-p99-ms', type=float,
+                        help="допустимая p99 (мс): при превышении код возврата 1")
+    parser.add_argument('-o', '--output', help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.start:
+        host, port = '127.0.0.1', free_port()
+        server = start_server(port, args.server_threads)
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+
+    queries = make_queries(QUERY_POOL)
+    scenarios = [Scenario(name, args, queries) for name in args.scenarios]
+    try:
+        # Разогрев: модель и ускоренные конвертеры строятся до замера
+        run(host, port, scenarios, 1, 0.5)
+        results, elapsed = run(host, port, scenarios, args.concurrency, args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "meta": {
+            "url": f"http://{host}:{port}",
+            "started": args.start,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 2),
+            "batch_size": args.batch_size if 'batch' in args.scenarios else None,
+            "batch_mode": args.batch_mode if 'batch' in args.scenarios else None,
+        },
+        "total": summarize(results, elapsed),
+        "scenarios": {name: summarize([r for r in results if r[0] == name], elapsed)
+                      for name in args.scenarios},
+    }
+
+    print(f"Клиентов: {args.concurrency}, {elapsed:.1f} с", file=sys.stderr)
+    for name, s in [("всего", report["total"])] + list(report["scenarios"].items()):
+        points = f"  {s['pts_per_s']} т/с" if s['pts_per_s'] and name != 'convert' else ""
+        print(f"  {name:<8} {s['requests']:>8} запр.  {s['rps']:>9} запр/с  "
+              f"p50 {s['p50_ms']:>8.2f} мс  p99 {s['p99_ms']:>8.2f} мс  "
+              f"ошибок {s['errors']}{points}", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.max_p99_ms is not None and report["total"]["p99_ms"] > args.max_p99_ms:
+        print(f"✗ p99 больше {args.max_p99_ms} мс", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка снимков калибровки: конвертация, импорт, удаление и
+геокодинг выполняются одновременно в нескольких потоках.
+
+    python scripts/stress_calibration.py --seconds 5
+    python scripts/stress_calibration.py --min-conversions-per-s 2000   # для CI
+
+Проверяется, что читатели всегда видят согласованный снимок (индекс
+совпадает с точками, версия не убывает), а после остановки писателей
+журнал воспроизводится в тот же набор точек. Кроме того, все потоки
+должны успеть завершиться (иначе — взаимная блокировка), каждый вид
+операций — выполниться хотя бы раз, а добавленные точки — получить
+местоположение. Код возврата 1 при любой ошибке.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from gootoya.calibration import CalibrationData  # noqa: E402
+from gootoya.core import base_training_data, convert_coords_pair  # noqa: E402
+from gootoya.geocode import GeocodingScheduler  # noqa: E402
+from gootoya.storage import CalibrationStore, point_id  # noqa: E402
+
+# Сколько ждать завершения потоков и очереди геокодинга после остановки (сек.)
+JOIN_TIMEOUT = 30.0
+
+
+class FakeGeocoder:
+    """Геокодер без сети: название по ячейке координат."""
+
+    def locate(self, lat, lon):
+        time.sleep(0.001)
+        return f"Ячейка {round(lat)}:{round(lon)}"
+
+
+def random_point(rnd):
+    lat, lon = rnd.uniform(50, 60), rnd.uniform(30, 60)
+    return {"google": f"{lat:.6f}, {lon:.6f}",
+            "yandex": f"{lat + 0.0004:.6f}, {lon + 0.0007:.6f}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--min-conversions-per-s', type=float, default=0,
+                        help="код 1, если читатели конвертируют медленнее")
+    args = parser.parse_args()
+
+    errors = []
+    counters = {"conversions": 0, "added": 0, "removed": 0, "located": 0}
+    stop = threading.Event()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CalibrationStore(Path(tmp) / 'calibration.json', compact_ops=50)
+        store.compact(base_training_data())
+        data = CalibrationData(store=store)
+        data.load()
+
+        def on_result(google, location):
+            counters["located"] += len(data.set_locations({google: location}))
+
+        scheduler = GeocodingScheduler(FakeGeocoder(), save=data.journal_locations,
+                                       workers=2, flush_interval=0.2, on_result=on_result)
+
+        def reader(seed):
+            rnd = random.Random(seed)
+            last_version = -1
+            while not stop.is_set():
+                snapshot = data.snapshot
+                if snapshot.version < last_version:
+                    errors.append("версия снимка уменьшилась")
+                last_version = snapshot.version
+                if any(snapshot.get(p['id']) is not p for p in snapshot.points):
+                    errors.append("индекс не совпадает с точками снимка")
+                if sum(1 for _ in snapshot.points) != len(snapshot):
+                    errors.append("снимок видит точки, добавленные после него")
+                convert_coords_pair(rnd.uniform(50, 60), rnd.uniform(30, 60), snapshot.model())
+                counters["conversions"] += 1
+
+        def importer():
+            rnd = random.Random(1)
+            while not stop.is_set():
+                batch = [random_point(rnd) for _ in range(rnd.randint(1, 20))]
+                added, _ = data.add(batch)
+                counters["added"] += len(added)
+                for point in added:
+                    scheduler.add_task(point)
+                time.sleep(0.001)
+
+        def remover():
+            rnd = random.Random(2)
+            while not stop.is_set():
+                points = data.snapshot.points
+                if len(points) > 50:
+                    victims = rnd.sample(points, rnd.randint(1, 10))
+                    counters["removed"] += len(data.remove(p['id'] for p in victims))
+                time.sleep(0.002)
+
+        threads = [threading.Thread(target=reader, args=(i,), daemon=True)
+                   for i in range(args.readers)]
+        threads += [threading.Thread(target=importer, daemon=True),
+                    threading.Thread(target=remover, daemon=True)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        deadline = time.monotonic() + JOIN_TIMEOUT
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        if any(thread.is_alive() for thread in threads):
+            print(f"✗ Потоки не завершились за {JOIN_TIMEOUT:.0f} с (взаимная блокировка?)")
+            return 1
+
+        while scheduler.stats()['pending'] or scheduler.stats()['in_progress']:
+            if time.monotonic() > deadline:
+                print(f"✗ Очередь геокодинга не опустела за {JOIN_TIMEOUT:.0f} с")
+                return 1
+            time.sleep(0.01)
+        scheduler.flush()
+
+        final = data.snapshot
+        replayed = CalibrationStore(store.path).load()
+        expected = {p['id']: p.get('location') for p in final.points}
+        actual = {point_id(p): p.get('location') for p in replayed}
+        if expected != actual:
+            errors.append("журнал воспроизводит другой набор точек")
+
+        base_ids = {point_id(p) for p in base_training_data()}
+        unlocated = [p for p in final.points if p['id'] not in base_ids and not p.get('location')]
+        if unlocated:
+            errors.append(f"точки без местоположения после геокодинга: {len(unlocated)}")
+        for name, value in counters.items():
+            if not value:
+                errors.append(f"нет ни одной операции: {name}")
+        rate = counters["conversions"] / args.seconds
+        if rate < args.min_conversions_per_s:
+            errors.append(f"конвертаций {rate:.0f}/с, меньше {args.min_conversions_per_s:.0f}/с")
+
+    print(f"Версия снимка: {final.version}, точек: {len(final)}")
+    for name, value in counters.items():
+        print(f"  {name}: {value}")
+    print(f"  конвертаций в секунду: {rate:.0f}")
+    if errors:
+        print(f"✗ Ошибок: {len(errors)} (первая: {errors[0]})")
+        return 1
+    print("✓ Снимки согласованы")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,198 +1,88 @@
 import sys
 import os
+import atexit
 import json
-import math
-import re
 import threading
 import time
-import queue
-import pyperclip
+import io
+import math
+import csv
 import webbrowser
 import subprocess
-import urllib.request
-import urllib.parse
+from functools import wraps
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request
-
-# Проверка наличия pywebview
-try:
-    import webview
-    HAS_WEBVIEW = True
-except ImportError:
-    HAS_WEBVIEW = False
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
+
+from gootoya.core import (
+    CONVERT_CACHE_PRECISION, CONVERT_CACHE_SIZE, IDW_NEIGHBORS, IDW_MAX_RADIUS_KM, coord_re,
+    DIRECTION_FORWARD, DIRECTIONS, ConversionCache, base_training_data,
+    convert_coords_batch, convert_roundtrip, convert_text, order_calibration_pair,
+    parse_batch_row,
+)
+from gootoya.coords import TEXT_KINDS, parse_coords, tokenize
+from gootoya.clipboard import create_watcher
+from gootoya.events import EventBus, format_sse
+from gootoya.metrics import PROFILE_REPORT_LIMIT, registry as metrics
+from gootoya.calibration import CalibrationData
+from gootoya.fit import FittedTransform
+from gootoya.grid import CorrectionGrid
+from gootoya.quality import QUALITY_NEIGHBORS, analyze as analyze_calibration
+from gootoya.storage import CalibrationStore, point_id, public_point
+from gootoya.geocode import (
+    FETCH_FAILED, GEOCODE_CACHE_FILENAME, LOADING, NOT_FOUND, GeocodeCache, Geocoder, GeocodingScheduler,
+)
 
 # === КОНСТАНТЫ ===
 
 CONFIG_FILENAME = "calibration.json"
 
-# Базовые калибровочные точки
-BASE_CALIBRATION = [
-    ((56.82811805737119, 60.61426164412377), (56.828106, 60.614287)),
-    ((56.86259891560065, 60.6572500903253), (56.862586, 60.657278)),
-    ((56.906666700192716, 60.63861543087929), (56.906652, 60.638628)),
-    ((56.909591402519915, 60.5950190263033), (56.909575, 60.595034)),
-    ((56.87863660391573, 60.51722444081701), (56.87863, 60.517245)),
-    ((56.781989564663476, 60.53752005594862), (56.781985, 60.537538)),
-    ((56.78862468710676, 60.651199174559736), (56.78862, 60.651223)),
-    ((56.80968834490725, 60.56463415653675), (56.809684, 60.564653)),
-    ((56.79674324537193, 60.620513467301855), (56.796731, 60.620529)),
-    ((56.826145898242764, 60.60015154151012), (56.826133, 60.600177)),
-    ((56.89324984612583, 60.57766089933516), (56.893228, 60.577675)),
-    ((56.885031152408864, 60.50838738450612), (56.885019, 60.508406)),
-    ((56.88387294721526, 60.5001406084767), (56.883864, 60.500160)),
-    ((59.938910517751964, 30.3142877746221), (59.938946, 30.314283)),
-    ((59.87644544335019, 30.374270379623916), (59.876472, 30.374265)),
-    ((59.962981728189405, 30.494793702118574), (59.962993, 30.494808)),
-    ((60.06028554274266, 30.41687044365594), (60.060287, 30.416894)),
-    ((55.178505866136376, 61.458797115710254), (55.178509, 61.458815)),
-    ((56.31857864399124, 44.00491972362694), (56.318603, 44.004937)),
-    ((56.33901617217321, 43.95225351295961), (56.339029, 43.952260)),
-    ((56.398701063262536, 43.985588829111364), (56.398709, 43.985600)),
-    ((57.1508971355925, 65.55846964059829), (57.150906, 65.558491)),
-    ((57.17835206448346, 65.56925933783715), (57.178346, 65.569273)),
-    ((57.11876675058166, 65.48813022260148), (57.118771, 65.488159)),
-    ((62.02797499644836, 129.76162940491085), (62.027965, 129.761650)),
-    ((62.05203840919141, 129.71767049344646), (62.052036, 129.717689)),
-    ((56.140030547089054, 47.24760888056219), (56.140049, 47.247614)),
-    ((56.12298277856921, 47.26660062665822), (56.123003, 47.266606)),
-    ((56.149800604524664, 47.17474603595798), (56.149809, 47.174721)),
-    ((56.13225084586679, 47.15316591517464), (56.132254, 47.153140)),
-    ((51.8242809475715, 107.57781015145557), (51.824287, 107.577818))
-]
-
-# Коэффициенты линейного преобразования (fallback)
-DEFAULT_A, DEFAULT_B, DEFAULT_C = 1.00002178, -0.000409512697, 0.0235679088
-DEFAULT_D, DEFAULT_E, DEFAULT_F = -0.0000552760272, 0.99995881, 0.00565924534
-
-# Регулярное выражение для парсинга координат
-coord_re = re.compile(r'([-+]?\d*\.\d+),\s*([-+]?\d*\.\d+)')
-
-
-# === ФУНКЦИИ КОНВЕРТАЦИИ ===
-
-def get_distance(lat1, lon1, lat2, lon2):
-    """Вычисляет расстояние между двумя точками (упрощённая формула)."""
-    avg_lat = math.radians((lat1 + lat2) / 2.0)
-    dlat = lat1 - lat2
-    dlon = (lon1 - lon2) * math.cos(avg_lat)
-    return math.sqrt(dlat**2 + dlon**2)
-
-
-def convert_coords_advanced(glat, glon, calibration_data):
-    """Конвертирует координаты Google в Yandex методом IDW-интерполяции."""
-    if not calibration_data:
-        ylat = DEFAULT_A * glat + DEFAULT_B * glon + DEFAULT_C
-        ylon = DEFAULT_D * glat + DEFAULT_E * glon + DEFAULT_F
-        return f"{ylat:.6f}, {ylon:.6f}"
-
-    total_weight = 0
-    sum_dlat = 0
-    sum_dlon = 0
-    p = 2
-
-    for (g_lat, g_lon), (y_lat, y_lon) in calibration_data:
-        dist = get_distance(glat, glon, g_lat, g_lon)
-        if dist < 0.0000001:
-            return f"{y_lat:.6f}, {y_lon:.6f}"
-        
-        weight = 1.0 / (dist ** p)
-        total_weight += weight
-        sum_dlat += (y_lat - g_lat) * weight
-        sum_dlon += (y_lon - g_lon) * weight
-    
-    if total_weight == 0:
-        return f"{glat:.6f}, {glon:.6f}"
+# Размер блока строк в пакетной конвертации (/api/convert/batch)
+BATCH_CHUNK_SIZE = 1000
 
-    final_dlat = sum_dlat / total_weight
-    final_dlon = sum_dlon / total_weight
-    return f"{(glat + final_dlat):.6f}, {(glon + final_dlon):.6f}"
+# Больший текст из буфера обмена не разбирается, пока не включена замена
+# всех пар в тексте (AppState.convert_all_pairs)
+CLIPBOARD_MAX_CHARS = 5000
 
+# Кэш результатов конвертации (буфер обмена и /api/convert);
+# GOOTOYA_CONVERT_CACHE=0 отключает его, например для замеров
+CONVERT_CACHE_ENABLED = os.environ.get('GOOTOYA_CONVERT_CACHE', '1') != '0'
+CONVERT_CACHE_SIZE = int(os.environ.get('GOOTOYA_CONVERT_CACHE_SIZE', CONVERT_CACHE_SIZE))
+CONVERT_CACHE_PRECISION = int(os.environ.get('GOOTOYA_CONVERT_CACHE_PRECISION', CONVERT_CACHE_PRECISION))
 
-# === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ===
+# Точек на странице /api/calibration/data?offset= (по умолчанию и максимум)
+CALIBRATION_PAGE_SIZE = 1000
+CALIBRATION_PAGE_MAX = 10000
 
-def wait_for_new_paste(timeout=None):
-    """Ожидает новое содержимое в буфере обмена."""
-    initial_content = pyperclip.paste()
-    start_time = time.time()
-    
-    while True:
-        time.sleep(0.1)
-        current_content = pyperclip.paste()
-        
-        if current_content != initial_content:
-            return current_content
-            
-        if timeout is not None:
-            elapsed = time.time() - start_time
-            if elapsed >= timeout:
-                raise TimeoutError(f'Таймаут ожидания: {timeout} сек.')
+# Порядок сортировки отчёта профилирования (/api/metrics/profile?sort=)
+PROFILE_SORT_KEYS = ('cumulative', 'tottime')
 
+# Ускоренные режимы пакетной конвертации: построение по модели калибровки
+FAST_CONVERTERS = {
+    'grid': CorrectionGrid.build,   # сетка поправок
+    'fit': FittedTransform.fit,     # районные аппроксимации МНК
+}
 
-def reverse_geocode(lat, lon):
-    """Получает название города по координатам через Nominatim API."""
-    try:
-        url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json&accept-language=ru"
-        req = urllib.request.Request(url, headers={'User-Agent': 'GooToYaConverter/1.0'})
-        
-        with urllib.request.urlopen(req, timeout=5) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            address = data.get('address', {})
-            
-            city = (address.get('city') or 
-                   address.get('town') or 
-                   address.get('village') or 
-                   address.get('municipality') or
-                   address.get('county') or
-                   address.get('state'))
-            
-            country = address.get('country', '')
-            
-            if city and country:
-                return f"{city}, {country}"
-            elif city:
-                return city
-            elif country:
-                return country
-            else:
-                return "Город не найден"
-                
-    except (urllib.error.HTTPError, urllib.error.URLError):
-        return "Не удалось получить данные"
-    except Exception as e:
-        print(f"Ошибка геокодинга: {e}")
-        return "Город не найден"
+# Серверный режим (src/wsgi.py, несколько пользователей в сети): калибровка только
+# для чтения, без буфера обмена и фонового геокодинга — они есть только в настольном процессе
+SERVER_MODE = os.environ.get('GOOTOYA_SERVER', '0') == '1'
 
+# Выборочное профилирование с запуска: доля профилируемых участков (0 — выключено)
+PROFILE_RATE = float(os.environ.get('GOOTOYA_PROFILE', 0))
 
-def guess_source_type(text):
-    """
-    Определяет источник координаты по количеству знаков после запятой.
-    Если знаков > 7 — это Google, если <= 7 — Yandex.
-    """
-    matches = re.findall(r'\.(\d+)', text)
-    if not matches:
-        return "Неизвестно"
-    
-    # Берем максимальную точность из найденных чисел (обычно их два: широта и долгота)
-    max_precision = max(len(x) for x in matches)
-    
-    if max_precision > 7:
-        return "Google"
-    else:
-        return "Yandex"
 
+# === ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ===
 
 def get_location_for_point_sync(point_data):
-    """Синхронно получает местоположение для точки калибровки."""
+    """Синхронно получает местоположение для точки калибровки (через кэш)."""
     try:
         coords_str = point_data.get('google', '')
         m = coord_re.search(coords_str)
         if m:
             lat, lon = float(m.group(1)), float(m.group(2))
-            time.sleep(1.2)  # Rate limit для Nominatim
-            return reverse_geocode(lat, lon)
+            return state.geocoder.locate(lat, lon)
     except Exception as e:
         print(f"Ошибка получения локации: {e}")
-    return "Город не найден"
+    return NOT_FOUND
 
 
 # === КЛАССЫ ===
@@ -201,16 +91,37 @@ class AppState:
     """Состояние приложения: калибровочные данные и флаги режимов."""
     
     def __init__(self):
-        self.training_data = []
         self.is_monitoring = False
         self.is_calibrating = False
         self.monitor_thread = None
         self.last_clipboard = ""
         self.last_found_coords = ""
         self.last_result_coords = ""
+        # Статистика последней конвертации текста с несколькими парами (см. convert_all_coords)
+        self.last_conversion_stats = None
+        # Заменять все пары в скопированном тексте (переключатель в интерфейсе);
+        # выключено — конвертируется одна первая пара, остальной текст не трогается
+        self.convert_all_pairs = False
         self.pending_google = None
+        # Источник первой координаты пары (по формату записи: ссылка, точность)
+        self.pending_source = None
         self.calibration_status_text = ""
         
+        # Геокодер с кэшем (создаётся в init_geocoder)
+        self.geocoder = None
+        
+        # Кэш повторяющихся конвертаций (сбрасывается при смене версии модели)
+        self.conversion_cache = ConversionCache(
+            CONVERT_CACHE_SIZE, CONVERT_CACHE_PRECISION, CONVERT_CACHE_ENABLED)
+
+        # Ускоренные конвертеры пакетного режима по (режим, направление)
+        # (строятся по запросу, см. get_converter)
+        self.converters = {}
+        self._converters_lock = threading.Lock()
+        
+        # Наблюдатель буфера обмена (создаётся при первом запуске мониторинга)
+        self.clipboard = None
+        
         # Определяем, запущено ли приложение из EXE или из исходников
         self.is_frozen = getattr(sys, 'frozen', False)
         
@@ -228,6 +139,10 @@ class AppState:
             os.makedirs(self.config_dir, exist_ok=True)
         except Exception as e:
             print(f"Ошибка создания директории: {e}")
+        
+        self.store = CalibrationStore(self.config_path)
+        # Калибровочные точки: неизменяемые снимки, изменения — только через self.calibration
+        self.calibration = CalibrationData(store=self.store)
 
     def get_resource_path(self, relative_path):
         """Возвращает путь к ресурсу (для PyInstaller)."""
@@ -246,26 +161,18 @@ class AppState:
             app_data = os.path.expanduser("~")
         return Path(app_data) / "GooToYaConverter"
 
+    @property
+    def training_data(self):
+        """Точки текущего снимка калибровки (PointList, только для чтения)."""
+        return self.calibration.snapshot.points
+
     def load_config(self):
         """Загружает калибровочные данные из файла."""
         try:
-            if not os.path.exists(self.config_path):
-                initial = [{
-                    "google": f"{g[0]}, {g[1]}", 
-                    "yandex": f"{y[0]}, {y[1]}", 
-                    "location": ""
-                } for g, y in BASE_CALIBRATION]
-                with open(self.config_path, 'w', encoding='utf-8') as f:
-                    json.dump(initial, f, indent=4, ensure_ascii=False)
-            
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.training_data = json.load(f)
+            if not self.store.exists():
+                self.store.compact(base_training_data())
             
-            for point in self.training_data:
-                if 'location' not in point:
-                    point['location'] = ""
-                if point.get('location') in ["Загрузка...", "Loading..."]:
-                    point['location'] = ""
+            self.calibration.load()
             
             self.is_monitoring = False
             self.is_calibrating = False
@@ -276,111 +183,227 @@ class AppState:
             return False
 
     def save_config(self):
-        """Сохраняет калибровочные данные в файл."""
+        """Сохраняет калибровочные данные в файл целиком (атомарно, журнал сворачивается)."""
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.training_data, f, indent=4, ensure_ascii=False)
+            self.calibration.compact()
             return True
         except Exception as e:
             print(f"Ошибка сохранения конфига: {e}")
             return False
+
+    def flush_journal(self):
+        """Сворачивает журнал в снимок, если в нём есть записи."""
+        if self.store.journal_ops:
+            self.save_config()
+
+    def add_points(self, points):
+        """Добавляет точки без дубликатов. Возвращает (добавленные точки, число дубликатов)."""
+        return self.calibration.add(points)
+
+    def remove_points(self, ids):
+        """Удаляет точки по id. Возвращает удалённые точки."""
+        return self.calibration.remove(ids)
+
+    def set_location(self, google, location):
+        """Записывает местоположение точек с этими google-координатами (без журнала)."""
+        return self.calibration.set_locations({google: location})
+
+    def save_locations(self, locations):
+        """Сохраняет найденные местоположения ({google: location}) в журнал."""
+        return self.calibration.journal_locations(locations)
             
+    def init_geocoder(self):
+        """Создаёт геокодер с дисковым кэшем в папке конфигурации."""
+        cache = None
+        try:
+            cache = GeocodeCache(self.config_dir / GEOCODE_CACHE_FILENAME)
+        except Exception as e:
+            print(f"Ошибка открытия кэша геокодинга: {e}")
+        self.geocoder = Geocoder(cache)
+
+    def get_clipboard(self):
+        """Возвращает наблюдатель буфера обмена, создавая его при первом вызове."""
+        if self.clipboard is None:
+            self.clipboard = create_watcher()
+        return self.clipboard
+
+    def get_model(self):
+        """Модель калибровки текущего снимка (без блокировок)."""
+        return self.calibration.snapshot.model()
+
+    def get_converter(self, mode, model, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM):
+        """
+        Ускоренный конвертер режима mode (см. FAST_CONVERTERS) для модели и
+        параметров IDW. Строится при первом запросе и перестраивается, когда
+        меняется модель калибровки. Конвертеры прямой и обратной модели
+        (CalibrationModel.inverse) хранятся отдельно.
+        """
+        key = (mode, model.direction)
+        with self._converters_lock:
+            converter = self.converters.get(key)
+            if converter is None or converter.model is not model or \
+                    (converter.k, converter.max_radius_km) != (k, max_radius_km):
+                with metrics.timer(f'{mode}_build_seconds'):
+                    converter = FAST_CONVERTERS[mode](model, k=k, max_radius_km=max_radius_km)
+                self.converters[key] = converter
+            return converter
+
     def get_calib_list(self):
         """Возвращает список калибровочных точек для конвертации."""
-        calib_list = []
-        for p in self.training_data:
-            try:
-                g_l, g_o = map(float, p["google"].split(", "))
-                y_l, y_o = map(float, p["yandex"].split(", "))
-                calib_list.append(((g_l, g_o), (y_l, y_o)))
-            except:
-                continue
-        return calib_list
+        return list(self.get_model())
 
 
-class GeocodingWorker:
-    """Фоновый воркер для определения местоположения."""
-    
-    def __init__(self):
-        self.queue = queue.Queue()
-        self.thread = threading.Thread(target=self._worker, daemon=True)
-        self.thread.start()
-    
-    def add_task(self, point):
-        """Добавляет точку в очередь на геокодинг."""
-        point['location'] = "Загрузка..."
-        self.queue.put(point)
+# === ИНИЦИАЛИЗАЦИЯ ===
+
+# Состояние создаётся не при импорте модуля, а при первом запросе или запуске
+state = None
+geocoding_service = None
+events = EventBus()
+_init_lock = threading.Lock()
+
+
+def shutdown():
+    """
+    Выход настольного процесса: сначала сохраняются ещё не записанные
+    результаты геокодинга, затем журнал сворачивается в calibration.json.
+    """
+    if geocoding_service is not None:
+        geocoding_service.flush()
+    if state is not None:
+        state.flush_journal()
+
+
+def init_app():
+    """Загружает калибровку и запускает фоновый геокодинг (один раз)."""
+    global state, geocoding_service
+    if state is not None:
+        return
+    with _init_lock:
+        if state is None:
+            new_state = AppState()
+            new_state.load_config()
+            if not SERVER_MODE:
+                new_state.init_geocoder()
+                geocoding_service = GeocodingScheduler(
+                    new_state.geocoder, save=new_state.save_locations,
+                    on_result=apply_location)
+                # При выходе сохраняем местоположения и сворачиваем журнал,
+                # чтобы calibration.json был актуален
+                atexit.register(shutdown)
+            state = new_state
+            if PROFILE_RATE > 0:
+                metrics.profiler.start(PROFILE_RATE)
+
+
+# === СОБЫТИЯ ДЛЯ ИНТЕРФЕЙСА ===
+
+def point_delta(point):
+    """Данные точки калибровки для событий (без лишних полей)."""
+    return {
+        "id": point.get('id'),
+        "google": point.get('google', ''),
+        "yandex": point.get('yandex', ''),
+        "location": point.get('location', ''),
+    }
+
+
+def get_status():
+    """Текущий статус приложения (для /api/status и события status)."""
+    status = "stopped"
+    if state.is_monitoring:
+        status = "calibrating" if state.is_calibrating else "working"
     
-    def _worker(self):
-        """Обрабатывает очередь геокодинга."""
-        while True:
-            try:
-                point = self.queue.get()
-                if point is None:
-                    break
-                
-                location = get_location_for_point_sync(point)
-                point['location'] = location
-                state.save_config()
-                
-                self.queue.task_done()
-            except Exception as e:
-                print(f"Ошибка воркера: {e}")
+    return dict(
+        status=status,
+        last_found=state.last_found_coords,
+        last_result=state.last_result_coords,
+        last_stats=state.last_conversion_stats,
+        points_count=len(state.training_data),
+        calibration_duplicates=state.calibration.duplicates,
+        calibration_status=state.is_calibrating,
+        calibration_message=state.calibration_status_text,
+        pending_google=state.pending_google is not None,
+        convert_all_pairs=state.convert_all_pairs,
+        server_mode=SERVER_MODE,
+        geocoding=geocoding_service.stats() if geocoding_service else None,
+        clipboard=state.clipboard.stats() if state.clipboard else None,
+        conversion_cache=state.conversion_cache.stats()
+    )
 
 
-# === ИНИЦИАЛИЗАЦИЯ ===
+def publish_location(point):
+    """Событие: для точки определено местоположение (с прогрессом очереди)."""
+    events.publish('location', dict(point_delta(point), geocoding=geocoding_service.stats()))
+
+
+def apply_location(google, location):
+    """Результат геокодинга: новый снимок калибровки и события для клиентов."""
+    for point in state.set_location(google, location):
+        publish_location(point)
 
-state = AppState()
-state.load_config()
-geocoding_service = GeocodingWorker()
 
+def publish_status():
+    events.publish('status', get_status())
 
-# === ЛОГИКА ОПРЕДЕЛЕНИЯ ПОРЯДКА КООРДИНАТ ===
 
-def check_swap_heuristic(coord1, coord2, state=None):
+def set_calibration_message(text):
+    """Обновляет сообщение режима калибровки и отправляет его клиентам."""
+    state.calibration_status_text = text
+    events.publish('calibration', {"message": text, "pending_google": state.pending_google is not None})
+
+
+def convert_all_coords(text, model, converter=None):
     """
-    Определяет правильный порядок координат: (Google, Yandex).
-    Использует правило: у Google больше 7 знаков после запятой (через guess_source_type).
+    Конвертирует все пары координат текста одним пакетом на снимке model
+    (см. convert_text). Возвращает (новый текст, статистика: пар, символов,
+    секунд, пар в секунду, версия калибровки).
     """
-    type1 = guess_source_type(coord1)
-    type2 = guess_source_type(coord2)
-    
-    # Если первая — Yandex, а вторая — Google, меняем их местами
-    if type1 == "Yandex" and type2 == "Google":
-        return coord2, coord1
-        
-    return coord1, coord2
+    start = time.perf_counter()
+    result, count = convert_text(text, model, converter=converter)
+    elapsed = time.perf_counter() - start
+    metrics.observe('convert_text_seconds', elapsed)
+    return result, {
+        "count": count,
+        "chars": len(text),
+        "seconds": round(elapsed, 4),
+        "pts_per_s": round(count / elapsed) if elapsed > 0 else None,
+        "version": model.version,
+    }
 
 
 # === МОНИТОРИНГ БУФЕРА ОБМЕНА ===
 
 def monitor_clipboard_task():
     """Фоновый мониторинг буфера обмена для конвертации/калибровки."""
+    clipboard = state.get_clipboard()
+    clipboard.reset()
     while state.is_monitoring:
         try:
             # Ожидаем новое содержимое
             try:
-                text = wait_for_new_paste(timeout=1)
+                text = clipboard.wait_for_change(timeout=1)
             except TimeoutError:
                 continue
             
-            if not text or len(text) > 5000:
+            if not text or (len(text) > CLIPBOARD_MAX_CHARS and not state.convert_all_pairs):
                 continue
             
             state.last_clipboard = text
             
-            m = coord_re.search(text)
-            if not m:
+            with metrics.timer('parse_seconds'):
+                coords = parse_coords(text)
+            # Пары целых чисел (номера, размеры) — не координаты
+            if coords is None or not coords.precision:
                 continue
                 
-            coords_str = f"{m.group(1)}, {m.group(2)}"
+            coords_str = coords.text
             
             # === РЕЖИМ КАЛИБРОВКИ ===
             if state.is_calibrating:
                 if state.pending_google is None:
                     # Первая координата пары
                     state.pending_google = coords_str
-                    src_type = guess_source_type(coords_str)
+                    state.pending_source = src_type = coords.source
                     
                     if src_type == "Google":
                         wait_for = "Yandex (короткие)"
@@ -389,7 +412,7 @@ def monitor_clipboard_task():
                     else:
                         wait_for = "вторую координату"
                         
-                    state.calibration_status_text = f"Получен {src_type}. Скопируйте {wait_for}..."
+                    set_calibration_message(f"Получен {src_type}. Скопируйте {wait_for}...")
                     print(f"[КАЛИБРОВКА] Первая координата: {src_type}")
                 else:
                     # Вторая координата пары
@@ -400,34 +423,24 @@ def monitor_clipboard_task():
                         print("[КАЛИБРОВКА] Одинаковые координаты, пропуск")
                         continue
                     
-                    type_1 = guess_source_type(raw_1)
-                    type_2 = guess_source_type(raw_2)
+                    type_1 = state.pending_source
+                    type_2 = coords.source
                     
                     print(f"[КАЛИБРОВКА] Координата 1: {type_1}, Координата 2: {type_2}")
                     
                     # Проверка что типы разные
                     if type_1 == type_2:
-                        state.calibration_status_text = f"⚠️ Обе координаты {type_1}! Нужна пара: Google + Yandex"
+                        set_calibration_message(f"⚠️ Обе координаты {type_1}! Нужна пара: Google + Yandex")
                         print(f"[КАЛИБРОВКА] Обе координаты {type_1}, отклонено")
                         continue
                     
                     # Определяем порядок: Google, потом Yandex
-                    final_google, final_yandex = check_swap_heuristic(raw_1, raw_2, state)
+                    final_google, final_yandex = order_calibration_pair(raw_1, raw_2, type_1, type_2)
                     
-                    state.calibration_status_text = "🌍 Определяю местоположение..."
+                    set_calibration_message("🌍 Определяю местоположение...")
                     
                     # Получаем местоположение синхронно
-                    try:
-                        m_google = coord_re.search(final_google)
-                        if m_google:
-                            lat, lon = float(m_google.group(1)), float(m_google.group(2))
-                            time.sleep(1.2)
-                            location = reverse_geocode(lat, lon)
-                        else:
-                            location = "Город не найден"
-                    except Exception as e:
-                        print(f"Ошибка геокодинга: {e}")
-                        location = "Город не найден"
+                    location = get_location_for_point_sync({"google": final_google})
                     
                     # Добавляем точку
                     new_point = {
@@ -436,29 +449,58 @@ def monitor_clipboard_task():
                         "location": location
                     }
                     
-                    state.training_data.append(new_point)
-                    state.save_config()
+                    added, _ = state.add_points([new_point])
+                    state.pending_google = None
+                    if not added:
+                        print(f"[КАЛИБРОВКА] Пара уже есть: G: {final_google} | Y: {final_yandex}")
+                        set_calibration_message("⚠️ Такая пара уже есть. Скопируйте следующую пару...")
+                        continue
                     
-                    print(f"[КАЛИБРОВКА] Добавлено: {location} | G: {final_google} | Y: {final_yandex}")
+                    events.publish('points_added', {
+                        "points": [point_delta(p) for p in added],
+                        "points_count": len(state.training_data)
+                    })
                     
-                    state.pending_google = None
-                    state.calibration_status_text = f"✅ Добавлено: {location}. Скопируйте следующую пару..."
+                    print(f"[КАЛИБРОВКА] Добавлено: {location} | G: {final_google} | Y: {final_yandex}")
+                    set_calibration_message(f"✅ Добавлено: {location}. Скопируйте следующую пару...")
                 
                 continue
 
             # === РЕЖИМ КОНВЕРТАЦИИ ===
-            glat, glon = float(m.group(1)), float(m.group(2))
-            
-            if len(m.group(1)) < 2 and len(m.group(2)) < 2:
+            # Ссылка Яндекса — уже координаты Яндекса
+            if coords.kind == 'yandex_url':
+                continue
+
+            # Несколько пар (таблица, список маршрута) — заменяем все на месте,
+            # только если это явно включено: иначе числа в скопированной таблице
+            # или журнале изменений молча исправились бы в буфере обмена
+            if state.convert_all_pairs and coords.kind in TEXT_KINDS and any(
+                    c.precision for c in tokenize(text, TEXT_KINDS, coords.end)):
+                res, stats = convert_all_coords(text, state.get_model())
+                with metrics.timer('clipboard_write_seconds'):
+                    clipboard.copy(res)
+                found = f"Пар координат: {stats['count']}"
+                result = "Текст с заменёнными координатами скопирован"
+                state.last_clipboard = res
+                state.last_found_coords = found
+                state.last_result_coords = result
+                state.last_conversion_stats = stats
+                events.publish('conversion', {"found": found, "result": result, "stats": stats})
+                print(f"[КОНВЕРТАЦИЯ] Пар: {stats['count']}, {stats['seconds']} с")
                 continue
 
-            calib_list = state.get_calib_list()
-            res = convert_coords_advanced(glat, glon, calib_list)
+            glat, glon = coords.lat, coords.lon
+
+            with metrics.timer('convert_seconds'):
+                res = state.conversion_cache.convert_advanced(glat, glon, state.get_model())
             
-            pyperclip.copy(res)
+            with metrics.timer('clipboard_write_seconds'):
+                clipboard.copy(res)
             state.last_clipboard = res
             state.last_found_coords = coords_str
             state.last_result_coords = res
+            state.last_conversion_stats = None
+            events.publish('conversion', {"found": coords_str, "result": res, "stats": None})
             
             print(f"[КОНВЕРТАЦИЯ] {coords_str} -> {res}")
             
@@ -467,6 +509,7 @@ def monitor_clipboard_task():
             import traceback
             traceback.print_exc()
             state.is_monitoring = False
+            publish_status()
             break
 
 
@@ -488,49 +531,314 @@ app = Flask(__name__,
             static_url_path='/static')
 
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+app.before_request(init_app)
+
+
+def desktop_only(view):
+    """
+    Маршрут только для настольного режима: в серверном (SERVER_MODE) запросы,
+    кроме GET, отклоняются — буфер обмена есть только у настольного процесса,
+    а калибровка у воркеров общая и только для чтения.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if SERVER_MODE and request.method != 'GET':
+            return jsonify(success=False, error="Недоступно в серверном режиме"), 403
+        return view(*args, **kwargs)
+    return wrapper
+
 
 @app.route('/')
 def index():
     """Главная страница."""
-    return render_template('index.html')
+    return render_template('index.html', server_mode=SERVER_MODE)
+
+
+def idw_options(data, query=False):
+    """
+    Параметры IDW из тела запроса: neighbors — целое больше 0, max_radius_km —
+    число больше 0; null или отсутствие — без ограничения. query=True —
+    из строки запроса (значения — строки, пустое — без ограничения).
+    Возвращает (k, max_radius_km), при неверном значении — ValueError.
+    """
+    k = data.get('neighbors', IDW_NEIGHBORS)
+    max_radius_km = data.get('max_radius_km', IDW_MAX_RADIUS_KM)
+    if query:
+        k = _query_number(k, int, "neighbors — целое число больше 0")
+        max_radius_km = _query_number(max_radius_km, float, "max_radius_km — число больше 0")
+    if k is not None and (isinstance(k, bool) or not isinstance(k, int) or k <= 0):
+        raise ValueError("neighbors — целое число больше 0 или null")
+    if max_radius_km is not None and (
+            isinstance(max_radius_km, bool) or not isinstance(max_radius_km, (int, float))
+            or not math.isfinite(max_radius_km) or max_radius_km <= 0):
+        raise ValueError("max_radius_km — число больше 0 или null")
+    return k, max_radius_km
+
+
+def _query_number(value, kind, error):
+    """Число из строки запроса (kind — int или float); пустая строка — None."""
+    if not isinstance(value, str):
+        return value
+    if not value.strip():
+        return None
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(error) from None
 
 
 @app.route('/api/convert', methods=['POST'])
 def api_convert():
-    """API: Ручная конвертация координат."""
+    """
+    API: Ручная конвертация координат (первая пара в coords).
+    {"direction": "y2g"} — обратная конвертация Yandex → Google (по умолчанию g2y).
+    {"check": true} — проверка обратным ходом: в ответе roundtrip_error_m,
+    расстояние (м) между исходной точкой и результатом, переведённым обратно.
+    {"all": true} — все пары текста заменяются на месте одним пакетом
+    (mode: idw, grid или fit), в ответе — текст и статистика.
+    {"neighbors": k, "max_radius_km": r} — параметры IDW (см. idw_options).
+    """
     data = request.json
     text = data.get('coords', '')
-    m = coord_re.search(text)
-    if m:
+    direction = data.get('direction', DIRECTION_FORWARD)
+    if direction not in DIRECTIONS:
+        return jsonify(success=False, error="Поддерживаются направления g2y и y2g"), 400
+    try:
+        k, max_radius_km = idw_options(data)
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    model = state.get_model().for_direction(direction)
+    if data.get('all'):
+        return convert_all_response(text, data.get('mode', 'idw'), model)
+    with metrics.timer('parse_seconds'):
+        coords = parse_coords(text)
+    if coords is not None:
         try:
-            glat, glon = float(m.group(1)), float(m.group(2))
-            calib_list = state.get_calib_list()
-            res = convert_coords_advanced(glat, glon, calib_list)
+            glat, glon = coords.lat, coords.lon
+            if data.get('check'):
+                with metrics.timer('convert_seconds'):
+                    [((lat, lon), error_m)] = convert_roundtrip(
+                        [(glat, glon)], model, k, max_radius_km)
+                return jsonify(success=True, result=f"{lat:.6f}, {lon:.6f}",
+                               roundtrip_error_m=round(error_m, 4))
+            with metrics.timer('convert_seconds'):
+                res = state.conversion_cache.convert_advanced(
+                    glat, glon, model, k, max_radius_km)
             return jsonify(success=True, result=res)
         except Exception as e:
             return jsonify(success=False, error=str(e))
     return jsonify(success=False, error="Неверный формат координат")
 
 
+def convert_all_response(text, mode, model):
+    """Ответ /api/convert с all=true (model — модель нужного направления)."""
+    if mode != 'idw' and mode not in FAST_CONVERTERS:
+        return jsonify(success=False, error="Поддерживаются режимы idw, grid и fit"), 400
+    converter = state.get_converter(mode, model) if mode != 'idw' else None
+    result, stats = convert_all_coords(text, model, converter)
+    if not stats['count']:
+        return jsonify(success=False, error="Координаты не найдены")
+    return jsonify(success=True, result=result, stats=stats)
+
+
+def iter_batch_input():
+    """Строки пакетного запроса: JSON-массив или текст (по строке на точку)."""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError("Ожидается JSON-массив")
+        return iter(data)
+
+    # Текст читаем потоково, не загружая тело запроса целиком; построчно через
+    # readline — поток тела у WSGI-серверов (gunicorn) не всегда полноценный io-объект
+    lines = iter(request.stream.readline, b'')
+    return (line.decode('utf-8', errors='replace').rstrip('\r\n') for line in lines)
+
+
+def convert_batch_rows(rows, model, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM,
+                       converter=None, check=False, back_converter=None):
+    """
+    Конвертирует поток строк блоками по BATCH_CHUNK_SIZE на одной модели
+    (или ускоренным конвертером converter). Выдаёт (номер, вход, результат,
+    ошибка, ошибка обратного хода в метрах); ошибка разбора не прерывает пакет.
+    check — проверка обратным ходом (см. convert_roundtrip) обратной моделью
+    или back_converter; без неё ошибка обратного хода — None.
+    """
+    chunk = []
+
+    def flush():
+        valid = [(i, coords) for i, _, coords, _ in chunk if coords is not None]
+        points = [c for _, c in valid]
+        if check:
+            checked = convert_roundtrip(points, model, k, max_radius_km, converter, back_converter)
+            results = [f"{lat:.6f}, {lon:.6f}" for (lat, lon), _ in checked]
+            errors_m = [round(error_m, 4) for _, error_m in checked]
+        else:
+            if converter is not None:
+                results = converter.convert_batch(points)
+            else:
+                results = convert_coords_batch(points, model, k, max_radius_km)
+            errors_m = [None] * len(results)
+        converted = {i: res for (i, _), res in zip(valid, zip(results, errors_m))}
+        for i, item, coords, error in chunk:
+            res, error_m = converted.get(i, (None, None))
+            yield i, item, res, error, error_m
+
+    for i, item in enumerate(rows, 1):
+        if isinstance(item, str) and not item.strip():
+            continue
+        try:
+            coords, error = parse_batch_row(item), None
+        except (ValueError, TypeError) as e:
+            coords, error = None, str(e)
+        chunk.append((i, item, coords, error))
+        if len(chunk) >= BATCH_CHUNK_SIZE:
+            yield from flush()
+            chunk = []
+
+    if chunk:
+        yield from flush()
+
+
+@app.route('/api/convert/batch', methods=['POST'])
+def api_convert_batch():
+    """
+    API: Пакетная конвертация. Вход — JSON-массив или текст по строке на точку,
+    ответ передаётся потоково в NDJSON (по умолчанию) или CSV (?format=csv).
+    ?mode=grid — по предрассчитанной сетке поправок (быстрее, отклонение от
+    точного IDW — доли метра, см. scripts/grid_report.py);
+    ?mode=fit — районными аппроксимациями там, где они точнее IDW
+    по скользящему контролю (см. scripts/fit_report.py).
+    ?direction=y2g — обратная конвертация Yandex → Google.
+    ?check=1 — проверка обратным ходом: у каждой строки roundtrip_error_m (м).
+    ?neighbors=&max_radius_km= — параметры IDW (см. idw_options); неверные —
+    ответ 400 до начала потоковой выдачи.
+    """
+    out_format = request.args.get('format', 'ndjson').lower()
+    if out_format not in ('ndjson', 'csv'):
+        return jsonify(success=False, error="Поддерживаются форматы ndjson и csv"), 400
+    mode = request.args.get('mode', 'idw').lower()
+    if mode != 'idw' and mode not in FAST_CONVERTERS:
+        return jsonify(success=False, error="Поддерживаются режимы idw, grid и fit"), 400
+
+    direction = request.args.get('direction', DIRECTION_FORWARD).lower()
+    if direction not in DIRECTIONS:
+        return jsonify(success=False, error="Поддерживаются направления g2y и y2g"), 400
+    check = request.args.get('check') == '1'
+
+    try:
+        k, max_radius_km = idw_options(request.args, query=True)
+        rows = iter_batch_input()
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+
+    # Один снимок калибровки на весь пакет
+    model = state.get_model().for_direction(direction)
+    converter = back_converter = None
+    if mode != 'idw':
+        converter = state.get_converter(mode, model, k, max_radius_km)
+        if check:
+            back_converter = state.get_converter(mode, model.inverse(), k, max_radius_km)
+    results = convert_batch_rows(rows, model, k, max_radius_km, converter, check, back_converter)
+
+    def generate_ndjson():
+        for i, item, res, error, error_m in results:
+            if error:
+                row = {"row": i, "input": item, "success": False, "error": error}
+            else:
+                row = {"row": i, "input": item, "success": True, "result": res}
+                if check:
+                    row["roundtrip_error_m"] = error_m
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    def generate_csv():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(["row", "input", "result", "error"] + (["roundtrip_error_m"] if check else []))
+        for i, item, res, error, error_m in results:
+            if not isinstance(item, str):
+                item = json.dumps(item, ensure_ascii=False)
+            row = [i, item, res or "", error or ""]
+            if check:
+                row.append("" if error_m is None else error_m)
+            writer.writerow(row)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue()
+
+    if out_format == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'X-Calibration-Version': str(model.version)})
+
+
 @app.route('/api/status')
 def api_status():
     """API: Текущий статус приложения."""
-    status = "stopped"
-    if state.is_monitoring:
-        status = "calibrating" if state.is_calibrating else "working"
+    return jsonify(**get_status())
+
+
+@app.route('/api/events')
+def api_events():
+    """API: Поток событий (Server-Sent Events) вместо опроса /api/status."""
+    initial = [format_sse('status', get_status())]
+    return Response(events.stream(initial), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/metrics')
+def api_metrics():
+    """API: Гистограммы времени горячих путей (?format=json|prometheus)."""
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.to_prometheus(),
+                        mimetype='text/plain; version=0.0.4; charset=utf-8')
+    return jsonify(dict(
+        metrics.to_json(),
+        conversion_cache=state.conversion_cache.stats(),
+        geocoding=geocoding_service.stats() if geocoding_service else None,
+        clipboard=state.clipboard.stats() if state.clipboard else None
+    ))
+
+
+@app.route('/api/metrics/profile', methods=['GET', 'POST'])
+@desktop_only
+def api_profile():
+    """
+    API: Выборочное профилирование cProfile.
+    POST {"enabled": true, "rate": 0.1} включает (статистика сбрасывается), {"enabled": false} выключает;
+    GET возвращает текстовый отчёт (?sort=cumulative|tottime&limit=30).
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('enabled', True):
+            rate = data.get('rate', metrics.profiler.rate)
+            if (isinstance(rate, bool) or not isinstance(rate, (int, float))
+                    or not 0 <= rate <= 1):
+                return jsonify(success=False, error="rate — число от 0 до 1"), 400
+            metrics.profiler.start(float(rate))
+        else:
+            metrics.profiler.stop()
+        return jsonify(success=True, **metrics.profiler.stats())
     
-    return jsonify(
-        status=status,
-        last_found=state.last_found_coords,
-        last_result=state.last_result_coords,
-        points_count=len(state.training_data),
-        calibration_status=state.is_calibrating,
-        calibration_message=state.calibration_status_text,
-        pending_google=state.pending_google is not None
-    )
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in PROFILE_SORT_KEYS:
+        return jsonify(success=False, error=f"sort — одно из: {', '.join(PROFILE_SORT_KEYS)}"), 400
+    try:
+        limit = _query_number(request.args.get('limit', ''), int, "limit — целое число больше 0")
+        if limit is not None and limit <= 0:
+            raise ValueError("limit — целое число больше 0")
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    report = metrics.profiler.report(sort, limit or PROFILE_REPORT_LIMIT)
+    return Response(report, mimetype='text/plain; charset=utf-8')
 
 
 @app.route('/api/monitoring/start', methods=['POST'])
+@desktop_only
 def start_monitoring():
     """API: Запуск мониторинга буфера обмена."""
     if not state.is_monitoring:
@@ -539,10 +847,23 @@ def start_monitoring():
         state.pending_google = None
         thread = threading.Thread(target=monitor_clipboard_task, daemon=True)
         thread.start()
+    publish_status()
     return jsonify(success=True)
 
 
+@app.route('/api/monitoring/options', methods=['POST'])
+@desktop_only
+def monitoring_options():
+    """API: Настройки мониторинга ({"convert_all": bool} — заменять все пары в тексте)."""
+    data = request.get_json(silent=True) or {}
+    if 'convert_all' in data:
+        state.convert_all_pairs = bool(data['convert_all'])
+    publish_status()
+    return jsonify(success=True, convert_all=state.convert_all_pairs)
+
+
 @app.route('/api/calibration/start', methods=['POST'])
+@desktop_only
 def start_calibration():
     """API: Запуск режима калибровки."""
     state.is_calibrating = True
@@ -554,47 +875,125 @@ def start_calibration():
         
     state.pending_google = None
     state.calibration_status_text = "Режим калибровки. Скопируйте первую координату..."
+    publish_status()
     return jsonify(success=True)
 
 
 @app.route('/api/monitoring/stop', methods=['POST'])
+@desktop_only
 def stop_monitoring():
     """API: Остановка мониторинга."""
     state.is_monitoring = False
     state.is_calibrating = False
     state.pending_google = None
     state.calibration_status_text = ""
+    publish_status()
     return jsonify(success=True)
 
 
 @app.route('/api/calibration/data', methods=['GET', 'DELETE'])
+@desktop_only
 def calibration_data():
-    """API: Получение/удаление калибровочных данных."""
+    """
+    API: Получение/удаление калибровочных данных.
+    GET без параметров — весь набор массивом;
+    ?offset=&limit=[&version=] — страница снимка (version закрепляет версию
+    для следующих страниц, 409 — снимок уже не хранится);
+    ?since=версия — только изменения после неё (full=true — дельта
+    недоступна, набор нужно перечитать постранично).
+    """
     if request.method == 'GET':
-        return jsonify(state.training_data)
+        if 'since' in request.args:
+            return calibration_delta()
+        if 'offset' in request.args or 'limit' in request.args:
+            return calibration_page()
+        return jsonify(list(state.training_data))
     
     if request.method == 'DELETE':
+        # Список id точек; для совместимости принимаются и объекты {id} или {google, yandex}
         items_to_delete = request.json
         if not items_to_delete:
             return jsonify(success=False)
-            
-        new_data = []
-        for item in state.training_data:
-            should_delete = False
-            for del_item in items_to_delete:
-                if (item['google'].strip() == del_item['google'].strip() and 
-                    item['yandex'].strip() == del_item['yandex'].strip()):
-                    should_delete = True
-                    break
-            if not should_delete:
-                new_data.append(item)
         
-        state.training_data = new_data
-        state.save_config()
-        return jsonify(success=True)
+        ids = []
+        for item in items_to_delete:
+            if isinstance(item, dict):
+                ids.append(item.get('id') or point_id(item))
+            else:
+                ids.append(item)
+        
+        removed = state.remove_points(ids)
+        events.publish('points_removed', {
+            "points": [point_delta(p) for p in removed],
+            "points_count": len(state.training_data)
+        })
+        return jsonify(success=True, count=len(removed))
+
+
+def calibration_page():
+    """Страница точек одного снимка калибровки."""
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(1, request.args.get('limit', CALIBRATION_PAGE_SIZE, type=int)),
+                CALIBRATION_PAGE_MAX)
+    version = request.args.get('version', type=int)
+    if version is None:
+        snapshot = state.calibration.snapshot
+        version, points = snapshot.version, snapshot.points
+    else:
+        points = state.calibration.points_at(version)
+        if points is None:
+            return jsonify(success=False, error="Версия калибровки устарела",
+                           version=state.calibration.snapshot.version), 409
+    end = offset + limit
+    return jsonify(success=True, version=version, total=len(points), offset=offset,
+                   next=end if end < len(points) else None, points=points[offset:end])
+
+
+def calibration_delta():
+    """Изменения калибровки после версии ?since=."""
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify(success=False, error="since — номер версии"), 400
+    delta = state.calibration.changes_since(since)
+    if delta is None:
+        snapshot = state.calibration.snapshot
+        return jsonify(success=True, full=True, version=snapshot.version, total=len(snapshot))
+    snapshot, points, removed = delta
+    return jsonify(success=True, full=False, version=snapshot.version, total=len(snapshot),
+                   points=points, removed=removed)
+
+
+@app.route('/api/calibration/quality')
+def calibration_quality():
+    """
+    API: Анализ качества калибровки — ошибка скользящего контроля каждой
+    точки, выбросы, дубликаты и сводка по районам (см. gootoya.quality).
+    ?points=all — все точки (по умолчанию только выбросы), ?neighbors=0 —
+    скользящий контроль по всем точкам, а не по ближайшим; отрицательное
+    neighbors и max_radius_km не больше 0 — ошибка 400.
+    """
+    error = "neighbors — целое число не меньше 0 (0 — все точки)"
+    try:
+        k = _query_number(request.args.get('neighbors', ''), int, error)
+        if k is not None and k < 0:
+            raise ValueError(error)
+        k, max_radius_km = idw_options({
+            'neighbors': QUALITY_NEIGHBORS if k is None else k or None,
+            'max_radius_km': request.args.get('max_radius_km', IDW_MAX_RADIUS_KM),
+        }, query=True)
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    snapshot = state.calibration.snapshot
+    with metrics.timer('quality_seconds'):
+        report = analyze_calibration(snapshot.points, k, max_radius_km)
+    if request.args.get('points') != 'all':
+        report['points'] = [p for p in report['points'] if p['outlier']]
+    report['summary']['version'] = snapshot.version
+    return jsonify(success=True, **report)
 
 
 @app.route('/api/calibration/save', methods=['POST'])
+@desktop_only
 def save_calib():
     """API: Сохранение калибровочных данных."""
     success = state.save_config()
@@ -602,13 +1001,16 @@ def save_calib():
 
 
 @app.route('/api/calibration/load', methods=['POST'])
+@desktop_only
 def load_calib():
     """API: Загрузка калибровочных данных."""
     success = state.load_config()
+    events.publish('points_reloaded', {"points_count": len(state.training_data)})
     return jsonify(success=success)
 
 
 @app.route('/api/calibration/import', methods=['POST'])
+@desktop_only
 def import_calib():
     """API: Импорт калибровочных данных из JSON."""
     try:
@@ -616,21 +1018,19 @@ def import_calib():
         if not isinstance(new_data, list):
             return jsonify(success=False, error="Неверный формат")
             
-        valid_count = 0
+        candidates = []
         for item in new_data:
-            if 'google' in item and 'yandex' in item:
-                is_exist = any(
-                    x['google'] == item['google'] and x['yandex'] == item['yandex'] 
-                    for x in state.training_data
-                )
-                if not is_exist:
-                    if 'location' not in item:
-                        item['location'] = ""
-                    state.training_data.append(item)
-                    valid_count += 1
+            if isinstance(item, dict) and 'google' in item and 'yandex' in item:
+                candidates.append(item)
         
-        state.save_config()
-        return jsonify(success=True, count=valid_count)
+        added, duplicates = state.add_points(candidates)
+        if added:
+            events.publish('points_added', {
+                "points": [point_delta(p) for p in added],
+                "points_count": len(state.training_data)
+            })
+        return jsonify(success=True, count=len(added), duplicates=duplicates,
+                       invalid=len(new_data) - len(candidates))
     except Exception as e:
         return jsonify(success=False, error=str(e))
 
@@ -638,27 +1038,35 @@ def import_calib():
 @app.route('/api/calibration/export', methods=['POST'])
 def export_calib():
     """API: Экспорт калибровочных данных в JSON."""
-    return jsonify(state.training_data)
+    return jsonify([public_point(p) for p in state.training_data])
 
 
 @app.route('/api/clipboard/copy', methods=['POST'])
+@desktop_only
 def clipboard_copy():
     """API: Копирование текста в буфер обмена."""
+    import pyperclip
     text = request.json.get('text', '')
     pyperclip.copy(text)
     return jsonify(success=True)
 
 
 @app.route('/api/calibration/update-locations', methods=['POST'])
+@desktop_only
 def update_locations():
     """API: Обновление местоположений для точек без геоданных."""
+    points = [
+        point for point in state.training_data
+        if not point.get('location') or point.get('location') in [NOT_FOUND, FETCH_FAILED, LOADING]
+    ]
+    # Отметка «Загрузка...» ставится до постановки в очередь, чтобы не затереть готовый результат
+    state.calibration.set_locations({p['google'].strip(): LOADING for p in points})
     updated_count = 0
-    for point in state.training_data:
-        loc = point.get('location', '')
-        if not loc or loc in ["Город не найден", "Не удалось получить данные", "Загрузка..."]:
-             geocoding_service.add_task(point)
-             updated_count += 1
+    for point in points:
+        if geocoding_service.add_task(point):
+            updated_count += 1
     
+    events.publish('geocoding', geocoding_service.stats())
     return jsonify(success=True, message=f"В очередь добавлено: {updated_count}", count=updated_count)
 
 
@@ -698,6 +1106,14 @@ def open_window(port):
 
 if __name__ == '__main__':
     PORT = 5002
+    init_app()
+    
+    # Проверка наличия pywebview
+    try:
+        import webview
+        HAS_WEBVIEW = True
+    except ImportError:
+        HAS_WEBVIEW = False
     
     if HAS_WEBVIEW:
         try:
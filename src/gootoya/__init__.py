@@ -0,0 +1,12 @@
+"""Конвертация координат Google Maps → Яндекс.Карты (IDW по калибровочным точкам)."""
+from .core import (
+    BASE_CALIBRATION, HAS_NUMPY, DIRECTION_FORWARD, DIRECTION_INVERSE, DIRECTIONS, coord_re,
+    CalibrationModel, ConversionCache, GridIndex, get_distance,
+    convert_coords_advanced, convert_coords_pair, convert_coords_pairs, convert_coords_batch,
+    convert_roundtrip, convert_text, find_coords,
+    load_training_data, base_training_data, leave_one_out,
+)
+from .coords import Coords, parse_coords, tokenize
+from .fit import FittedTransform
+from .grid import CorrectionGrid
+from .quality import analyze as analyze_calibration
@@ -0,0 +1,301 @@
+"""
+Калибровочный набор как последовательность неизменяемых снимков.
+
+Читатели (конвертация, API) берут текущий снимок одной операцией чтения
+атрибута и работают с ним без блокировок: снимок и его точки никогда не
+меняются. Писатели проходят через единый API CalibrationData — под общей
+блокировкой строится новый снимок, записывается журнал изменений и ссылка
+на снимок атомарно подменяется. Добавление в конец делит хранилище точек
+с предыдущим снимком (PointList), удаление и замена точек копируют набор.
+
+Для клиентов, которые держат копию набора (таблица в веб-интерфейсе),
+хранятся журнал последних изменений (дельты «что изменилось после версии N»)
+и точки последних снимков (постраничное чтение одной версии).
+"""
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from itertools import islice
+
+from .core import CalibrationModel
+from .storage import point_id, public_point
+
+# Сколько последних изменений хранится для дельт (changes_since)
+CHANGELOG_SIZE = 1000
+
+# Сколько последних снимков доступно для постраничного чтения (points_at)
+SNAPSHOT_HISTORY = 8
+
+
+class PointList(Sequence):
+    """
+    Точки снимка с индексом по id поверх общего хранилища: список точек и
+    словарь id → позиция. Снимок видит первые size точек; точки и позиции
+    в этих пределах не меняются, поэтому добавление в конец дописывает
+    хранилище на месте (O(добавленных)), а прежние снимки новых точек не
+    видят. Удаление и замена точек строят новое хранилище (unique).
+    """
+
+    __slots__ = ('_items', '_positions', '_size')
+
+    def __init__(self, items=None, positions=None):
+        self._items = [] if items is None else items
+        self._positions = {} if positions is None else positions
+        self._size = len(self._items)
+
+    @classmethod
+    def unique(cls, points):
+        """Новое хранилище без повторов пары: из одинаковых остаётся первая."""
+        return cls().extend(points)[0]
+
+    def extend(self, points):
+        """
+        Назначает точкам id и возвращает (новый PointList, добавленные точки);
+        пары, которые уже есть, пропускаются (точки при этом не изменяются).
+        """
+        items, positions = self._items, self._positions
+        if len(items) != self._size:
+            # Хранилище уже продолжено после этого снимка: копия его части
+            items = items[:self._size]
+            positions = {pid: i for pid, i in positions.items() if i < self._size}
+        added = []
+        for point in points:
+            pid = point.get('id') or point_id(point)
+            if positions.get(pid, len(items)) < len(items):
+                continue
+            point['id'] = pid
+            positions[pid] = len(items)
+            items.append(point)
+            added.append(point)
+        return PointList(items, positions), added
+
+    def get(self, pid):
+        i = self._positions.get(pid)
+        if i is None or i >= self._size:
+            return None
+        return self._items[i]
+
+    def __contains__(self, pid):
+        # Как у PointIndex: проверка по id, а не по самой точке
+        return self.get(pid) is not None
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return islice(self._items, self._size)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return tuple(self._items[i] for i in range(*key.indices(self._size)))
+        if key < 0:
+            key += self._size
+        if not 0 <= key < self._size:
+            raise IndexError("индекс точки вне снимка")
+        return self._items[key]
+
+
+class CalibrationSnapshot:
+    """
+    Неизменяемый снимок: точки с индексом по id (PointList) и модель калибровки.
+    Точки — обычные dict, но изменять их нельзя: изменение — это новый снимок.
+    id точек в снимке уникальны: повторы пары отбрасываются.
+    """
+
+    __slots__ = ('version', 'points', '_model')
+
+    def __init__(self, points=(), version=0, model=None):
+        if not isinstance(points, PointList):
+            points = PointList.unique(points)
+        self.version = version
+        self.points = points
+        self._model = model
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def get(self, pid):
+        return self.points.get(pid)
+
+    def model(self):
+        """
+        Модель калибровки снимка, строится при первом обращении. Гонка двух
+        потоков безопасна: оба построят одинаковую модель, останется одна.
+        """
+        model = self._model
+        if model is None:
+            model = CalibrationModel.from_training_data(self.points, self.version)
+            self._model = model
+        return model
+
+
+class CalibrationData:
+    """
+    Единый API изменения калибровочного набора. Все изменения сериализуются
+    блокировкой, каждое создаёт снимок со следующим номером версии и
+    (если задан store — CalibrationStore) дописывается в журнал.
+    """
+
+    def __init__(self, points=(), store=None):
+        self.store = store
+        self._lock = threading.Lock()
+        self.snapshot = CalibrationSnapshot(points)
+        # Журнал изменений: (версия, id изменённых или добавленных, id удалённых)
+        self._changes = deque(maxlen=CHANGELOG_SIZE)
+        # Версия последней замены набора целиком: дельты от более ранних не строятся
+        self._full_version = 0
+        self._history = OrderedDict([(0, self.snapshot.points)])
+        # Повторы пары в файле store, отброшенные при загрузке: в файле они
+        # остаются до явного сохранения (compact)
+        self.duplicates = 0
+
+    def _publish(self, points, model=None, upserted=None, removed=None):
+        """
+        Публикует новый снимок. upserted/removed — id изменённых и удалённых
+        точек для журнала дельт; без них считается, что набор заменён целиком.
+        """
+        snapshot = CalibrationSnapshot(points, self.snapshot.version + 1, model)
+        if upserted is None and removed is None:
+            self._changes.clear()
+            self._full_version = snapshot.version
+        else:
+            self._changes.append((snapshot.version, tuple(upserted or ()), tuple(removed or ())))
+        self._history[snapshot.version] = snapshot.points
+        while len(self._history) > SNAPSHOT_HISTORY:
+            self._history.popitem(last=False)
+        self.snapshot = snapshot
+        return snapshot
+
+    def changes_since(self, version):
+        """
+        Изменения после версии version: (снимок, изменённые или добавленные
+        точки, id удалённых). None — дельта недоступна (версия вышла из
+        журнала или набор с тех пор заменялся целиком): набор нужно перечитать.
+        """
+        with self._lock:
+            snapshot = self.snapshot
+            changes = list(self._changes)
+            full_version = self._full_version
+        oldest = changes[0][0] if changes else snapshot.version + 1
+        if version > snapshot.version or version < max(full_version, oldest - 1):
+            return None
+        touched = {}
+        for change_version, upserted, removed in changes:
+            if change_version > version:
+                touched.update(dict.fromkeys(upserted))
+                touched.update(dict.fromkeys(removed))
+        points = [p for p in map(snapshot.get, touched) if p is not None]
+        removed = [pid for pid in touched if snapshot.get(pid) is None]
+        return snapshot, points, removed
+
+    def points_at(self, version):
+        """Точки (PointList) снимка version, если он ещё хранится (иначе None)."""
+        with self._lock:
+            return self._history.get(version)
+
+    def _journal(self, op, points):
+        """
+        Дописывает изменение в журнал (op — метод CalibrationStore);
+        при переполнении журнала сохраняет снимок.
+        """
+        if self.store is None or not points:
+            return True
+        try:
+            if getattr(self.store, op)(points):
+                self.store.compact(self.snapshot.points)
+                self.duplicates = 0
+            return True
+        except Exception as e:
+            print(f"Ошибка записи журнала калибровки: {e}")
+            return False
+
+    def load(self):
+        """
+        Перечитывает набор из store (снимок + журнал). Повторы одной пары
+        отбрасываются только в памяти: файл не переписывается, число повторов
+        остаётся в duplicates до явного сохранения.
+        """
+        with self._lock:
+            points = self.store.load()
+            for point in points:
+                if point.get('location') in [None, "Загрузка...", "Loading..."]:
+                    point['location'] = ""
+            snapshot = self._publish(points)
+            self.duplicates = len(points) - len(snapshot)
+            if self.duplicates:
+                print(f"Повторяющиеся калибровочные точки в файле: {self.duplicates} "
+                      "(учтены один раз, уйдут из файла при сохранении)")
+            return snapshot
+
+    def replace(self, points):
+        """Заменяет набор целиком (без журнала)."""
+        with self._lock:
+            return self._publish(points)
+
+    def compact(self):
+        """Записывает полный снимок в store и начинает пустой журнал."""
+        with self._lock:
+            self.store.compact(self.snapshot.points)
+            self.duplicates = 0
+
+    def add(self, points):
+        """
+        Добавляет точки, пропуская уже имеющиеся пары (проверка по индексу, O(1)).
+        Хранилище точек делится с текущим снимком: стоимость не зависит от
+        размера набора. Возвращает (добавленные точки, число дубликатов).
+        """
+        # Копии без чужого id: id вычисляется по координатам
+        points = [public_point(point) for point in points]
+        for point in points:
+            point['location'] = point.get('location') or ""
+        with self._lock:
+            extended, added = self.snapshot.points.extend(points)
+            if added:
+                self._publish(extended, upserted=[p['id'] for p in added])
+                self._journal('append_added', added)
+            return added, len(points) - len(added)
+
+    def remove(self, ids):
+        """Удаляет точки по id за один проход по набору. Возвращает удалённые точки."""
+        with self._lock:
+            current = self.snapshot
+            ids = {pid for pid in ids if pid in current.points}
+            if not ids:
+                return []
+            removed = [p for p in current.points if p['id'] in ids]
+            self._publish(PointList.unique(p for p in current.points if p['id'] not in ids),
+                          removed=ids)
+            self._journal('append_removed', removed)
+            return removed
+
+    def set_locations(self, locations):
+        """
+        Записывает местоположения по ключу google-координат ({google: location}).
+        Изменённые точки заменяются копиями; модель калибровки переносится
+        в новый снимок (координаты не менялись). В журнал не пишет — см.
+        journal_locations. Возвращает новые точки.
+        """
+        with self._lock:
+            current = self.snapshot
+            points = []
+            updated = []
+            for point in current.points:
+                location = locations.get(point.get('google', '').strip())
+                if location is not None and location != point.get('location'):
+                    point = dict(point, location=location)
+                    updated.append(point)
+                points.append(point)
+            if updated:
+                self._publish(PointList.unique(points), current._model,
+                              upserted=[p['id'] for p in updated])
+            return updated
+
+    def journal_locations(self, locations):
+        """Дописывает в журнал текущие местоположения точек с указанными google-ключами."""
+        with self._lock:
+            points = [p for p in self.snapshot.points
+                      if p.get('google', '').strip() in locations]
+            return self._journal('append_updated', points)
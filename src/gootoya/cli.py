@@ -0,0 +1,513 @@
+"""
+Консольная пакетная конвертация файлов Google → Yandex.
+
+    python -m gootoya points.csv -o points_yandex.csv --workers 4
+    python -m gootoya data/calibration_map.geojson -o map_yandex.geojson
+    python -m gootoya coords.txt > coords_yandex.txt
+
+Файлы читаются и пишутся потоково блоками по --chunk-size записей (GeoJSON
+FeatureCollection — тоже: объекты features разбираются по одному);
+с --workers N блоки обрабатываются пулом процессов с сохранением порядка.
+С --grid точки конвертируются по предрассчитанной сетке поправок (см. grid.py):
+сетка строится один раз и открывается процессами через memory map.
+С --fit — районными аппроксимациями МНК там, где они точнее IDW (см. fit.py).
+"""
+import argparse
+import collections
+import csv
+import io
+import itertools
+import json
+import math
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+from pathlib import Path
+
+from .core import (
+    IDW_NEIGHBORS, IDW_MAX_RADIUS_KM,
+    CalibrationModel, base_training_data, convert_coords_pairs, load_training_data,
+)
+from .coords import TEXT_KINDS, parse_coords
+from .fit import FittedTransform
+from .grid import GRID_BASE_STEP, CorrectionGrid
+
+DEFAULT_CALIBRATION = Path(__file__).resolve().parent.parent.parent / 'data' / 'calibration.json'
+DEFAULT_CHUNK_SIZE = 10000
+
+# Блок чтения GeoJSON FeatureCollection (символов)
+READ_CHUNK = 1 << 16
+
+FORMATS_BY_SUFFIX = {
+    '.csv': 'csv',
+    '.geojson': 'geojson',
+    '.json': 'geojson',
+    '.geojsonl': 'geojsonl',
+    '.geojsons': 'geojsonl',
+    '.ndjson': 'geojsonl',
+}
+
+# Состояние процесса-обработчика (заполняется в _init_worker);
+# _converter — сетка поправок или районные аппроксимации
+_model = None
+_converter = None
+_options = {}
+
+
+def _init_worker(pairs, k, max_radius_km, grid_path=None, regions=None):
+    """
+    Собирает модель калибровки (и открывает сетку поправок или собирает
+    районные аппроксимации) один раз на процесс.
+    """
+    global _model, _converter, _options
+    _model = CalibrationModel(pairs)
+    if grid_path:
+        _converter = CorrectionGrid.load(grid_path, _model)
+    elif regions is not None:
+        _converter = FittedTransform(regions, k, max_radius_km, model=_model)
+    else:
+        _converter = None
+    _options = {'k': k, 'max_radius_km': max_radius_km}
+
+
+def _convert(points):
+    if _converter is not None:
+        return _converter.convert_pairs(points)
+    return convert_coords_pairs(points, _model, _options['k'], _options['max_radius_km'])
+
+
+# === ОБРАБОТКА БЛОКОВ ===
+
+def _convert_text_chunk(lines):
+    """
+    Заменяет первую пару координат в каждой строке на координаты Yandex
+    (десятичную пару или DMS; пары целых чисел не заменяются).
+    """
+    matches = [parse_coords(line, TEXT_KINDS) for line in lines]
+    matches = [c if c is not None and c.precision else None for c in matches]
+    points = [(c.lat, c.lon) for c in matches if c]
+    results = iter(_convert(points))
+
+    out = []
+    for line, c in zip(lines, matches):
+        if c:
+            ylat, ylon = next(results)
+            line = f"{line[:c.start]}{ylat:.6f}, {ylon:.6f}{line[c.end:]}"
+        out.append(line)
+    return out
+
+
+def _convert_csv_chunk(rows, lat_idx, lon_idx, coords_idx):
+    """Дописывает к каждой строке CSV колонки с широтой и долготой Yandex."""
+    points = []
+    for row in rows:
+        try:
+            if coords_idx is not None:
+                c = parse_coords(row[coords_idx])
+                point = (c.lat, c.lon) if c else None
+            else:
+                point = (float(row[lat_idx]), float(row[lon_idx]))
+        except (ValueError, IndexError):
+            point = None
+        points.append(point)
+
+    results = iter(_convert([p for p in points if p is not None]))
+    out = []
+    for row, point in zip(rows, points):
+        if point is None:
+            out.append(row + ['', ''])
+        else:
+            ylat, ylon = next(results)
+            out.append(row + [f"{ylat:.6f}", f"{ylon:.6f}"])
+    return out
+
+
+def _iter_positions(coords):
+    """Позиции [lon, lat, ...] во вложенных coordinates геометрии GeoJSON."""
+    if coords and isinstance(coords[0], (int, float)):
+        yield coords
+    else:
+        for item in coords:
+            yield from _iter_positions(item)
+
+
+def _iter_geometries(geometry):
+    if not geometry:
+        return
+    if geometry.get('type') == 'GeometryCollection':
+        for item in geometry.get('geometries', []):
+            yield from _iter_geometries(item)
+    elif 'coordinates' in geometry:
+        yield geometry
+
+
+def _convert_features_chunk(features):
+    """Конвертирует координаты геометрий GeoJSON (порядок в GeoJSON — lon, lat)."""
+    positions = [
+        pos
+        for feature in features
+        for geometry in _iter_geometries(feature.get('geometry'))
+        for pos in _iter_positions(geometry['coordinates'])
+    ]
+    results = _convert([(pos[1], pos[0]) for pos in positions])
+    for pos, (ylat, ylon) in zip(positions, results):
+        pos[0], pos[1] = round(ylon, 6), round(ylat, 6)
+    return features
+
+
+def _process_chunk(task):
+    kind, items, extra = task
+    if kind == 'text':
+        return _convert_text_chunk(items)
+    if kind == 'csv':
+        return _convert_csv_chunk(items, *extra)
+    return _convert_features_chunk(items)
+
+
+def _ordered_imap(pool, tasks, window):
+    """
+    Как pool.imap, но держит в работе не больше window блоков,
+    чтобы не вычитывать весь вход в память наперёд.
+    """
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(_process_chunk, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+# === ЧТЕНИЕ И ЗАПИСЬ ===
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _column_index(header, name):
+    if name is None:
+        return None
+    if name in header:
+        return header.index(name)
+    if name.isdigit():
+        return int(name)
+    raise SystemExit(f"Колонка '{name}' не найдена в CSV: {', '.join(header)}")
+
+
+def _run_text(src, dst, args, run):
+    lines = (line.rstrip('\r\n') for line in src)
+    count = 0
+    for out in run('text', _chunks(lines, args.chunk_size), None):
+        dst.write('\n'.join(out) + '\n')
+        count += len(out)
+    return count
+
+
+def _run_csv(src, dst, args, run):
+    reader = csv.reader(src, delimiter=args.delimiter)
+    writer = csv.writer(dst, delimiter=args.delimiter, lineterminator='\n')
+    header = next(reader, None)
+    if header is None:
+        return 0
+
+    if args.coords_col:
+        extra = (None, None, _column_index(header, args.coords_col))
+    else:
+        extra = (_column_index(header, args.lat_col), _column_index(header, args.lon_col), None)
+    writer.writerow(header + [args.out_lat_col, args.out_lon_col])
+
+    count = 0
+    for out in run('csv', _chunks(reader, args.chunk_size), extra):
+        writer.writerows(out)
+        count += len(out)
+    return count
+
+
+class _JsonStream:
+    """
+    Потоковый разбор JSON из текстового файла: значения читаются
+    JSONDecoder.raw_decode из буфера, который дочитывается блоками.
+    """
+
+    WHITESPACE = ' \t\r\n'
+
+    def __init__(self, f, chunk_size=READ_CHUNK):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Дочитывает блок (непрочитанный остаток буфера сохраняется); False — конец файла."""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self, skip=WHITESPACE):
+        """Следующий символ после символов skip или '' в конце файла."""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in skip:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def error(self, message):
+        return json.JSONDecodeError(message, self.buf, self.pos)
+
+    def expect(self, char, skip=WHITESPACE):
+        found = self.peek(skip)
+        if found != char:
+            raise self.error(f"ожидается {char!r}")
+        self.pos += 1
+
+    def value(self):
+        """Следующее значение JSON."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Значение не поместилось в буфер — дочитываем
+                if not self._fill():
+                    raise
+                continue
+            # Число в конце буфера могло оборваться на границе блока
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(stream):
+    """Элементы JSON-массива по одному (открывающая скобка уже прочитана)."""
+    while True:
+        char = stream.peek(stream.WHITESPACE + ',')
+        if char == ']':
+            stream.pos += 1
+            return
+        if not char:
+            raise stream.error("неожиданный конец файла в массиве")
+        yield stream.value()
+
+
+def _iter_members(stream):
+    """
+    Члены JSON-объекта: (ключ, значение). Значение features — генератор
+    элементов массива; его нужно дочитать до следующего члена.
+    """
+    stream.expect('{', stream.WHITESPACE + '\ufeff')
+    while True:
+        char = stream.peek(stream.WHITESPACE + ',')
+        if char == '}':
+            stream.pos += 1
+            return
+        if not char:
+            raise stream.error("неожиданный конец файла в объекте")
+        key = stream.value()
+        stream.expect(':')
+        if key == 'features' and stream.peek() == '[':
+            stream.pos += 1
+            yield key, _iter_array(stream)
+        else:
+            yield key, stream.value()
+
+
+def _run_geojson(src, dst, args, run):
+    """
+    FeatureCollection читается потоком: члены до features пишутся сразу,
+    объекты features разбираются и конвертируются блоками, члены после
+    features дописываются в конце.
+    """
+    members = _iter_members(_JsonStream(src))
+    header = {}
+    features = None
+    try:
+        for key, value in members:
+            if key == 'features':
+                features = value
+                break
+            header[key] = value
+        # type обычно идёт первым; если он после features — проверяется в конце
+        if header.get('type', 'FeatureCollection' if features else None) != 'FeatureCollection':
+            raise SystemExit("Ожидается GeoJSON FeatureCollection")
+        header['type'] = 'FeatureCollection'
+        dst.write(json.dumps(header, ensure_ascii=False)[:-1] + ', "features": [\n')
+
+        count = 0
+        for out in run('geojson', _chunks(features or (), args.chunk_size), None):
+            for feature in out:
+                dst.write((',\n' if count else '') + json.dumps(feature, ensure_ascii=False))
+                count += 1
+        dst.write('\n]')
+
+        trailer = dict(members)
+    except json.JSONDecodeError as e:
+        raise SystemExit(f"Ошибка разбора GeoJSON: {e}")
+    if trailer.pop('type', 'FeatureCollection') != 'FeatureCollection':
+        raise SystemExit("Ожидается GeoJSON FeatureCollection")
+    for key, value in trailer.items():
+        dst.write(f", {json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)}")
+    dst.write('}\n')
+    return count
+
+
+def _run_geojsonl(src, dst, args, run):
+    features = (json.loads(line) for line in src if line.strip())
+    count = 0
+    for out in run('geojson', _chunks(features, args.chunk_size), None):
+        for feature in out:
+            dst.write(json.dumps(feature, ensure_ascii=False) + '\n')
+        count += len(out)
+    return count
+
+
+RUNNERS = {
+    'text': _run_text,
+    'csv': _run_csv,
+    'geojson': _run_geojson,
+    'geojsonl': _run_geojsonl,
+}
+
+
+def _open_input(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _open_output(path):
+    if path is None or path == '-':
+        return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def _positive_int(text):
+    """Тип аргумента: целое больше 0."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"нужно целое число больше 0: {text!r}")
+    return value
+
+
+def _positive_float(text):
+    """Тип аргумента: конечное число больше 0."""
+    try:
+        value = float(text)
+    except ValueError:
+        value = math.nan
+    if not (math.isfinite(value) and value > 0):
+        raise argparse.ArgumentTypeError(f"нужно конечное число больше 0: {text!r}")
+    return value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m gootoya',
+        description="Пакетная конвертация координат Google → Yandex (CSV, GeoJSON, текст).")
+    parser.add_argument('input', help="входной файл или '-' для stdin")
+    parser.add_argument('-o', '--output', help="выходной файл (по умолчанию stdout)")
+    parser.add_argument('-f', '--format', choices=['auto'] + sorted(RUNNERS), default='auto',
+                        help="формат входа (по умолчанию — по расширению)")
+    parser.add_argument('-c', '--calibration', default=str(DEFAULT_CALIBRATION),
+                        help="файл калибровки calibration.json")
+    parser.add_argument('-w', '--workers', type=_positive_int, default=1,
+                        help="число процессов-обработчиков")
+    parser.add_argument('--chunk-size', type=_positive_int, default=DEFAULT_CHUNK_SIZE,
+                        help="записей в одном блоке")
+    parser.add_argument('--neighbors', type=_positive_int, default=IDW_NEIGHBORS,
+                        help="учитывать только k ближайших калибровочных точек")
+    parser.add_argument('--max-radius-km', type=_positive_float, default=IDW_MAX_RADIUS_KM,
+                        help="учитывать только точки в радиусе (км)")
+    parser.add_argument('--grid', action='store_true',
+                        help="конвертировать по сетке поправок (быстрее, отклонение — доли метра)")
+    parser.add_argument('--grid-step', type=_positive_float, default=GRID_BASE_STEP,
+                        help="начальный шаг сетки (градусы)")
+    parser.add_argument('--grid-file',
+                        help="файл сетки: с --grid построенная сетка сохраняется сюда, "
+                             "без --grid — используется готовая, если она построена по "
+                             "этой калибровке с теми же --neighbors и --max-radius-km, "
+                             "иначе перестраивается")
+    parser.add_argument('--fit', action='store_true',
+                        help="районные аппроксимации МНК там, где они точнее IDW")
+
+    group = parser.add_argument_group("CSV")
+    group.add_argument('--lat-col', default='lat', help="колонка широты (имя или номер)")
+    group.add_argument('--lon-col', default='lon', help="колонка долготы (имя или номер)")
+    group.add_argument('--coords-col', help="колонка со строкой 'lat, lon' вместо пары колонок")
+    group.add_argument('--out-lat-col', default='yandex_lat')
+    group.add_argument('--out-lon-col', default='yandex_lon')
+    group.add_argument('--delimiter', default=',')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    fmt = args.format
+    if fmt == 'auto':
+        fmt = FORMATS_BY_SUFFIX.get(Path(args.input).suffix.lower(), 'text')
+
+    calib_path = Path(args.calibration)
+    training_data = load_training_data(calib_path) if calib_path.exists() else base_training_data()
+    pairs = list(CalibrationModel.from_training_data(training_data))
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp, \
+            _open_input(args.input) as src, _open_output(args.output) as dst:
+        grid_path = args.grid_file
+        build_grid = args.grid
+        if grid_path and not build_grid and not CorrectionGrid.is_current(
+                grid_path, CalibrationModel(pairs), args.neighbors, args.max_radius_km):
+            print(f"Сетка {grid_path} построена по другой калибровке или параметрам, "
+                  f"перестраивается", file=sys.stderr)
+            build_grid = True
+        if build_grid:
+            grid = CorrectionGrid.build(CalibrationModel(pairs), base_step=args.grid_step,
+                                        k=args.neighbors, max_radius_km=args.max_radius_km)
+            grid_path = grid_path or str(Path(tmp) / 'grid.bin')
+            grid.save(grid_path)
+            print(f"Сетка поправок: {len(grid)} узлов, {grid.nbytes() / 1e6:.1f} МБ, "
+                  f"{time.perf_counter() - start:.2f} с", file=sys.stderr)
+        regions = None
+        if args.fit:
+            fitted = FittedTransform.fit(CalibrationModel(pairs), args.neighbors, args.max_radius_km)
+            regions = fitted.regions
+            print(f"Районов: {len(regions)}, с аппроксимацией: {len(fitted.fitted)}, "
+                  f"{time.perf_counter() - start:.2f} с", file=sys.stderr)
+        init_args = (pairs, args.neighbors, args.max_radius_km, grid_path, regions)
+
+        if args.workers > 1:
+            with Pool(args.workers, initializer=_init_worker, initargs=init_args) as pool:
+                def run(kind, chunks, extra):
+                    tasks = ((kind, c, extra) for c in chunks)
+                    return _ordered_imap(pool, tasks, args.workers * 2)
+                count = RUNNERS[fmt](src, dst, args, run)
+        else:
+            _init_worker(*init_args)
+
+            def run(kind, chunks, extra):
+                return (_process_chunk((kind, c, extra)) for c in chunks)
+            count = RUNNERS[fmt](src, dst, args, run)
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0
+    print(f"✓ Обработано записей: {count} за {elapsed:.2f} с ({rate:.0f}/с), "
+          f"калибровочных точек: {len(pairs)}", file=sys.stderr)
+    return 0
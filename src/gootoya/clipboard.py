@@ -0,0 +1,333 @@
+"""
+Отслеживание изменений буфера обмена.
+
+Бэкенды (create_watcher выбирает лучший доступный):
+- "win32"   — Windows: дешёвый GetClipboardSequenceNumber вместо чтения текста;
+- "xfixes"  — X11: блокирующее ожидание событий XFixes о смене владельца CLIPBOARD;
+- "polling" — pyperclip с адаптивным интервалом опроса (запасной вариант);
+- "memory"  — буфер в памяти для тестов и отладки.
+
+Все бэкенды помнят последний увиденный текст, поэтому собственные записи
+через copy() не считаются изменением, а изменения между вызовами не теряются.
+"""
+import os
+import select
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from .metrics import registry as metrics
+
+# Адаптивный опрос: начальный и максимальный интервал (сек.) и множитель
+POLL_MIN_INTERVAL = 0.05
+POLL_MAX_INTERVAL = 0.5
+POLL_BACKOFF = 1.5
+
+# Интервал опроса счётчика изменений буфера Windows (сек.)
+WIN32_POLL_INTERVAL = 0.02
+
+
+class ClipboardWatcher(ABC):
+    """
+    Базовый класс: ожидание нового текста и статистика задержки обнаружения.
+    Бэкенд реализует paste, copy и _wait_signal.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.last_text = None
+        self.count = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @abstractmethod
+    def paste(self):
+        """Текущий текст буфера обмена."""
+
+    @abstractmethod
+    def copy(self, text):
+        """Записывает текст в буфер обмена."""
+
+    @abstractmethod
+    def _wait_signal(self, timeout):
+        """Ждёт признака возможного изменения; возвращает его время или None (таймаут)."""
+
+    def reset(self):
+        """Запоминает текущее содержимое: всё, что уже в буфере, новым не считается."""
+        self.last_text = self.paste()
+
+    def wait_for_change(self, timeout=None):
+        """
+        Возвращает новый текст буфера обмена.
+        Бросает TimeoutError, если за timeout секунд ничего не изменилось.
+        """
+        if self.last_text is None:
+            self.last_text = self.paste()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f'Таймаут ожидания: {timeout} сек.')
+
+            changed_at = self._wait_signal(remaining)
+            if changed_at is None:
+                continue
+
+            text = self.paste()
+            if text != self.last_text:
+                self.last_text = text
+                self._record(time.monotonic() - changed_at)
+                return text
+
+    def _record(self, latency):
+        metrics.observe('clipboard_detect_seconds', latency)
+        self.count += 1
+        self.last_latency = latency
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def stats(self):
+        """Измеренная задержка обнаружения изменений (мс)."""
+        return {
+            "backend": self.name,
+            "changes": self.count,
+            "last_latency_ms": round(self.last_latency * 1000, 2),
+            "avg_latency_ms": round(self.total_latency / self.count * 1000, 2) if self.count else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 2),
+        }
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(ClipboardWatcher):
+    """
+    Опрос pyperclip с адаптивным интервалом: после изменения опрос частый,
+    в простое интервал растёт до POLL_MAX_INTERVAL. Задержка обнаружения
+    оценивается сверху как время с предыдущего опроса.
+    """
+
+    name = "polling"
+
+    def __init__(self, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL):
+        super().__init__()
+        import pyperclip
+        self._pyperclip = pyperclip
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._last_poll = time.monotonic()
+
+    def paste(self):
+        return self._pyperclip.paste()
+
+    def copy(self, text):
+        self._pyperclip.copy(text)
+        self.last_text = text
+        self.interval = self.min_interval
+
+    def _wait_signal(self, timeout):
+        sleep = self.interval if timeout is None else min(self.interval, timeout)
+        time.sleep(sleep)
+        # Каждый опрос — потенциальное изменение; интервал растёт, пока изменений нет
+        previous, self._last_poll = self._last_poll, time.monotonic()
+        self.interval = min(self.max_interval, self.interval * POLL_BACKOFF)
+        return previous
+
+    def _record(self, latency):
+        super()._record(latency)
+        self.interval = self.min_interval
+
+
+class Win32Watcher(PollingWatcher):
+    """
+    Windows: опрашивается только GetClipboardSequenceNumber (без чтения
+    текста), текст читается лишь когда счётчик изменился.
+    """
+
+    name = "win32"
+
+    def __init__(self, interval=WIN32_POLL_INTERVAL):
+        super().__init__(interval, interval)
+        import ctypes
+        self._sequence = ctypes.windll.user32.GetClipboardSequenceNumber
+        self._last_seq = self._sequence()
+
+    def copy(self, text):
+        super().copy(text)
+        self._last_seq = self._sequence()
+
+    def _wait_signal(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            previous, self._last_poll = self._last_poll, time.monotonic()
+            seq = self._sequence()
+            if seq != self._last_seq:
+                self._last_seq = seq
+                return previous
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.interval)
+
+
+class XFixesWatcher(ClipboardWatcher):
+    """
+    X11: подписка на XFixesSelectionNotify для CLIPBOARD. Поток спит в select()
+    на сокете X-сервера и просыпается только при смене владельца буфера.
+    """
+
+    name = "xfixes"
+
+    def __init__(self):
+        super().__init__()
+        import ctypes
+        import ctypes.util
+        import pyperclip
+        self._ctypes = ctypes
+        self._pyperclip = pyperclip
+
+        x11_name = ctypes.util.find_library('X11')
+        xfixes_name = ctypes.util.find_library('Xfixes')
+        if not x11_name or not xfixes_name:
+            raise OSError("libX11/libXfixes не найдены")
+        x11 = ctypes.cdll.LoadLibrary(x11_name)
+        xfixes = ctypes.cdll.LoadLibrary(xfixes_name)
+
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XInternAtom.restype = ctypes.c_ulong
+        x11.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        x11.XConnectionNumber.argtypes = [ctypes.c_void_p]
+        x11.XPending.argtypes = [ctypes.c_void_p]
+        x11.XNextEvent.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        x11.XFlush.argtypes = [ctypes.c_void_p]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xfixes.XFixesQueryExtension.argtypes = [
+            ctypes.c_void_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]
+        xfixes.XFixesSelectSelectionInput.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]
+
+        display = x11.XOpenDisplay(None)
+        if not display:
+            raise OSError("Нет подключения к X-серверу")
+
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        if not xfixes.XFixesQueryExtension(display, ctypes.byref(event_base),
+                                           ctypes.byref(error_base)):
+            x11.XCloseDisplay(display)
+            raise OSError("Расширение XFixes недоступно")
+
+        clipboard = x11.XInternAtom(display, b'CLIPBOARD', 0)
+        root = x11.XDefaultRootWindow(display)
+        # XFixesSetSelectionOwnerNotifyMask = 1
+        xfixes.XFixesSelectSelectionInput(display, root, clipboard, 1)
+        x11.XFlush(display)
+
+        self._x11 = x11
+        self._display = display
+        self._fd = x11.XConnectionNumber(display)
+        # XFixesSelectionNotify = event_base + 0
+        self._notify_type = event_base.value
+        self._event = (ctypes.c_long * 24)()
+
+    def paste(self):
+        return self._pyperclip.paste()
+
+    def copy(self, text):
+        self._pyperclip.copy(text)
+        self.last_text = text
+
+    def _drain_events(self):
+        changed = False
+        while self._x11.XPending(self._display):
+            self._x11.XNextEvent(self._display, self._event)
+            event_type = self._ctypes.cast(self._event, self._ctypes.POINTER(self._ctypes.c_int))[0]
+            if event_type == self._notify_type:
+                changed = True
+        return changed
+
+    def _wait_signal(self, timeout):
+        if self._drain_events():
+            return time.monotonic()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if ready:
+            woke_at = time.monotonic()
+            if self._drain_events():
+                return woke_at
+        return None
+
+    def close(self):
+        if self._display:
+            self._x11.XCloseDisplay(self._display)
+            self._display = None
+
+
+class MemoryClipboard(ClipboardWatcher):
+    """Буфер обмена в памяти: set() имитирует копирование пользователем."""
+
+    name = "memory"
+
+    def __init__(self, text=""):
+        super().__init__()
+        self._text = text
+        self._changed_at = None
+        self._cond = threading.Condition()
+
+    def set(self, text):
+        """Имитирует внешнее копирование текста в буфер."""
+        with self._cond:
+            self._text = text
+            self._changed_at = time.monotonic()
+            self._cond.notify_all()
+
+    def paste(self):
+        with self._cond:
+            return self._text
+
+    def copy(self, text):
+        with self._cond:
+            self._text = text
+            self.last_text = text
+
+    def _wait_signal(self, timeout):
+        with self._cond:
+            if self._changed_at is None:
+                self._cond.wait(timeout)
+            changed_at, self._changed_at = self._changed_at, None
+            return changed_at
+
+
+BACKENDS = {
+    "win32": Win32Watcher,
+    "xfixes": XFixesWatcher,
+    "polling": PollingWatcher,
+    "memory": MemoryClipboard,
+}
+
+
+def create_watcher(kind=None):
+    """
+    Создаёт наблюдатель буфера обмена. kind (или GOOTOYA_CLIPBOARD) — имя
+    бэкенда; по умолчанию выбирается лучший доступный для платформы.
+    """
+    kind = kind or os.environ.get('GOOTOYA_CLIPBOARD', 'auto')
+    if kind != 'auto':
+        return BACKENDS[kind]()
+
+    candidates = []
+    if sys.platform == 'win32':
+        candidates.append(Win32Watcher)
+    elif os.environ.get('DISPLAY'):
+        candidates.append(XFixesWatcher)
+    for backend in candidates:
+        try:
+            return backend()
+        except Exception as e:
+            print(f"Буфер обмена: {backend.name} недоступен ({e}), используется опрос")
+    return PollingWatcher()
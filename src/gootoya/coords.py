@@ -0,0 +1,262 @@
+"""
+Разбор координат в тексте: однопроходный токенизатор.
+
+Одно регулярное выражение из альтернатив за один проход по тексту находит
+все поддерживаемые записи пары координат:
+- ссылки Google Maps: .../@lat,lon,17z, ?q=lat,lon, !3dlat!4dlon;
+- ссылки Яндекс.Карт: ll=lon,lat, pt=lon,lat, whatshere[point]=lon,lat
+  (долгота первой, запятая может быть записана как %2C);
+- градусы, минуты, секунды: 56°49'41.2"N 60°36'51.4"E (и С/Ю/В/З);
+- десятичные пары: "lat, lon" (целые "56, 60" parse_coords пропускает)
+  и через пробел — только с SPACED_MIN_PRECISION и более знаками после
+  точки у обоих чисел и без других чисел рядом в строке: "56.8281 60.6142" (а не "версия 1.2 3.4"
+  или колонки таблицы через табуляцию).
+Вид записи определяется по сработавшей альтернативе (m.lastgroup), поэтому
+числа, точность и источник получаются без повторного сканирования текста.
+Пары вне диапазона (|lat| > 90, |lon| > 180) пропускаются, поиск
+продолжается со следующего символа.
+"""
+import re
+
+# === КОНСТАНТЫ ===
+
+# Источник по точности: у Google больше стольких знаков после точки
+GOOGLE_MIN_PRECISION = 8
+
+# Пара через пробел без запятой — координаты, только если у обоих чисел
+# не меньше стольких знаков после точки (иначе это версии, цены, размеры)
+SPACED_MIN_PRECISION = 4
+
+# Виды записей, которые можно заменить в тексте строкой "lat, lon"
+# (в ссылках замена сломала бы формат: порядок, разделители)
+TEXT_KINDS = ('decimal', 'dms')
+
+# Источник по виду записи; для остальных — по точности
+KIND_SOURCE = {'google_url': "Google", 'yandex_url': "Yandex", 'dms': "Неизвестно"}
+
+# Число: знак, до трёх цифр целой части, необязательная дробная (или только дробная)
+_NUM = r'[-+]?(?:\d{1,3}(?:\.\d+)?|\.\d+)'
+
+# Хвост числа _NUM после уже прочитанного первого символа (см. _TOKEN_RE)
+_NUM_TAIL = r'(?:(?<=\d)\d{0,2}(?:\.\d+)?|(?<=[-+])(?:\d{1,3}(?:\.\d+)?|\.\d+)|(?<=\.)\d+)'
+
+# Число с дробной частью не короче SPACED_MIN_PRECISION знаков
+_FRAC = r'[-+]?\d{0,3}\.\d{%d,}' % SPACED_MIN_PRECISION
+
+# Компонент DMS после градусов: знак градуса, минуты, секунды, полушарие
+_DMS_REST = (r'\s*°\s*(?:(\d{1,2}(?:\.\d+)?)\s*[\'′’]\s*)?'
+             r'(?:(\d{1,2}(?:\.\d+)?)\s*(?:"|″|\'\'|”)\s*)?([NSEWСЮВЗ])?')
+
+# Одно выражение на все записи. Оно начинается с класса символов, с которых
+# может начаться пара, — по нему движок регулярных выражений перебирает
+# позиции текста сам, без попытки каждой альтернативы в каждой позиции
+# (иначе разбор в несколько раз медленнее одного coord_re). Первый символ
+# уже прочитан, поэтому альтернативы проверяют его ретроспективно, а группа
+# первого числа десятичных пар и DMS — хвост числа без первого символа.
+# Первое число у этих записей общее и читается один раз, вид записи
+# определяет разделитель после него; проверка (?![\d.]) после числа не даёт
+# движку перебирать его укороченные варианты. Внутри числа цифра отсекается
+# двумя проверками; ссылки начинаются с других символов и проверяются последними.
+_TOKEN_RE = re.compile((
+    r'[-+.\d@!?&](?:'
+    # Числа: первый символ не продолжает другое число и не стоит после знака
+    r'(?<![-+\d.].)(?P<n_lat>{num_tail})(?![\d.])(?:' + '|'.join([
+        r'(?P<decimal>\s*,\s*(?P<d_lon>{num})(?![\d.]*\d))',
+        # Через пробелы (не табуляцию — это колонки таблицы) — только с длинной
+        # дробной частью (у широты и соседних полей проверяется в _match_coords);
+        # долгота не должна быть широтой следующей пары через запятую
+        r'(?P<spaced>[ ]+(?P<s_lon>{frac})(?![\d.]*\d)(?!\s*,))',
+        r'(?P<dms>{dms}[\s,;]*(\d{{1,3}}(?:\.\d+)?){dms})',
+    ]) + ')'
+    # Ссылки: первый символ — @, ! или начало параметра
+    r'|(?<=[@!?&])(?:' + '|'.join([
+        r'(?<=@)(?P<g_at>(?P<ga_lat>{num}),(?P<ga_lon>{num})(?![\d.]))',
+        r'(?<=!)(?P<g_data>3d(?P<gd_lat>{num})!4d(?P<gd_lon>{num})(?![\d.]))',
+        r'(?P<g_query>(?:q|query|destination|center)='
+        r'(?P<gq_lat>{num})(?:,|%2C)(?P<gq_lon>{num})(?![\d.]))',
+        r'(?P<y_param>(?:ll|pt|whatshere(?:\[point\]|%5Bpoint%5D))='
+        r'(?P<yp_lon>{num})(?:,|%2C)(?P<yp_lat>{num})(?![\d.]))',
+    ]) + '))'
+).format(num=_NUM, frac=_FRAC, num_tail=_NUM_TAIL, dms=_DMS_REST))
+
+# Сработавшая альтернатива → (вид записи, номер группы широты, номер группы
+# долготы, группа широты — хвост числа без первого символа совпадения)
+_NUMERIC_KINDS = {
+    name: (kind, _TOKEN_RE.groupindex[lat], _TOKEN_RE.groupindex[lon], tail)
+    for name, (kind, lat, lon, tail) in {
+        'decimal': ('decimal', 'n_lat', 'd_lon', True),
+        'spaced': ('decimal', 'n_lat', 's_lon', True),
+        'g_at': ('google_url', 'ga_lat', 'ga_lon', False),
+        'g_data': ('google_url', 'gd_lat', 'gd_lon', False),
+        'g_query': ('google_url', 'gq_lat', 'gq_lon', False),
+        'y_param': ('yandex_url', 'yp_lat', 'yp_lon', False),
+    }.items()
+}
+_LAT_GROUP = _TOKEN_RE.groupindex['n_lat']
+_DMS_GROUP = _TOKEN_RE.groupindex['dms']
+
+# Числовое поле через пробелы или табуляцию перед парой и после неё:
+# пара через пробел среди других чисел — строка таблицы, а не координаты
+_FIELD_BEFORE_RE = re.compile(r'\d[.,]?[ \t]+$')
+_FIELD_AFTER_RE = re.compile(r'[ \t]+[-+]?\.?\d')
+
+_NEGATIVE_HEMISPHERES = frozenset('SWЮЗ')
+_LON_HEMISPHERES = frozenset('EWВЗ')
+
+
+class Coords:
+    """
+    Найденная пара координат: числа, вид записи (kind), позиция в тексте
+    (start, end), исходная запись чисел и точность — наибольшее число
+    знаков после точки (считается при первом обращении).
+    """
+
+    __slots__ = ('lat', 'lon', 'kind', 'start', 'end', 'lat_text', 'lon_text', '_precision')
+
+    def __init__(self, lat, lon, kind, start, end, lat_text, lon_text):
+        self.lat = lat
+        self.lon = lon
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.lat_text = lat_text
+        self.lon_text = lon_text
+        self._precision = None
+
+    def __repr__(self):
+        return f"Coords({self.lat}, {self.lon}, kind={self.kind!r}, precision={self.precision})"
+
+    @property
+    def precision(self):
+        precision = self._precision
+        if precision is None:
+            precision = self._precision = max(_digits(self.lat_text), _digits(self.lon_text))
+        return precision
+
+    @property
+    def source(self):
+        """Источник: "Google", "Yandex" или "Неизвестно" (см. guess_source_type)."""
+        source = KIND_SOURCE.get(self.kind)
+        if source is not None:
+            return source
+        precision = self.precision
+        if not precision:
+            return "Неизвестно"
+        return "Google" if precision >= GOOGLE_MIN_PRECISION else "Yandex"
+
+    @property
+    def text(self):
+        """Запись "lat, lon" с исходными цифрами (точность не теряется)."""
+        return f"{self.lat_text.lstrip('+')}, {self.lon_text.lstrip('+')}"
+
+
+def _digits(number):
+    dot = number.find('.')
+    return len(number) - dot - 1 if dot >= 0 else 0
+
+
+def _dms_value(degrees, minutes, seconds, hemisphere):
+    """Градусы DMS и эквивалентное число знаков после точки."""
+    value = float(degrees)
+    digits = _digits(degrees)
+    if minutes:
+        value += float(minutes) / 60
+        # Минута ≈ 0.017°, секунда ≈ 0.0003°
+        digits = 2 + _digits(minutes)
+    if seconds:
+        value += float(seconds) / 3600
+        digits = 4 + _digits(seconds)
+    if hemisphere in _NEGATIVE_HEMISPHERES:
+        value = -value
+    return value, digits
+
+
+def _dms(m):
+    m1, s1, h1, d2, m2, s2, h2 = m.group(*range(_DMS_GROUP + 1, _DMS_GROUP + 8))
+    d1 = m.string[m.start():m.end(_LAT_GROUP)]
+    first, first_digits = _dms_value(d1, m1, s1, h1)
+    second, second_digits = _dms_value(d2, m2, s2, h2)
+    # Долгота первой, если так сказано полушариями (60°36'E 56°49'N)
+    if h1 in _LON_HEMISPHERES and (h2 is None or h2 not in _LON_HEMISPHERES):
+        first, second = second, first
+        first_digits, second_digits = second_digits, first_digits
+    if abs(first) > 90 or abs(second) > 180:
+        return None
+    return Coords(first, second, 'dms', m.start(), m.end(),
+                  f"{first:.{first_digits}f}", f"{second:.{second_digits}f}")
+
+
+def _spaced_pair(text, lat_text, start, end):
+    """
+    Похожа ли пара через пробел на координаты: у широты длинная дробная
+    часть (у долготы её проверяет _FRAC), рядом в строке нет других чисел.
+    """
+    if _digits(lat_text) < SPACED_MIN_PRECISION or _FIELD_AFTER_RE.match(text, end):
+        return False
+    line_start = text.rfind('\n', 0, start) + 1
+    return not _FIELD_BEFORE_RE.search(text, max(line_start, start - 8), start)
+
+
+def _match_coords(m, text):
+    """Пара из совпадения _TOKEN_RE (Coords) или None, если это не координаты."""
+    name = m.lastgroup
+    if name == 'dms':
+        return _dms(m)
+    kind, lat_group, lon_group, tail = _NUMERIC_KINDS[name]
+    start, end = m.span()
+    lat_text = text[start:m.end(lat_group)] if tail else m.group(lat_group)
+    lon_text = m.group(lon_group)
+    if name == 'spaced' and not _spaced_pair(text, lat_text, start, end):
+        return None
+    lat, lon = float(lat_text), float(lon_text)
+    # Вне диапазона или "1, 56.8" (номер и начало другой пары) — не пара
+    if (-90 <= lat <= 90 and -180 <= lon <= 180
+            and (kind != 'decimal' or ('.' in lat_text) == ('.' in lon_text))):
+        return Coords(lat, lon, kind, start, end, lat_text, lon_text)
+    return None
+
+
+def tokenize(text, kinds=None, pos=0):
+    """
+    Все пары координат текста за один проход (генератор Coords), начиная
+    с позиции pos. kinds — только записи этих видов (например, TEXT_KINDS).
+    """
+    search = _TOKEN_RE.search
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return
+        coords = _match_coords(m, text)
+        if coords is None:
+            # Пара может начинаться внутри отвергнутого совпадения
+            pos = m.start() + 1
+            continue
+        pos = m.end()
+        if kinds is None or coords.kind in kinds:
+            yield coords
+
+
+def parse_coords(text, kinds=None):
+    """
+    Первая пара координат текста (Coords) или None. Пары целых чисел
+    ("56, 60" — номера, размеры) координатами не считаются и пропускаются,
+    как и в прежнем coord_re (tokenize возвращает и их, с precision 0).
+    Цикл tokenize повторён без генератора: функция вызывается на каждую
+    строку пакета, и накладные расходы генератора заметны.
+    """
+    text = text or ''
+    search = _TOKEN_RE.search
+    pos = 0
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return None
+        coords = _match_coords(m, text)
+        if coords is None:
+            pos = m.start() + 1
+            continue
+        pos = m.end()
+        if kinds is None or coords.kind in kinds:
+            # У десятичной пары дробная часть либо у обоих чисел, либо ни у одного
+            if coords.kind != 'decimal' or '.' in coords.lat_text:
+                return coords
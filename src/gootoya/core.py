@@ -0,0 +1,936 @@
+"""
+Ядро конвертации координат Google → Yandex.
+Модель калибровки, пространственный индекс и IDW-интерполяция без Flask,
+буфера обмена и фоновых потоков — модуль можно импортировать где угодно.
+"""
+import json
+import hashlib
+import math
+import numbers
+import re
+import heapq
+import importlib.util
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+from .coords import TEXT_KINDS, parse_coords, tokenize
+
+# Проверка наличия NumPy (векторизованный IDW; без него — чистый Python).
+# Сам модуль импортируется лениво, при первом векторном расчёте.
+HAS_NUMPY = importlib.util.find_spec('numpy') is not None
+
+# === КОНСТАНТЫ ===
+
+# Базовые калибровочные точки
+BASE_CALIBRATION = [
+    ((56.82811805737119, 60.61426164412377), (56.828106, 60.614287)),
+    ((56.86259891560065, 60.6572500903253), (56.862586, 60.657278)),
+    ((56.906666700192716, 60.63861543087929), (56.906652, 60.638628)),
+    ((56.909591402519915, 60.5950190263033), (56.909575, 60.595034)),
+    ((56.87863660391573, 60.51722444081701), (56.87863, 60.517245)),
+    ((56.781989564663476, 60.53752005594862), (56.781985, 60.537538)),
+    ((56.78862468710676, 60.651199174559736), (56.78862, 60.651223)),
+    ((56.80968834490725, 60.56463415653675), (56.809684, 60.564653)),
+    ((56.79674324537193, 60.620513467301855), (56.796731, 60.620529)),
+    ((56.826145898242764, 60.60015154151012), (56.826133, 60.600177)),
+    ((56.89324984612583, 60.57766089933516), (56.893228, 60.577675)),
+    ((56.885031152408864, 60.50838738450612), (56.885019, 60.508406)),
+    ((56.88387294721526, 60.5001406084767), (56.883864, 60.500160)),
+    ((59.938910517751964, 30.3142877746221), (59.938946, 30.314283)),
+    ((59.87644544335019, 30.374270379623916), (59.876472, 30.374265)),
+    ((59.962981728189405, 30.494793702118574), (59.962993, 30.494808)),
+    ((60.06028554274266, 30.41687044365594), (60.060287, 30.416894)),
+    ((55.178505866136376, 61.458797115710254), (55.178509, 61.458815)),
+    ((56.31857864399124, 44.00491972362694), (56.318603, 44.004937)),
+    ((56.33901617217321, 43.95225351295961), (56.339029, 43.952260)),
+    ((56.398701063262536, 43.985588829111364), (56.398709, 43.985600)),
+    ((57.1508971355925, 65.55846964059829), (57.150906, 65.558491)),
+    ((57.17835206448346, 65.56925933783715), (57.178346, 65.569273)),
+    ((57.11876675058166, 65.48813022260148), (57.118771, 65.488159)),
+    ((62.02797499644836, 129.76162940491085), (62.027965, 129.761650)),
+    ((62.05203840919141, 129.71767049344646), (62.052036, 129.717689)),
+    ((56.140030547089054, 47.24760888056219), (56.140049, 47.247614)),
+    ((56.12298277856921, 47.26660062665822), (56.123003, 47.266606)),
+    ((56.149800604524664, 47.17474603595798), (56.149809, 47.174721)),
+    ((56.13225084586679, 47.15316591517464), (56.132254, 47.153140)),
+    ((51.8242809475715, 107.57781015145557), (51.824287, 107.577818))
+]
+
+# Коэффициенты линейного преобразования (fallback)
+DEFAULT_A, DEFAULT_B, DEFAULT_C = 1.00002178, -0.000409512697, 0.0235679088
+DEFAULT_D, DEFAULT_E, DEFAULT_F = -0.0000552760272, 0.99995881, 0.00565924534
+
+# Пара "lat, lon" в записи калибровочных точек (storage, geocode);
+# текст из буфера и запросов разбирает coords.tokenize
+coord_re = re.compile(r'([-+]?\d*\.\d+),\s*([-+]?\d*\.\d+)')
+
+# Параметры IDW
+IDW_POWER = 2
+IDW_EXACT_DIST = 0.0000001
+
+# С какого числа калибровочных точек одиночный запрос считается через NumPy
+# (на маленьких наборах накладные расходы NumPy больше выигрыша)
+NUMPY_MIN_POINTS = 64
+
+# Ограничение размера матрицы расстояний N×M в пакетном режиме
+NUMPY_BATCH_CELLS = 1_000_000
+
+# Локальная интерполяция: сколько ближайших точек учитывать и в каком радиусе.
+# None — учитываются все калибровочные точки (как раньше).
+IDW_NEIGHBORS = None
+IDW_MAX_RADIUS_KM = None
+
+# Пространственный индекс: начальный и минимальный размер ячейки (в градусах)
+# и желаемое среднее число точек в занятой ячейке
+GRID_CELL_DEG = 0.25
+GRID_MIN_CELL_DEG = 0.001
+GRID_POINTS_PER_CELL = 8
+KM_PER_DEGREE = 111.32
+
+# Кэш результатов конвертации: число записей и точность округления входных
+# координат в ключе (6 знаков — около 0.1 м)
+CONVERT_CACHE_SIZE = 4096
+CONVERT_CACHE_PRECISION = 6
+
+# Направления конвертации: прямое (Google → Yandex) и обратное (Yandex → Google)
+DIRECTION_FORWARD = 'g2y'
+DIRECTION_INVERSE = 'y2g'
+DIRECTIONS = (DIRECTION_FORWARD, DIRECTION_INVERSE)
+
+
+# === ФУНКЦИИ КОНВЕРТАЦИИ ===
+
+def get_distance(lat1, lon1, lat2, lon2):
+    """Вычисляет расстояние между двумя точками (упрощённая формула)."""
+    avg_lat = math.radians((lat1 + lat2) / 2.0)
+    dlat = lat1 - lat2
+    dlon = (lon1 - lon2) * math.cos(avg_lat)
+    return math.sqrt(dlat**2 + dlon**2)
+
+
+class CalibrationModel:
+    """
+    Скомпилированная модель калибровки.
+    Хранит координаты Google и готовые смещения (Yandex - Google) в плотных
+    массивах float, чтобы конвертация не разбирала строки training_data.
+    Объект неизменяемый и разделяется между всеми потоками только на чтение.
+    У обратной модели (inverse, direction == DIRECTION_INVERSE) исходные
+    точки glat/glon — точки Yandex, а ylat/ylon — Google.
+    """
+
+    __slots__ = ('version', 'direction', 'glat', 'glon', 'ylat', 'ylon', 'dlat', 'dlon',
+                 '_np_arrays', '_index', '_inverse')
+
+    def __init__(self, pairs=(), version=0, direction=DIRECTION_FORWARD):
+        self.version = version
+        self.direction = direction
+        self.glat = array('d')
+        self.glon = array('d')
+        self.ylat = array('d')
+        self.ylon = array('d')
+        for (g_lat, g_lon), (y_lat, y_lon) in pairs:
+            self.glat.append(g_lat)
+            self.glon.append(g_lon)
+            self.ylat.append(y_lat)
+            self.ylon.append(y_lon)
+        self.dlat = array('d', (y - g for y, g in zip(self.ylat, self.glat)))
+        self.dlon = array('d', (y - g for y, g in zip(self.ylon, self.glon)))
+        self._np_arrays = None
+        self._index = None
+        self._inverse = None
+
+    @classmethod
+    def from_training_data(cls, training_data, version=0):
+        """Собирает модель из точек вида {"google": "lat, lon", "yandex": "lat, lon"}."""
+        pairs = []
+        for p in training_data:
+            try:
+                g_l, g_o = map(float, p["google"].split(", "))
+                y_l, y_o = map(float, p["yandex"].split(", "))
+                pairs.append(((g_l, g_o), (y_l, y_o)))
+            except:
+                continue
+        return cls(pairs, version)
+
+    def __len__(self):
+        return len(self.glat)
+
+    def __iter__(self):
+        """Пары ((g_lat, g_lon), (y_lat, y_lon)) — совместимо со старым списком."""
+        for g_lat, g_lon, y_lat, y_lon in zip(self.glat, self.glon, self.ylat, self.ylon):
+            yield (g_lat, g_lon), (y_lat, y_lon)
+
+    def fingerprint(self):
+        """
+        Отпечаток набора точек — SHA-1 координат в порядке точек. Совпадает
+        только у моделей из одинаковых пар; хранится вместе с данными,
+        посчитанными по модели (файл сетки поправок).
+        """
+        digest = hashlib.sha1(self.direction.encode('utf-8'))
+        for values in (self.glat, self.glon, self.ylat, self.ylon):
+            if sys.byteorder == 'big':
+                values = array('d', values)
+                values.byteswap()
+            digest.update(values.tobytes())
+        return digest.hexdigest()
+
+    def as_numpy(self):
+        """Представления массивов модели для NumPy (без копирования, кэшируются)."""
+        if self._np_arrays is None:
+            import numpy as np
+            self._np_arrays = tuple(
+                np.frombuffer(a, dtype=np.float64)
+                for a in (self.glat, self.glon, self.ylat, self.ylon, self.dlat, self.dlon)
+            )
+        return self._np_arrays
+
+    def get_index(self):
+        """Пространственный индекс по исходным точкам (строится один раз на модель)."""
+        if self._index is None:
+            self._index = GridIndex(self.glat, self.glon)
+        return self._index
+
+    def inverse(self):
+        """
+        Обратная модель по тем же точкам: исходные точки — точки Yandex,
+        смещения — с обратным знаком. Строится один раз на модель; массивы
+        точек общие с прямой моделью, индекс и массивы NumPy у каждой свои,
+        поэтому ни одно направление не пересчитывает данные другого.
+        Обратная к обратной — исходная модель. Гонка двух потоков безопасна:
+        оба построят одинаковую модель, останется одна.
+        """
+        inverse = self._inverse
+        if inverse is None:
+            direction = (DIRECTION_INVERSE if self.direction == DIRECTION_FORWARD
+                         else DIRECTION_FORWARD)
+            inverse = CalibrationModel(version=self.version, direction=direction)
+            inverse.glat, inverse.glon = self.ylat, self.ylon
+            inverse.ylat, inverse.ylon = self.glat, self.glon
+            inverse.dlat = array('d', (-d for d in self.dlat))
+            inverse.dlon = array('d', (-d for d in self.dlon))
+            inverse._inverse = self
+            self._inverse = inverse
+        return inverse
+
+    def for_direction(self, direction):
+        """Модель направления direction (см. DIRECTIONS): эта или обратная."""
+        if direction not in DIRECTIONS:
+            raise ValueError(f"Неизвестное направление {direction!r}")
+        return self if direction == self.direction else self.inverse()
+
+
+class GridIndex:
+    """
+    Равномерная сетка по координатам Google для поиска ближайших точек.
+    Поиск идёт кольцами ячеек от ячейки запроса и останавливается, как только
+    нижняя граница расстояния до следующего кольца превышает найденные.
+    """
+
+    def __init__(self, lats, lons, cell=None):
+        self.lats = lats
+        self.lons = lons
+
+        # Без явного размера ячейка делится пополам, пока плотные кластеры
+        # (города) не разойдутся примерно по GRID_POINTS_PER_CELL точек
+        auto = cell is None
+        cell = GRID_CELL_DEG if auto else cell
+        while True:
+            self.cell = cell
+            self.cells = {}
+            for i, (lat, lon) in enumerate(zip(lats, lons)):
+                key = (math.floor(lat / cell), math.floor(lon / cell))
+                self.cells.setdefault(key, []).append(i)
+            if (not auto or not self.cells or cell / 2 < GRID_MIN_CELL_DEG
+                    or len(lats) <= GRID_POINTS_PER_CELL * len(self.cells)):
+                break
+            cell /= 2
+
+        if self.cells:
+            rows = [k[0] for k in self.cells]
+            cols = [k[1] for k in self.cells]
+            self.bounds = (min(rows), max(rows), min(cols), max(cols))
+            self.max_abs_lat = max(abs(x) for x in lats)
+        else:
+            self.bounds = None
+            self.max_abs_lat = 0.0
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _ring(self, ci, cj, r):
+        """Ключи ячеек на расстоянии ровно r (по Чебышёву) от ячейки (ci, cj)."""
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def query(self, lat, lon, k=None, max_dist=None):
+        """
+        Возвращает [(dist, index), ...] по возрастанию расстояния (get_distance).
+        k — не более k ближайших, max_dist — только точки ближе max_dist.
+        """
+        if k is not None and k <= 0:
+            raise ValueError(f"k должно быть больше 0: {k}")
+        if not self.cells:
+            return []
+
+        cell = self.cell
+        ci, cj = math.floor(lat / cell), math.floor(lon / cell)
+        i_min, i_max, j_min, j_max = self.bounds
+        last_ring = max(abs(ci - i_min), abs(ci - i_max), abs(cj - j_min), abs(cj - j_max))
+
+        # Нижняя граница расстояния до точек кольца r: долгота сжимается
+        # не сильнее, чем cos максимальной широты
+        max_lat = min(max(self.max_abs_lat, abs(lat)) + cell, 89.9)
+        scale = cell * min(1.0, math.cos(math.radians(max_lat)))
+
+        found = []  # куча (-dist, index) из k лучших
+        lats, lons = self.lats, self.lons
+
+        def visit(indices):
+            for idx in indices:
+                dist = get_distance(lat, lon, lats[idx], lons[idx])
+                if max_dist is not None and dist > max_dist:
+                    continue
+                if k is None or len(found) < k:
+                    heapq.heappush(found, (-dist, idx))
+                elif dist < -found[0][0]:
+                    heapq.heapreplace(found, (-dist, idx))
+
+        for r in range(last_ring + 1):
+            if 8 * r > len(self.cells):
+                # Колец больше, чем занятых ячеек — дешевле просмотреть остаток целиком
+                for (i, j), indices in self.cells.items():
+                    if max(abs(i - ci), abs(j - cj)) >= r:
+                        visit(indices)
+                break
+
+            for key in self._ring(ci, cj, r):
+                indices = self.cells.get(key)
+                if indices:
+                    visit(indices)
+
+            bound = r * scale
+            if max_dist is not None and bound > max_dist:
+                break
+            if k is not None and len(found) == k and bound >= -found[0][0]:
+                break
+
+        return sorted((-d, idx) for d, idx in found)
+
+
+def _as_model(calibration_data):
+    """Приводит список пар или модель к CalibrationModel."""
+    if isinstance(calibration_data, CalibrationModel):
+        return calibration_data
+    return CalibrationModel(calibration_data)
+
+
+def _convert_fallback(glat, glon, direction=DIRECTION_FORWARD):
+    """
+    Глобальное линейное преобразование (когда нет калибровочных точек);
+    для обратного направления — решение той же системы относительно Google.
+    """
+    if direction == DIRECTION_INVERSE:
+        det = DEFAULT_A * DEFAULT_E - DEFAULT_B * DEFAULT_D
+        lat, lon = glat - DEFAULT_C, glon - DEFAULT_F
+        return (DEFAULT_E * lat - DEFAULT_B * lon) / det, (DEFAULT_A * lon - DEFAULT_D * lat) / det
+    ylat = DEFAULT_A * glat + DEFAULT_B * glon + DEFAULT_C
+    ylon = DEFAULT_D * glat + DEFAULT_E * glon + DEFAULT_F
+    return ylat, ylon
+
+
+def _direction(calibration_data):
+    """Направление модели (список пар — всегда прямое)."""
+    return getattr(calibration_data, 'direction', DIRECTION_FORWARD)
+
+
+def _idw_python(glat, glon, model):
+    """IDW-интерполяция одной точки на чистом Python."""
+    total_weight = 0
+    sum_dlat = 0
+    sum_dlon = 0
+
+    points = zip(model.glat, model.glon, model.ylat, model.ylon, model.dlat, model.dlon)
+    for g_lat, g_lon, y_lat, y_lon, d_lat, d_lon in points:
+        dist = get_distance(glat, glon, g_lat, g_lon)
+        if dist < IDW_EXACT_DIST:
+            return y_lat, y_lon
+        
+        weight = 1.0 / (dist ** IDW_POWER)
+        total_weight += weight
+        sum_dlat += d_lat * weight
+        sum_dlon += d_lon * weight
+    
+    if total_weight == 0:
+        return glat, glon
+
+    return glat + sum_dlat / total_weight, glon + sum_dlon / total_weight
+
+
+def _idw_neighbors(glat, glon, model, k=None, max_radius_km=None):
+    """
+    Локальная IDW-интерполяция по k ближайшим точкам и/или точкам в радиусе.
+    Если в радиусе нет ни одной точки, берутся k ближайших (или одна ближайшая).
+    """
+    index = model.get_index()
+    max_dist = max_radius_km / KM_PER_DEGREE if max_radius_km is not None else None
+
+    neighbors = index.query(glat, glon, k, max_dist)
+    if not neighbors and max_dist is not None:
+        neighbors = index.query(glat, glon, k or 1)
+
+    total_weight = 0
+    sum_dlat = 0
+    sum_dlon = 0
+    for dist, i in neighbors:
+        if dist < IDW_EXACT_DIST:
+            return model.ylat[i], model.ylon[i]
+
+        weight = 1.0 / (dist ** IDW_POWER)
+        total_weight += weight
+        sum_dlat += model.dlat[i] * weight
+        sum_dlon += model.dlon[i] * weight
+
+    if total_weight == 0:
+        return glat, glon
+
+    return glat + sum_dlat / total_weight, glon + sum_dlon / total_weight
+
+
+def _idw_numpy(glat, glon, model):
+    """IDW-интерполяция одной точки: расстояния и веса считаются массивами."""
+    import numpy as np
+    g_lat, g_lon, y_lat, y_lon, d_lat, d_lon = model.as_numpy()
+
+    avg_lat = np.radians((glat + g_lat) / 2.0)
+    dist = np.sqrt((glat - g_lat) ** 2 + ((glon - g_lon) * np.cos(avg_lat)) ** 2)
+
+    exact = np.flatnonzero(dist < IDW_EXACT_DIST)
+    if exact.size:
+        i = exact[0]
+        return float(y_lat[i]), float(y_lon[i])
+
+    weight = 1.0 / dist ** IDW_POWER
+    total_weight = weight.sum()
+    if total_weight == 0:
+        return glat, glon
+
+    return (glat + float(weight @ d_lat / total_weight),
+            glon + float(weight @ d_lon / total_weight))
+
+
+def _idw_numpy_batch(lats, lons, model):
+    """
+    IDW-интерполяция N точек сразу: матрица расстояний N×M по блокам.
+    Возвращает два массива (широты и долготы Yandex).
+    """
+    import numpy as np
+    g_lat, g_lon, y_lat, y_lon, d_lat, d_lon = model.as_numpy()
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    out_lat = np.empty_like(lats)
+    out_lon = np.empty_like(lons)
+
+    step = max(1, NUMPY_BATCH_CELLS // max(1, len(model)))
+    for start in range(0, len(lats), step):
+        q_lat = lats[start:start + step, None]
+        q_lon = lons[start:start + step, None]
+
+        avg_lat = np.radians((q_lat + g_lat) / 2.0)
+        dist = np.sqrt((q_lat - g_lat) ** 2 + ((q_lon - g_lon) * np.cos(avg_lat)) ** 2)
+
+        exact = dist < IDW_EXACT_DIST
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = 1.0 / dist ** IDW_POWER
+            weight[exact] = 0.0
+            total_weight = weight.sum(axis=1)
+            res_lat = q_lat[:, 0] + (weight @ d_lat) / total_weight
+            res_lon = q_lon[:, 0] + (weight @ d_lon) / total_weight
+
+        # Нулевой суммарный вес — координаты без изменений
+        zero = total_weight == 0
+        res_lat[zero] = q_lat[zero, 0]
+        res_lon[zero] = q_lon[zero, 0]
+
+        # Точное совпадение с калибровочной точкой — берём первую такую точку
+        has_exact = exact.any(axis=1)
+        if has_exact.any():
+            idx = exact[has_exact].argmax(axis=1)
+            res_lat[has_exact] = y_lat[idx]
+            res_lon[has_exact] = y_lon[idx]
+
+        out_lat[start:start + step] = res_lat
+        out_lon[start:start + step] = res_lon
+
+    return out_lat, out_lon
+
+
+class _CellTable:
+    """
+    Точки, отсортированные по ячейкам cell×cell (массивы NumPy): выборка
+    точек прямоугольника ячеек — несколько бинарных поисков и срезов.
+    """
+
+    STRIDE = 1 << 32
+
+    def __init__(self, lats, lons, cell):
+        import numpy as np
+        self.cell = cell
+        self.size = len(lats)
+        rows = np.floor(lats / cell).astype(np.int64)
+        cols = np.floor(lons / cell).astype(np.int64)
+        keys = rows * self.STRIDE + cols
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.max_abs_lat = float(np.abs(lats).max()) if len(lats) else 0.0
+
+    def around(self, lat, lon, radius):
+        """Номера точек, которые могут быть ближе radius (get_distance) к (lat, lon)."""
+        import numpy as np
+        cell = self.cell
+        cos_min = math.cos(math.radians(min(max(abs(lat), self.max_abs_lat) + cell, 89.9)))
+        span_lon = radius / cos_min
+        r0, r1 = math.floor((lat - radius) / cell), math.floor((lat + radius) / cell)
+        c0, c1 = math.floor((lon - span_lon) / cell), math.floor((lon + span_lon) / cell)
+        rows = np.arange(r0, r1 + 1, dtype=np.int64) * self.STRIDE
+        starts = np.searchsorted(self.keys, rows + c0, 'left')
+        ends = np.searchsorted(self.keys, rows + c1, 'right')
+        parts = [self.order[s:e] for s, e in zip(starts.tolist(), ends.tolist()) if e > s]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def candidates(self, lat, lon, count):
+        """Точки в окрестности (lat, lon), среди которых не меньше count (или все)."""
+        radius = self.cell
+        while True:
+            found = self.around(lat, lon, radius)
+            if len(found) >= min(count, self.size):
+                return found
+            radius *= 2
+
+
+def _idw_block(model, lats, lons, k=None, max_radius_km=None, exclude=None, table=None):
+    """
+    IDW для блока близких точек матрицами NumPy: k ближайших и/или радиус,
+    как в _idw_neighbors (без k и радиуса — по всем точкам). Кандидаты —
+    калибровочные точки около центра блока с запасом на его полудиагональ,
+    поэтому соседи каждой точки те же, что выбрал бы индекс.
+    exclude — номер калибровочной точки, не участвующей в расчёте строки
+    (для скользящего контроля), или -1. table (_CellTable) ускоряет выбор
+    кандидатов на больших наборах.
+    Возвращает массив смещений (dlat, dlon) формы (n, 2).
+    """
+    import numpy as np
+    g_lat, g_lon, _, _, d_lat, d_lon = model.as_numpy()
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    max_dist = max_radius_km / KM_PER_DEGREE if max_radius_km is not None else None
+    extra = 0 if exclude is None else 1
+
+    if k is None and max_dist is None:
+        candidates = np.arange(len(model))
+    else:
+        lat0, lat1, lon0, lon1 = lats.min(), lats.max(), lons.min(), lons.max()
+        c_lat, c_lon = (lat0 + lat1) / 2, (lon0 + lon1) / 2
+        half_diag = get_distance(lat0, lon0, lat1, lon1) / 2
+
+        def center_dist(idx):
+            return np.sqrt((g_lat[idx] - c_lat) ** 2 + ((g_lon[idx] - c_lon)
+                           * np.cos(np.radians((g_lat[idx] + c_lat) / 2.0))) ** 2)
+
+        # Соседи любой точки x не дальше от центра, чем kth(центр) + 2·d(x, центр)
+        kk = min((k or 1) + extra, len(model))
+        nearby = table.candidates(c_lat, c_lon, kk) if table is not None else slice(None)
+        reach = np.partition(center_dist(nearby), kk - 1)[kk - 1] + 2 * half_diag
+        if max_dist is not None:
+            reach = max(reach, max_dist + half_diag)
+        reach = reach * 1.05 + 1e-9
+        if table is not None:
+            candidates = np.sort(table.around(c_lat, c_lon, reach))
+            candidates = candidates[center_dist(candidates) <= reach]
+        else:
+            candidates = np.nonzero(center_dist(slice(None)) <= reach)[0]
+    cg_lat, cg_lon = g_lat[candidates], g_lon[candidates]
+    cd = np.stack([d_lat[candidates], d_lon[candidates]], axis=1)
+
+    q_lat, q_lon = lats[:, None], lons[:, None]
+    avg_lat = np.radians((q_lat + cg_lat) / 2.0)
+    dist = np.sqrt((q_lat - cg_lat) ** 2 + ((q_lon - cg_lon) * np.cos(avg_lat)) ** 2)
+    if exclude is not None:
+        exclude = np.asarray(exclude)
+        pos = np.minimum(np.searchsorted(candidates, exclude), len(candidates) - 1)
+        rows = np.nonzero(candidates[pos] == exclude)[0]
+        dist[rows, pos[rows]] = np.inf
+
+    if max_dist is not None:
+        masked = np.where(dist <= max_dist, dist, np.inf)
+        # В радиусе никого — берутся k ближайших (или одна ближайшая)
+        empty = np.isinf(masked).all(axis=1)
+        masked[empty] = dist[empty]
+        limit = np.where(empty, k or 1, k or len(candidates))
+        order = np.argsort(masked, axis=1, kind='stable')
+    else:
+        masked = dist
+        limit = np.full(len(dist), k or len(candidates))
+        order = np.argpartition(masked, k - 1, axis=1)[:, :k] if k and k < len(candidates) \
+            else np.argsort(masked, axis=1, kind='stable')
+    ranked = np.take_along_axis(masked, order, axis=1)
+    keep = np.isfinite(ranked) & (np.arange(ranked.shape[1]) < limit[:, None])
+
+    with np.errstate(divide='ignore'):
+        weight = np.where(keep, 1.0 / ranked ** IDW_POWER, 0.0)
+    exact = keep & (ranked < IDW_EXACT_DIST)
+    has_exact = exact.any(axis=1)
+    if has_exact.any():
+        # Совпадение с калибровочной точкой — берётся её смещение
+        nearest = np.where(exact, ranked, np.inf).argmin(axis=1)
+        weight[has_exact] = 0.0
+        weight[has_exact, nearest[has_exact]] = 1.0
+
+    total = weight.sum(axis=1, keepdims=True)
+    total[total == 0] = 1.0
+    return (weight[:, :, None] * cd[order]).sum(axis=1) / total
+
+
+def check_idw_options(k, max_radius_km):
+    """
+    Проверяет параметры IDW: k — целое больше 0, max_radius_km — конечное
+    число больше 0 (None — без ограничения). Иначе ValueError: с k=0 точки
+    вернулись бы без поправки, с отрицательным k поиск соседей падает.
+    """
+    if k is not None and (isinstance(k, bool) or not isinstance(k, numbers.Integral) or k <= 0):
+        raise ValueError(f"k — целое число больше 0 или None, получено {k!r}")
+    if max_radius_km is not None and (
+            isinstance(max_radius_km, bool) or not isinstance(max_radius_km, numbers.Real)
+            or not math.isfinite(max_radius_km) or max_radius_km <= 0):
+        raise ValueError(f"max_radius_km — конечное число больше 0 или None, "
+                         f"получено {max_radius_km!r}")
+
+
+def _is_local(model, k, max_radius_km):
+    """Нужна ли локальная интерполяция через индекс вместо полного прохода."""
+    if max_radius_km is not None:
+        return True
+    return k is not None and k < len(model)
+
+
+def convert_coords_pair(glat, glon, calibration_data, k=IDW_NEIGHBORS,
+                        max_radius_km=IDW_MAX_RADIUS_KM):
+    """
+    Конвертирует координаты Google в Yandex, возвращает кортеж (lat, lon).
+    k и max_radius_km ограничивают интерполяцию ближайшими точками (см. GridIndex).
+    С обратной моделью (CalibrationModel.inverse) — Yandex в Google.
+    """
+    check_idw_options(k, max_radius_km)
+    if not calibration_data:
+        return _convert_fallback(glat, glon, _direction(calibration_data))
+
+    model = _as_model(calibration_data)
+    if _is_local(model, k, max_radius_km):
+        return _idw_neighbors(glat, glon, model, k, max_radius_km)
+    if HAS_NUMPY and len(model) >= NUMPY_MIN_POINTS:
+        return _idw_numpy(glat, glon, model)
+    return _idw_python(glat, glon, model)
+
+
+def convert_coords_pairs(points, calibration_data, k=IDW_NEIGHBORS,
+                         max_radius_km=IDW_MAX_RADIUS_KM):
+    """
+    Конвертирует список точек [(lat, lon), ...] одним проходом.
+    С NumPy считается матрицами N×M, без него — поточечно на Python.
+    Возвращает список кортежей (lat, lon).
+    """
+    check_idw_options(k, max_radius_km)
+    points = list(points)
+    if not points:
+        return []
+
+    if not calibration_data:
+        direction = _direction(calibration_data)
+        return [_convert_fallback(lat, lon, direction) for lat, lon in points]
+
+    model = _as_model(calibration_data)
+    if _is_local(model, k, max_radius_km):
+        return [_idw_neighbors(lat, lon, model, k, max_radius_km) for lat, lon in points]
+    if HAS_NUMPY:
+        lats, lons = _idw_numpy_batch([p[0] for p in points], [p[1] for p in points], model)
+        return list(zip(lats.tolist(), lons.tolist()))
+    return [_idw_python(lat, lon, model) for lat, lon in points]
+
+
+def _idw_without(model, i, k=None, max_radius_km=None):
+    """IDW в калибровочной точке i по остальным точкам на чистом Python."""
+    glat, glon = model.glat[i], model.glon[i]
+    if _is_local(model, k, max_radius_km):
+        index = model.get_index()
+        max_dist = max_radius_km / KM_PER_DEGREE if max_radius_km is not None else None
+        neighbors = [n for n in index.query(glat, glon, k and k + 1, max_dist) if n[1] != i][:k]
+        if not neighbors and max_dist is not None:
+            neighbors = [n for n in index.query(glat, glon, (k or 1) + 1) if n[1] != i][:k or 1]
+    else:
+        neighbors = [(get_distance(glat, glon, lat, lon), j)
+                     for j, (lat, lon) in enumerate(zip(model.glat, model.glon)) if j != i]
+
+    total_weight = 0
+    sum_dlat = 0
+    sum_dlon = 0
+    for dist, j in neighbors:
+        if dist < IDW_EXACT_DIST:
+            return model.ylat[j], model.ylon[j]
+        weight = 1.0 / (dist ** IDW_POWER)
+        total_weight += weight
+        sum_dlat += model.dlat[j] * weight
+        sum_dlon += model.dlon[j] * weight
+
+    if total_weight == 0:
+        return glat, glon
+    return glat + sum_dlat / total_weight, glon + sum_dlon / total_weight
+
+
+def leave_one_out(calibration_data, indices=None, k=IDW_NEIGHBORS,
+                  max_radius_km=IDW_MAX_RADIUS_KM):
+    """
+    Скользящий контроль: для калибровочных точек (всех или с номерами indices)
+    координаты Yandex, которые дал бы IDW по остальным точкам.
+    С NumPy точки считаются блоками по ячейкам пространственного индекса
+    (_idw_block), без него — по одной. Возвращает список (lat, lon).
+    """
+    check_idw_options(k, max_radius_km)
+    model = _as_model(calibration_data)
+    indices = list(range(len(model))) if indices is None else list(indices)
+    if len(model) < 2 or not HAS_NUMPY:
+        return [_idw_without(model, i, k, max_radius_km) if len(model) > 1
+                else (model.glat[i], model.glon[i]) for i in indices]
+
+    import numpy as np
+    g_lat, g_lon = model.as_numpy()[:2]
+    table = None
+    if _is_local(model, k, max_radius_km):
+        # Блок — точки одной ячейки индекса
+        cell = model.get_index().cell
+        table = _CellTable(g_lat, g_lon, cell)
+        blocks = {}
+        for i in indices:
+            key = (math.floor(model.glat[i] / cell), math.floor(model.glon[i] / cell))
+            blocks.setdefault(key, []).append(i)
+        blocks = list(blocks.values())
+    else:
+        step = max(1, NUMPY_BATCH_CELLS // len(model))
+        blocks = [indices[s:s + step] for s in range(0, len(indices), step)]
+
+    out = {}
+    for block in blocks:
+        block = np.array(block, dtype=np.int64)
+        offsets = _idw_block(model, g_lat[block], g_lon[block], k, max_radius_km, block, table)
+        for i, (dlat, dlon) in zip(block.tolist(), offsets.tolist()):
+            out[i] = (model.glat[i] + dlat, model.glon[i] + dlon)
+    return [out[i] for i in indices]
+
+
+def convert_coords_batch(points, calibration_data, k=IDW_NEIGHBORS,
+                         max_radius_km=IDW_MAX_RADIUS_KM):
+    """То же, что convert_coords_pairs, но возвращает строки формата convert_coords_advanced."""
+    return [f"{ylat:.6f}, {ylon:.6f}"
+            for ylat, ylon in convert_coords_pairs(points, calibration_data, k, max_radius_km)]
+
+
+def convert_coords_advanced(glat, glon, calibration_data, k=IDW_NEIGHBORS,
+                            max_radius_km=IDW_MAX_RADIUS_KM):
+    """
+    Конвертирует координаты Google в Yandex методом IDW-интерполяции.
+    calibration_data — CalibrationModel или список пар ((g_lat, g_lon), (y_lat, y_lon));
+    обратная модель (CalibrationModel.inverse) конвертирует Yandex в Google.
+    """
+    ylat, ylon = convert_coords_pair(glat, glon, calibration_data, k, max_radius_km)
+    return f"{ylat:.6f}, {ylon:.6f}"
+
+
+def convert_roundtrip(points, calibration_data, k=IDW_NEIGHBORS,
+                      max_radius_km=IDW_MAX_RADIUS_KM, converter=None, back_converter=None):
+    """
+    Конвертация с проверкой обратным ходом: точки переводятся моделью
+    (или конвертером converter), результат — обратно обратной моделью
+    (или back_converter). Возвращает список (результат (lat, lon), ошибка
+    обратного хода в метрах). Ошибка больше долей метра — признак
+    противоречивых калибровочных точек рядом или точки вне калибровки.
+    """
+    points = list(points)
+    model = _as_model(calibration_data)
+    if converter is not None:
+        results = converter.convert_pairs(points)
+    else:
+        results = convert_coords_pairs(points, model, k, max_radius_km)
+    if back_converter is not None:
+        back = back_converter.convert_pairs(results)
+    else:
+        back = convert_coords_pairs(results, model.inverse(), k, max_radius_km)
+    m_per_degree = KM_PER_DEGREE * 1000
+    return [(res, get_distance(lat, lon, b_lat, b_lon) * m_per_degree)
+            for (lat, lon), res, (b_lat, b_lon) in zip(points, results, back)]
+
+
+class ConversionCache:
+    """
+    LRU-кэш результатов конвертации для повторяющихся координат.
+    Ключ — округлённые до precision знаков координаты, параметры IDW и
+    направление модели; кэш привязан к версии модели и очищается, когда приходит модель
+    другой версии. size <= 0 или enabled=False — кэш не используется.
+    """
+
+    def __init__(self, size=CONVERT_CACHE_SIZE, precision=CONVERT_CACHE_PRECISION, enabled=True):
+        self.size = size
+        self.precision = precision
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def convert_pair(self, glat, glon, model, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM):
+        """Как convert_coords_pair, но повторные запросы берутся из кэша."""
+        if not self.enabled or self.size <= 0 or not isinstance(model, CalibrationModel):
+            return convert_coords_pair(glat, glon, model, k, max_radius_km)
+
+        key = (round(glat, self.precision), round(glon, self.precision), k, max_radius_km,
+               model.direction)
+        with self._lock:
+            if self.version != model.version:
+                self._data.clear()
+                self.version = model.version
+            result = self._data.get(key)
+            if result is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = convert_coords_pair(glat, glon, model, k, max_radius_km)
+        with self._lock:
+            if self.version == model.version:
+                self._data[key] = result
+                if len(self._data) > self.size:
+                    self._data.popitem(last=False)
+        return result
+
+    def convert_advanced(self, glat, glon, model, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM):
+        """Как convert_coords_advanced, но через кэш."""
+        ylat, ylon = self.convert_pair(glat, glon, model, k, max_radius_km)
+        return f"{ylat:.6f}, {ylon:.6f}"
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled and self.size > 0,
+            "size": len(self._data),
+            "max_size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# === РАЗБОР КООРДИНАТ ===
+
+def guess_source_type(text):
+    """
+    Определяет источник координаты по первой паре в тексте (см. coords.parse_coords):
+    ссылки Google и Яндекса — по формату, десятичные пары — по количеству
+    знаков после запятой: если знаков > 7 — это Google, если <= 7 — Yandex.
+    """
+    coords = parse_coords(text)
+    return coords.source if coords is not None else "Неизвестно"
+
+
+def order_calibration_pair(coord1, coord2, type1=None, type2=None):
+    """
+    Порядок пары калибровки: (Google, Yandex). type1/type2 — источники
+    координат, если уже известны (иначе guess_source_type). Пара меняется
+    местами, если первая — Yandex или вторая — Google; координата
+    неизвестного источника занимает оставшееся место.
+    """
+    type1 = type1 or guess_source_type(coord1)
+    type2 = type2 or guess_source_type(coord2)
+    if type1 == "Yandex" or type2 == "Google":
+        return coord2, coord1
+    return coord1, coord2
+
+
+def parse_batch_row(item):
+    """
+    Разбирает строку пакетного запроса: текст с координатами, [lat, lon]
+    или {"coords": "..."}. Возвращает (lat, lon) или бросает ValueError.
+    """
+    if isinstance(item, dict):
+        item = item.get('coords', '')
+    if isinstance(item, (list, tuple)):
+        if len(item) != 2:
+            raise ValueError("Ожидается пара [lat, lon]")
+        return float(item[0]), float(item[1])
+    if isinstance(item, str):
+        coords = parse_coords(item)
+        if coords is not None:
+            return coords.lat, coords.lon
+    raise ValueError("Неверный формат координат")
+
+
+def find_coords(text):
+    """
+    Все пары координат в тексте за один проход: список (начало, конец, lat, lon).
+    Ссылки и пары целых чисел (номера, размеры) не заменяются.
+    """
+    return [(c.start, c.end, c.lat, c.lon)
+            for c in tokenize(text, TEXT_KINDS) if c.precision]
+
+
+def convert_text(text, calibration_data, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM,
+                 converter=None):
+    """
+    Заменяет в тексте все пары координат Google результатами конвертации,
+    остальной текст (разделители, подписи, строки таблицы) не меняется.
+    Все пары конвертируются одним пакетом на одной модели (или ускоренным
+    конвертером converter). Возвращает (новый текст, число пар).
+    """
+    found = find_coords(text)
+    if not found:
+        return text, 0
+    points = [(lat, lon) for _, _, lat, lon in found]
+    if converter is not None:
+        results = converter.convert_batch(points)
+    else:
+        results = convert_coords_batch(points, calibration_data, k, max_radius_km)
+
+    parts = []
+    pos = 0
+    for (start, end, _, _), res in zip(found, results):
+        parts.append(text[pos:start])
+        parts.append(res)
+        pos = end
+    parts.append(text[pos:])
+    return ''.join(parts), len(found)
+
+
+def load_training_data(path):
+    """Читает calibration.json (список точек {"google", "yandex", "location"})."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def base_training_data():
+    """Точки BASE_CALIBRATION в формате calibration.json."""
+    return [{
+        "google": f"{g[0]}, {g[1]}",
+        "yandex": f"{y[0]}, {y[1]}",
+        "location": ""
+    } for g, y in BASE_CALIBRATION]
@@ -0,0 +1,73 @@
+"""
+Шина событий для серверной отправки изменений состояния (Server-Sent Events).
+Каждый подписчик получает свою очередь; медленные подписчики отключаются,
+чтобы не задерживать публикацию.
+"""
+import json
+import queue
+import threading
+
+# Максимум событий в очереди одного подписчика и период keep-alive (сек.)
+SUBSCRIBER_QUEUE_SIZE = 1000
+KEEPALIVE_INTERVAL = 15.0
+
+
+class EventBus:
+    """Рассылает события всем подписчикам."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Возвращает очередь нового подписчика."""
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event, data):
+        """Отправляет событие event с JSON-данными data всем подписчикам."""
+        message = format_sse(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                self.unsubscribe(q)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, initial=()):
+        """
+        Генератор текста text/event-stream для одного клиента:
+        сначала сообщения initial, затем события шины и keep-alive.
+        """
+        q = self.subscribe()
+        try:
+            for message in initial:
+                yield message
+            while True:
+                try:
+                    yield q.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    with self._lock:
+                        dropped = q not in self._subscribers
+                    if dropped:
+                        # Клиент не успевал читать — EventSource переподключится
+                        return
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(q)
+
+
+def format_sse(event, data):
+    """Сообщение в формате Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
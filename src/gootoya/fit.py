@@ -0,0 +1,383 @@
+"""
+Локальные аппроксимации Google → Yandex по методу наименьших квадратов.
+
+Калибровочные точки автоматически делятся на районы (города): связные
+группы занятых ячеек FIT_CLUSTER_DEG; крупные районы делятся пополам по
+медиане, пока в них больше FIT_SPLIT_POINTS точек. Для каждого района
+смещение (dlat, dlon) аппроксимируется константой, аффинным или
+квадратичным преобразованием, и для каждого варианта, как и для IDW,
+считается ошибка скользящего контроля (leave-one-out). В районе остаётся
+вариант с меньшей ошибкой: если это аппроксимация, конвертация стоит
+несколько умножений и сложений, иначе — обычный IDW. Точки вне районов
+считаются IDW.
+"""
+import math
+
+from .core import (
+    HAS_NUMPY, IDW_NEIGHBORS, IDW_MAX_RADIUS_KM, KM_PER_DEGREE,
+    CalibrationModel, check_idw_options, convert_coords_pairs, get_distance, leave_one_out,
+)
+
+# Размер ячейки для выделения районов (градусы): точки в соседних занятых
+# ячейках попадают в один район
+FIT_CLUSTER_DEG = 0.25
+
+# Район с большим числом точек делится пополам по длинной стороне (не глубже FIT_SPLIT_DEPTH)
+FIT_SPLIT_POINTS = 400
+FIT_SPLIT_DEPTH = 8
+
+# Запас вокруг точек района, в котором применяется его аппроксимация (градусы)
+FIT_REGION_MARGIN_DEG = 0.05
+
+# Минимум точек для аппроксимации и сколько точек района проверять скользящим контролем
+FIT_MIN_POINTS = 3
+FIT_CV_MAX_POINTS = 200
+
+# Варианты аппроксимации и число коэффициентов (на широту и на долготу)
+FIT_KINDS = ('constant', 'affine', 'poly2')
+FIT_TERMS = {'constant': 1, 'affine': 3, 'poly2': 6}
+
+# Ячейка таблицы поиска района по точке (градусы)
+FIT_LOOKUP_CELL_DEG = 0.25
+
+M_PER_DEGREE = KM_PER_DEGREE * 1000
+
+
+def _terms(x, y, kind):
+    """Признаки точки для аппроксимации вида kind (x, y — нормированные координаты)."""
+    if kind == 'constant':
+        return (1.0,)
+    if kind == 'affine':
+        return (1.0, x, y)
+    return (1.0, x, y, x * x, x * y, y * y)
+
+
+def _solve(matrix, rhs):
+    """
+    Решает систему matrix · x = rhs (несколько правых частей) методом Гаусса
+    с выбором главного элемента. None — если система вырождена.
+    """
+    n = len(matrix)
+    a = [list(row) + list(r) for row, r in zip(matrix, rhs)]
+    scale = max(abs(matrix[i][i]) for i in range(n)) or 1.0
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(a[r][col]))
+        if abs(a[pivot][col]) < scale * 1e-12:
+            return None
+        a[col], a[pivot] = a[pivot], a[col]
+        for r in range(col + 1, n):
+            f = a[r][col] / a[col][col]
+            if f:
+                for c in range(col, len(a[r])):
+                    a[r][c] -= f * a[col][c]
+    width = len(a[0]) - n
+    x = [[0.0] * width for _ in range(n)]
+    for r in range(n - 1, -1, -1):
+        for w in range(width):
+            s = a[r][n + w] - sum(a[r][c] * x[c][w] for c in range(r + 1, n))
+            x[r][w] = s / a[r][r]
+    return x
+
+
+class _NormalEquations:
+    """Накопленные нормальные уравнения AᵀA·c = Aᵀb для dlat и dlon."""
+
+    def __init__(self, size):
+        self.ata = [[0.0] * size for _ in range(size)]
+        self.atb = [[0.0, 0.0] for _ in range(size)]
+
+    def add(self, terms, dlat, dlon, sign=1.0):
+        for i, ti in enumerate(terms):
+            row = self.ata[i]
+            for j, tj in enumerate(terms):
+                row[j] += sign * ti * tj
+            self.atb[i][0] += sign * ti * dlat
+            self.atb[i][1] += sign * ti * dlon
+
+    def solve(self, without=None):
+        """Коэффициенты (для dlat, для dlon); without — (terms, dlat, dlon) исключаемой точки."""
+        ata, atb = self.ata, self.atb
+        if without is not None:
+            terms, dlat, dlon = without
+            ata = [[v - terms[i] * terms[j] for j, v in enumerate(row)] for i, row in enumerate(ata)]
+            atb = [[b[0] - terms[i] * dlat, b[1] - terms[i] * dlon] for i, b in enumerate(atb)]
+        x = _solve(ata, atb)
+        if x is None:
+            return None
+        return [c[0] for c in x], [c[1] for c in x]
+
+
+class RegionFit:
+    """
+    Район калибровки: границы, центр и масштаб нормировки, выбранный способ
+    (kind — 'idw' или вариант FIT_KINDS), коэффициенты и ошибки скользящего
+    контроля по каждому способу (м).
+    """
+
+    __slots__ = ('bbox', 'center', 'scale', 'points', 'kind', 'coef_lat', 'coef_lon', 'errors')
+
+    def __init__(self, bbox, center, scale, points, kind='idw', coef_lat=(), coef_lon=(),
+                 errors=None):
+        self.bbox = bbox  # (lat_min, lat_max, lon_min, lon_max) с запасом
+        self.center = center
+        self.scale = scale
+        self.points = points
+        self.kind = kind
+        self.coef_lat = tuple(coef_lat)
+        self.coef_lon = tuple(coef_lon)
+        self.errors = errors or {}
+
+    def contains(self, lat, lon):
+        lat_min, lat_max, lon_min, lon_max = self.bbox
+        return lat_min <= lat <= lat_max and lon_min <= lon <= lon_max
+
+    def offset(self, lat, lon):
+        """Смещение (dlat, dlon) по аппроксимации района."""
+        x = (lat - self.center[0]) / self.scale
+        y = (lon - self.center[1]) / self.scale
+        terms = _terms(x, y, self.kind)
+        return (sum(c * t for c, t in zip(self.coef_lat, terms)),
+                sum(c * t for c, t in zip(self.coef_lon, terms)))
+
+    def to_dict(self):
+        return {
+            "center": [round(self.center[0], 6), round(self.center[1], 6)],
+            "bbox": [round(v, 6) for v in self.bbox],
+            "points": self.points,
+            "kind": self.kind,
+            "cv_rms_m": {k: round(v, 4) for k, v in self.errors.items()},
+        }
+
+
+# === РАЙОНЫ ===
+
+def find_clusters(model, cell_deg=FIT_CLUSTER_DEG):
+    """Связные группы занятых ячеек cell_deg (соседство по 8 направлениям)."""
+    cells = {}
+    for i, (lat, lon) in enumerate(zip(model.glat, model.glon)):
+        cells.setdefault((math.floor(lat / cell_deg), math.floor(lon / cell_deg)), []).append(i)
+
+    seen = set()
+    clusters = []
+    for start in sorted(cells):
+        if start in seen:
+            continue
+        seen.add(start)
+        stack = [start]
+        members = []
+        while stack:
+            ci, cj = stack.pop()
+            members.extend(cells[(ci, cj)])
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    key = (ci + di, cj + dj)
+                    if key in cells and key not in seen:
+                        seen.add(key)
+                        stack.append(key)
+        clusters.append(sorted(members))
+    return clusters
+
+
+def _split(model, members, depth=0):
+    """Делит крупный район пополам по медиане длинной стороны."""
+    if len(members) <= FIT_SPLIT_POINTS or depth >= FIT_SPLIT_DEPTH:
+        return [members]
+    lats = [model.glat[i] for i in members]
+    lons = [model.glon[i] for i in members]
+    coslat = math.cos(math.radians(sum(lats) / len(lats)))
+    coords = model.glat if max(lats) - min(lats) >= (max(lons) - min(lons)) * coslat \
+        else model.glon
+    ordered = sorted(members, key=lambda i: coords[i])
+    half = len(ordered) // 2
+    return _split(model, ordered[:half], depth + 1) + _split(model, ordered[half:], depth + 1)
+
+
+# === СКОЛЬЗЯЩИЙ КОНТРОЛЬ ===
+
+def _error_m(model, i, ylat, ylon):
+    return get_distance(ylat, ylon, model.ylat[i], model.ylon[i]) * M_PER_DEGREE
+
+
+def _rms(values):
+    return math.sqrt(sum(v * v for v in values) / len(values)) if values else math.inf
+
+
+def _fit_region(model, members, kinds, k, max_radius_km, margin_deg):
+    """Аппроксимирует район всеми вариантами kinds и выбирает лучший по скользящему контролю."""
+    lats = [model.glat[i] for i in members]
+    lons = [model.glon[i] for i in members]
+    center = (sum(lats) / len(lats), sum(lons) / len(lons))
+    scale = max(max(lats) - min(lats), max(lons) - min(lons), 1e-3) / 2
+    bbox = (min(lats) - margin_deg, max(lats) + margin_deg,
+            min(lons) - margin_deg, max(lons) + margin_deg)
+    region = RegionFit(bbox, center, scale, len(members))
+
+    held_out = members[::max(1, math.ceil(len(members) / FIT_CV_MAX_POINTS))]
+    region.errors['idw'] = _rms([_error_m(model, i, *p) for i, p in
+                                 zip(held_out, leave_one_out(model, held_out, k, max_radius_km))])
+    if len(members) < FIT_MIN_POINTS:
+        return region
+
+    best = region.errors['idw']
+    for kind in kinds:
+        size = FIT_TERMS[kind]
+        if len(members) <= size:
+            continue
+        rows = {i: _terms((model.glat[i] - center[0]) / scale,
+                          (model.glon[i] - center[1]) / scale, kind) for i in members}
+        normal = _NormalEquations(size)
+        for i in members:
+            normal.add(rows[i], model.dlat[i], model.dlon[i])
+        coef = normal.solve()
+        if coef is None:
+            continue
+
+        errors = []
+        for i in held_out:
+            loo = normal.solve((rows[i], model.dlat[i], model.dlon[i]))
+            if loo is None:
+                errors = None
+                break
+            dlat = sum(c * t for c, t in zip(loo[0], rows[i]))
+            dlon = sum(c * t for c, t in zip(loo[1], rows[i]))
+            errors.append(_error_m(model, i, model.glat[i] + dlat, model.glon[i] + dlon))
+        if errors is None:
+            continue
+        region.errors[kind] = _rms(errors)
+        # При равной ошибке выбирается аппроксимация — она быстрее
+        if region.errors[kind] <= best:
+            best = region.errors[kind]
+            region.kind, region.coef_lat, region.coef_lon = kind, tuple(coef[0]), tuple(coef[1])
+    return region
+
+
+# === МОДЕЛЬ ===
+
+class FittedTransform:
+    """
+    Набор районов с аппроксимациями. Точка конвертируется аппроксимацией
+    ближайшего (по центру) района, в границы которого попадает; если такого
+    нет или в районе выбран IDW — точным IDW по модели.
+    """
+
+    def __init__(self, regions, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM,
+                 version=0, model=None):
+        self.regions = regions
+        self.k = k
+        self.max_radius_km = max_radius_km
+        self.version = version
+        self.model = model
+        self.fitted = [r for r in regions if r.kind != 'idw']
+
+        # Ячейка -> районы с аппроксимацией, пересекающие ячейку
+        self.lookup_cells = {}
+        for region in self.fitted:
+            lat_min, lat_max, lon_min, lon_max = region.bbox
+            for ci in range(math.floor(lat_min / FIT_LOOKUP_CELL_DEG),
+                            math.floor(lat_max / FIT_LOOKUP_CELL_DEG) + 1):
+                for cj in range(math.floor(lon_min / FIT_LOOKUP_CELL_DEG),
+                                math.floor(lon_max / FIT_LOOKUP_CELL_DEG) + 1):
+                    self.lookup_cells.setdefault((ci, cj), []).append(region)
+
+    @classmethod
+    def fit(cls, calibration_data, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM,
+            kinds=FIT_KINDS, cluster_deg=FIT_CLUSTER_DEG, margin_deg=FIT_REGION_MARGIN_DEG):
+        """Выделяет районы, аппроксимирует их и выбирает способ по скользящему контролю."""
+        check_idw_options(k, max_radius_km)
+        model = calibration_data if isinstance(calibration_data, CalibrationModel) \
+            else CalibrationModel(calibration_data)
+        regions = []
+        for cluster in find_clusters(model, cluster_deg):
+            for members in _split(model, cluster):
+                regions.append(_fit_region(model, members, kinds, k, max_radius_km, margin_deg))
+        return cls(regions, k, max_radius_km, model.version, model)
+
+    def region_for(self, glat, glon):
+        """Район с аппроксимацией для точки или None."""
+        candidates = self.lookup_cells.get((math.floor(glat / FIT_LOOKUP_CELL_DEG),
+                                            math.floor(glon / FIT_LOOKUP_CELL_DEG)))
+        if not candidates:
+            return None
+        best, best_dist = None, math.inf
+        for region in candidates:
+            if region.contains(glat, glon):
+                dist = (glat - region.center[0]) ** 2 + (glon - region.center[1]) ** 2
+                if dist < best_dist:
+                    best, best_dist = region, dist
+        return best
+
+    def _fallback(self, points):
+        return convert_coords_pairs(points, self.model, self.k, self.max_radius_km)
+
+    def convert_pair(self, glat, glon):
+        """Координаты Yandex для точки (lat, lon)."""
+        region = self.region_for(glat, glon)
+        if region is None:
+            return self._fallback([(glat, glon)])[0]
+        dlat, dlon = region.offset(glat, glon)
+        return glat + dlat, glon + dlon
+
+    def convert_pairs(self, points):
+        """Список точек [(lat, lon), ...] -> список (lat, lon); с NumPy — векторно."""
+        points = list(points)
+        if not points:
+            return []
+        if HAS_NUMPY:
+            lats, lons = self.convert_arrays([p[0] for p in points], [p[1] for p in points])
+            return list(zip(lats.tolist(), lons.tolist()))
+
+        out = []
+        missing = []
+        for i, (glat, glon) in enumerate(points):
+            region = self.region_for(glat, glon)
+            if region is None:
+                missing.append(i)
+                out.append(None)
+            else:
+                dlat, dlon = region.offset(glat, glon)
+                out.append((glat + dlat, glon + dlon))
+        if missing:
+            for i, result in zip(missing, self._fallback([points[i] for i in missing])):
+                out[i] = result
+        return out
+
+    def convert_batch(self, points):
+        """То же, что convert_pairs, но возвращает строки формата convert_coords_advanced."""
+        return [f"{ylat:.6f}, {ylon:.6f}" for ylat, ylon in self.convert_pairs(points)]
+
+    def convert_arrays(self, lats, lons):
+        """Векторная конвертация массивов широт и долгот (нужен NumPy)."""
+        import numpy as np
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        owner = np.full(len(lats), -1)
+        best = np.full(len(lats), np.inf)
+        for n, region in enumerate(self.fitted):
+            lat_min, lat_max, lon_min, lon_max = region.bbox
+            inside = (lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)
+            dist = np.where(inside, (lats - region.center[0]) ** 2 + (lons - region.center[1]) ** 2,
+                            np.inf)
+            closer = dist < best
+            owner[closer] = n
+            best[closer] = dist[closer]
+
+        out_lat = lats.copy()
+        out_lon = lons.copy()
+        for n in np.unique(owner[owner >= 0]).tolist():
+            region = self.fitted[n]
+            sel = np.nonzero(owner == n)[0]
+            terms = _terms((lats[sel] - region.center[0]) / region.scale,
+                           (lons[sel] - region.center[1]) / region.scale, region.kind)
+            out_lat[sel] += sum(c * t for c, t in zip(region.coef_lat, terms))
+            out_lon[sel] += sum(c * t for c, t in zip(region.coef_lon, terms))
+
+        rest = np.nonzero(owner < 0)[0]
+        if rest.size:
+            results = self._fallback(list(zip(lats[rest].tolist(), lons[rest].tolist())))
+            out_lat[rest] = [r[0] for r in results]
+            out_lon[rest] = [r[1] for r in results]
+        return out_lat, out_lon
+
+    def report(self):
+        """Районы и ошибки скользящего контроля (м) по способам."""
+        return [r.to_dict() for r in self.regions]
@@ -0,0 +1,353 @@
+"""
+Обратный геокодинг калибровочных точек (название города по координатам).
+Ответы Nominatim кэшируются на диске (SQLite) по ячейкам сетки координат,
+поэтому соседние точки одного города не запрашиваются повторно.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .coords import parse_coords
+from .metrics import registry as metrics
+
+# Адрес Nominatim можно переопределить (например, на локальную заглушку)
+NOMINATIM_URL = os.environ.get(
+    'GOOTOYA_NOMINATIM_URL', 'https://nominatim.openstreetmap.org/reverse')
+NOMINATIM_DELAY = 1.2  # Rate limit для Nominatim (сек. между запросами)
+# Таймаут запроса к провайдеру (сек.)
+NOMINATIM_TIMEOUT = float(os.environ.get('GOOTOYA_NOMINATIM_TIMEOUT', 5))
+
+# Лимит запросов к провайдеру (в секунду) и число параллельных запросов.
+# Для Nominatim — не чаще раза в NOMINATIM_DELAY и по одному; локальные
+# или платные провайдеры позволяют больше.
+GEOCODE_RATE = float(os.environ.get('GOOTOYA_GEOCODE_RATE', 1 / NOMINATIM_DELAY))
+GEOCODE_BURST = int(os.environ.get('GOOTOYA_GEOCODE_BURST', 1))
+GEOCODE_WORKERS = int(os.environ.get('GOOTOYA_GEOCODE_WORKERS', 1))
+
+# Как часто сохранять конфиг, пока идёт геокодинг (сек.)
+GEOCODE_FLUSH_INTERVAL = 5.0
+
+LOADING = "Загрузка..."
+
+NOT_FOUND = "Город не найден"
+FETCH_FAILED = "Не удалось получить данные"
+
+# Кэш: размер ячейки (~1 км), время жизни ответов и максимальный размер
+GEOCODE_CELL_DEG = 0.01
+GEOCODE_TTL = 30 * 24 * 3600
+GEOCODE_NEGATIVE_TTL = 24 * 3600
+GEOCODE_CACHE_SIZE = 50000
+GEOCODE_CACHE_FILENAME = "geocode_cache.sqlite3"
+
+
+def reverse_geocode(lat, lon, url=None):
+    """
+    Получает название города по координатам через Nominatim API.
+    NOT_FOUND — только для успешного ответа без адреса; сетевые ошибки
+    (в том числе таймаут чтения и разрыв соединения) и битый ответ дают
+    FETCH_FAILED, который не кэшируется.
+    """
+    try:
+        query = urllib.parse.urlencode({
+            'lat': lat, 'lon': lon, 'format': 'json', 'accept-language': 'ru'})
+        req = urllib.request.Request(f"{url or NOMINATIM_URL}?{query}",
+                                     headers={'User-Agent': 'GooToYaConverter/1.0'})
+
+        with urllib.request.urlopen(req, timeout=NOMINATIM_TIMEOUT) as response:
+            data = json.loads(response.read().decode('utf-8'))
+            if not isinstance(data, dict):
+                raise ValueError(f"неожиданный ответ: {type(data).__name__}")
+            address = data.get('address') or {}
+
+            city = (address.get('city') or
+                   address.get('town') or
+                   address.get('village') or
+                   address.get('municipality') or
+                   address.get('county') or
+                   address.get('state'))
+
+            country = address.get('country', '')
+
+            if city and country:
+                return f"{city}, {country}"
+            elif city:
+                return city
+            elif country:
+                return country
+            else:
+                return NOT_FOUND
+
+    except urllib.error.URLError:
+        return FETCH_FAILED
+    except (OSError, ValueError) as e:
+        print(f"Ошибка геокодинга: {e}")
+        return FETCH_FAILED
+
+
+class GeocodeCache:
+    """
+    Кэш результатов геокодинга в SQLite.
+    Ключ — ячейка сетки GEOCODE_CELL_DEG; у записей есть срок жизни
+    (для «Город не найден» короче), при переполнении удаляются давно
+    не использованные записи (LRU).
+    """
+
+    def __init__(self, path, cell=GEOCODE_CELL_DEG, ttl=GEOCODE_TTL,
+                 negative_ttl=GEOCODE_NEGATIVE_TTL, max_size=GEOCODE_CACHE_SIZE):
+        self.path = str(path)
+        self.cell = cell
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode (
+                lat_cell INTEGER NOT NULL,
+                lon_cell INTEGER NOT NULL,
+                location TEXT NOT NULL,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (lat_cell, lon_cell)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS geocode_accessed ON geocode (accessed)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def _key(self, lat, lon):
+        return round(lat / self.cell), round(lon / self.cell)
+
+    def get(self, lat, lon):
+        """Возвращает закэшированное местоположение или None."""
+        key = self._key(lat, lon)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT location, expires FROM geocode WHERE lat_cell = ? AND lon_cell = ?",
+                key).fetchone()
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE geocode SET accessed = ? WHERE lat_cell = ? AND lon_cell = ?",
+                (now, *key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, lat, lon, location):
+        """Сохраняет результат; сетевые ошибки не кэшируются."""
+        if not location or location == FETCH_FAILED:
+            return
+        ttl = self.negative_ttl if location == NOT_FOUND else self.ttl
+        now = time.time()
+        key = self._key(lat, lon)
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM geocode WHERE lat_cell = ? AND lon_cell = ?", key).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?)",
+                (*key, location, now + ttl, now))
+            if not exists:
+                self._size += 1
+            if self._size > self.max_size:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Удаляет просроченные записи, затем самые давно использованные (с запасом 10%)."""
+        self._conn.execute("DELETE FROM geocode WHERE expires < ?", (now,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0] \
+            - int(self.max_size * 0.9)
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM geocode WHERE rowid IN "
+                "(SELECT rowid FROM geocode ORDER BY accessed LIMIT ?)", (excess,))
+        self._size = self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def stats(self):
+        return {"size": self._size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты «ведро токенов»: rate токенов в секунду,
+    не больше capacity подряд. rate <= 0 — без ограничений.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Блокирует поток, пока не появится свободный токен."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Geocoder:
+    """
+    Геокодер с кэшем: сначала проверяет GeocodeCache, к провайдеру обращается
+    только при промахе, с ограничением частоты через TokenBucket.
+    """
+
+    def __init__(self, cache=None, url=None, rate=GEOCODE_RATE, burst=GEOCODE_BURST):
+        self.cache = cache
+        self.url = url
+        self.bucket = TokenBucket(rate, burst)
+
+    def locate(self, lat, lon):
+        """Возвращает название города для точки."""
+        if self.cache is not None:
+            location = self.cache.get(lat, lon)
+            if location is not None:
+                return location
+
+        self.bucket.acquire()
+        location = reverse_geocode(lat, lon, self.url)
+
+        if self.cache is not None:
+            self.cache.put(lat, lon, location)
+        return location
+
+
+class GeocodingScheduler:
+    """
+    Фоновый геокодинг калибровочных точек пулом потоков.
+    Точки различаются по google-координатам: повторно поставленные в очередь
+    не запрашиваются второй раз. Сами точки планировщик не изменяет —
+    результаты передаются в on_result, а сохранение объединяется в
+    периодические сбросы.
+    """
+
+    def __init__(self, geocoder, save=None, workers=GEOCODE_WORKERS,
+                 flush_interval=GEOCODE_FLUSH_INTERVAL, on_result=None):
+        self.geocoder = geocoder
+        self.save = save  # вызывается как save({google: location}) с накопленными результатами
+        self.on_result = on_result  # вызывается как on_result(google, location) после геокодинга
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self._pending = set()  # ключи, ожидающие результата
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+
+        self.queued = 0
+        self.duplicates = 0
+        self.in_progress = 0
+        self.done = 0
+
+        self.threads = [threading.Thread(target=self._worker, daemon=True)
+                        for _ in range(max(1, workers))]
+        self.threads.append(threading.Thread(target=self._flusher, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def add_task(self, point):
+        """Добавляет точку в очередь на геокодинг. False — точка уже в очереди."""
+        key = point.get('google', '').strip()
+        with self._lock:
+            if key in self._pending:
+                self.duplicates += 1
+                return False
+            self._pending.add(key)
+            self.queued += 1
+        self.queue.put((key, time.monotonic()))
+        return True
+
+    def stats(self):
+        """Глубина очереди и прогресс для /api/status."""
+        with self._lock:
+            return {
+                "pending": len(self._pending) - self.in_progress,
+                "in_progress": self.in_progress,
+                "done": self.done,
+                "queued": self.queued,
+                "duplicates": self.duplicates,
+            }
+
+    def _locate(self, key):
+        coords = parse_coords(key)
+        if coords is None:
+            return NOT_FOUND
+        return self.geocoder.locate(coords.lat, coords.lon)
+
+    def _worker(self):
+        """Обрабатывает очередь геокодинга."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            key, queued_at = item
+            metrics.observe('geocode_queue_wait_seconds', time.monotonic() - queued_at)
+            with self._lock:
+                self.in_progress += 1
+            try:
+                with metrics.timer('geocode_seconds'):
+                    location = self._locate(key)
+            except Exception as e:
+                print(f"Ошибка воркера: {e}")
+                location = FETCH_FAILED
+
+            if self.on_result is not None:
+                try:
+                    self.on_result(key, location)
+                except Exception as e:
+                    print(f"Ошибка обработки результата геокодинга: {e}")
+            with self._lock:
+                self._pending.discard(key)
+                self.in_progress -= 1
+                self.done += 1
+                self._dirty[key] = location
+                drained = not self._pending
+            if drained:
+                self._wake.set()
+            self.queue.task_done()
+
+    def _flusher(self):
+        """Сохраняет конфиг раз в flush_interval и сразу после опустошения очереди."""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Сохраняет изменения, если они были. Возвращается после того, как
+        сохранены и результаты, уже забранные параллельным сбросом.
+        """
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if dirty and self.save is not None:
+                try:
+                    self.save(dirty)
+                except Exception as e:
+                    print(f"Ошибка сохранения после геокодинга: {e}")
@@ -0,0 +1,339 @@
+"""
+Предрассчитанная сетка поправок Google → Yandex.
+
+Поле смещений (dlat, dlon) меняется только вместе с калибровкой, поэтому его
+можно один раз посчитать точным IDW в узлах сетки, а запросы отвечать
+билинейной интерполяцией по четырём соседним узлам — O(1) на точку.
+
+Сетка покрывает только калиброванные районы: плитки TILE_DEG×TILE_DEG, в
+которых есть калибровочные точки, и соседние с ними. Шаг узлов в плитке
+адаптивный: чем больше точек, тем мельче (base_step / 2**level).
+Точки вне сетки считаются точным IDW по модели.
+
+Узлы хранятся одним массивом float32 (пары dlat, dlon); сетку можно
+сохранить в файл и открыть через memory map (с NumPy). В заголовке файла
+записан отпечаток калибровки (CalibrationModel.fingerprint): сетку другой
+калибровки load не открывает.
+"""
+import json
+import math
+import struct
+import sys
+from array import array
+
+from .core import (
+    HAS_NUMPY, IDW_NEIGHBORS, IDW_MAX_RADIUS_KM,
+    CalibrationModel, _idw_block, check_idw_options, convert_coords_pairs,
+)
+
+# Размер плитки (градусы), начальный шаг узлов и число уровней измельчения
+GRID_TILE_DEG = 0.25
+GRID_BASE_STEP = 0.02
+GRID_MAX_LEVEL = 3
+
+# Сколько соседних плиток вокруг калиброванных включать в сетку
+GRID_TILE_MARGIN = 1
+
+# Уровень измельчения растёт на 1 при каждом ×GRID_LEVEL_DENSITY точек в плитке
+GRID_LEVEL_DENSITY = 4
+
+# Узлов, считаемых точным IDW за один вызов при построении, и сторона блока
+# узлов с общим набором кандидатов (локальная IDW)
+GRID_BUILD_CHUNK = 50000
+GRID_BUILD_BLOCK = 16
+
+GRID_FILE_MAGIC = b'GTYGRID1'
+
+# Ключ плитки — одно целое: (ti + _KEY_BIAS) * _KEY_STRIDE + (tj + _KEY_BIAS)
+_KEY_BIAS = 1 << 20
+_KEY_STRIDE = 1 << 21
+
+
+def _tile_key(ti, tj):
+    return (ti + _KEY_BIAS) * _KEY_STRIDE + (tj + _KEY_BIAS)
+
+
+class CorrectionGrid:
+    """
+    Сетка поправок. tiles — ключ плитки -> (номер первого узла, число шагов n);
+    у плитки (n + 1)² узлов, в data — по два float32 (dlat, dlon) на узел.
+    """
+
+    def __init__(self, tiles, data, tile_deg=GRID_TILE_DEG, base_step=GRID_BASE_STEP,
+                 k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM, version=0, model=None,
+                 calibration=None):
+        self.tiles = tiles
+        self.data = data
+        self.tile_deg = tile_deg
+        self.base_step = base_step
+        self.k = k
+        self.max_radius_km = max_radius_km
+        self.version = version
+        self.model = model  # для точек вне сетки (может быть None — тогда без поправки IDW)
+        self.calibration = calibration  # отпечаток модели, по которой построена сетка
+        self._np_tables = None
+
+    # === ПОСТРОЕНИЕ ===
+
+    @classmethod
+    def build(cls, calibration_data, base_step=GRID_BASE_STEP, max_level=GRID_MAX_LEVEL,
+              tile_deg=GRID_TILE_DEG, margin=GRID_TILE_MARGIN,
+              k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM):
+        """Считает поправки в узлах точным IDW по модели калибровки."""
+        check_idw_options(k, max_radius_km)
+        model = calibration_data if isinstance(calibration_data, CalibrationModel) \
+            else CalibrationModel(calibration_data)
+
+        counts = {}
+        for lat, lon in zip(model.glat, model.glon):
+            key = (math.floor(lat / tile_deg), math.floor(lon / tile_deg))
+            counts[key] = counts.get(key, 0) + 1
+
+        covered = set()
+        for ti, tj in counts:
+            for di in range(-margin, margin + 1):
+                for dj in range(-margin, margin + 1):
+                    covered.add((ti + di, tj + dj))
+
+        tiles = {}
+        nodes = []
+        for ti, tj in sorted(covered):
+            count = counts.get((ti, tj), 0)
+            level = 0
+            while level < max_level and count >= GRID_LEVEL_DENSITY ** (level + 1):
+                level += 1
+            n = max(1, round(tile_deg / (base_step / 2 ** level)))
+            step = tile_deg / n
+            tiles[_tile_key(ti, tj)] = (len(nodes), n)
+            lat0, lon0 = ti * tile_deg, tj * tile_deg
+            for r in range(n + 1):
+                for c in range(n + 1):
+                    nodes.append((lat0 + r * step, lon0 + c * step))
+
+        data = array('f', bytes(8 * len(nodes)))
+        local = len(model) and (max_radius_km is not None or (k is not None and k < len(model)))
+        if HAS_NUMPY and local:
+            # Локальная IDW: блоками узлов, вместо поиска соседей для каждого узла
+            import numpy as np
+            out = np.frombuffer(data, dtype=np.float32).reshape(-1, 2)
+            nodes = np.array(nodes, dtype=np.float64).reshape(-1, 2)
+            for first, n in tiles.values():
+                tile = np.arange(first, first + (n + 1) ** 2).reshape(n + 1, n + 1)
+                for r in range(0, n + 1, GRID_BUILD_BLOCK):
+                    for c in range(0, n + 1, GRID_BUILD_BLOCK):
+                        block = tile[r:r + GRID_BUILD_BLOCK, c:c + GRID_BUILD_BLOCK].ravel()
+                        out[block] = _idw_block(model, nodes[block, 0], nodes[block, 1],
+                                                k, max_radius_km)
+            nodes = []
+        for start in range(0, len(nodes), GRID_BUILD_CHUNK):
+            chunk = nodes[start:start + GRID_BUILD_CHUNK]
+            results = convert_coords_pairs(chunk, model, k, max_radius_km)
+            for i, ((glat, glon), (ylat, ylon)) in enumerate(zip(chunk, results), start):
+                data[2 * i] = ylat - glat
+                data[2 * i + 1] = ylon - glon
+
+        return cls(tiles, data, tile_deg, base_step, k, max_radius_km, model.version, model,
+                   model.fingerprint())
+
+    def __len__(self):
+        """Число узлов."""
+        return len(self.data) // 2
+
+    def nbytes(self):
+        return len(self.data) * 4
+
+    # === ЗАПРОСЫ ===
+
+    def _fallback(self, points):
+        return convert_coords_pairs(points, self.model, self.k, self.max_radius_km)
+
+    def lookup(self, glat, glon):
+        """Поправка (dlat, dlon) билинейной интерполяцией или None вне сетки."""
+        ti = math.floor(glat / self.tile_deg)
+        tj = math.floor(glon / self.tile_deg)
+        tile = self.tiles.get(_tile_key(ti, tj))
+        if tile is None:
+            return None
+        first, n = tile
+        step = self.tile_deg / n
+        y = (glat - ti * self.tile_deg) / step
+        x = (glon - tj * self.tile_deg) / step
+        r = min(int(y), n - 1)
+        c = min(int(x), n - 1)
+        fy, fx = y - r, x - c
+
+        d = self.data
+        i00 = 2 * (first + r * (n + 1) + c)
+        i10 = i00 + 2 * (n + 1)
+        w00 = (1 - fy) * (1 - fx)
+        w01 = (1 - fy) * fx
+        w10 = fy * (1 - fx)
+        w11 = fy * fx
+        dlat = d[i00] * w00 + d[i00 + 2] * w01 + d[i10] * w10 + d[i10 + 2] * w11
+        dlon = d[i00 + 1] * w00 + d[i00 + 3] * w01 + d[i10 + 1] * w10 + d[i10 + 3] * w11
+        return dlat, dlon
+
+    def convert_pair(self, glat, glon):
+        """Координаты Yandex для точки (lat, lon)."""
+        offset = self.lookup(glat, glon)
+        if offset is None:
+            return self._fallback([(glat, glon)])[0]
+        return glat + offset[0], glon + offset[1]
+
+    def convert_pairs(self, points):
+        """Список точек [(lat, lon), ...] -> список (lat, lon); с NumPy — векторно."""
+        points = list(points)
+        if not points:
+            return []
+        if HAS_NUMPY:
+            lats, lons = self.convert_arrays([p[0] for p in points], [p[1] for p in points])
+            return list(zip(lats.tolist(), lons.tolist()))
+
+        out = []
+        missing = []
+        for i, (glat, glon) in enumerate(points):
+            offset = self.lookup(glat, glon)
+            if offset is None:
+                missing.append(i)
+                out.append(None)
+            else:
+                out.append((glat + offset[0], glon + offset[1]))
+        if missing:
+            for i, result in zip(missing, self._fallback([points[i] for i in missing])):
+                out[i] = result
+        return out
+
+    def convert_batch(self, points):
+        """То же, что convert_pairs, но возвращает строки формата convert_coords_advanced."""
+        return [f"{ylat:.6f}, {ylon:.6f}" for ylat, ylon in self.convert_pairs(points)]
+
+    def _tables(self):
+        """Таблицы плиток для NumPy: отсортированные ключи, первый узел и n."""
+        if self._np_tables is None:
+            import numpy as np
+            keys = np.array(sorted(self.tiles), dtype=np.int64)
+            first = np.array([self.tiles[k][0] for k in keys.tolist()], dtype=np.int64)
+            steps = np.array([self.tiles[k][1] for k in keys.tolist()], dtype=np.int64)
+            data = np.frombuffer(self.data, dtype=np.float32) if isinstance(self.data, array) \
+                else np.asarray(self.data, dtype=np.float32)
+            self._np_tables = keys, first, steps, data.reshape(-1, 2)
+        return self._np_tables
+
+    def convert_arrays(self, lats, lons):
+        """Векторная конвертация массивов широт и долгот (нужен NumPy)."""
+        import numpy as np
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        keys, first, steps, data = self._tables()
+
+        ti = np.floor(lats / self.tile_deg).astype(np.int64)
+        tj = np.floor(lons / self.tile_deg).astype(np.int64)
+        key = (ti + _KEY_BIAS) * _KEY_STRIDE + (tj + _KEY_BIAS)
+        pos = np.searchsorted(keys, key)
+        pos = np.minimum(pos, len(keys) - 1) if len(keys) else pos
+        covered = keys[pos] == key if len(keys) else np.zeros(len(lats), dtype=bool)
+
+        out_lat = lats.copy()
+        out_lon = lons.copy()
+        if covered.any():
+            sel = np.nonzero(covered)[0]
+            p = pos[sel]
+            n = steps[p]
+            step = self.tile_deg / n
+            y = (lats[sel] - ti[sel] * self.tile_deg) / step
+            x = (lons[sel] - tj[sel] * self.tile_deg) / step
+            r = np.minimum(y.astype(np.int64), n - 1)
+            c = np.minimum(x.astype(np.int64), n - 1)
+            fy = (y - r)[:, None]
+            fx = (x - c)[:, None]
+            i00 = first[p] + r * (n + 1) + c
+            i10 = i00 + n + 1
+            offset = (data[i00] * ((1 - fy) * (1 - fx)) + data[i00 + 1] * ((1 - fy) * fx)
+                      + data[i10] * (fy * (1 - fx)) + data[i10 + 1] * (fy * fx))
+            out_lat[sel] += offset[:, 0]
+            out_lon[sel] += offset[:, 1]
+
+        if not covered.all():
+            rest = np.nonzero(~covered)[0]
+            results = self._fallback(list(zip(lats[rest].tolist(), lons[rest].tolist())))
+            out_lat[rest] = [r[0] for r in results]
+            out_lon[rest] = [r[1] for r in results]
+        return out_lat, out_lon
+
+    # === ФАЙЛ ===
+
+    def save(self, path):
+        """
+        Записывает сетку в файл: сигнатура, длина и JSON-заголовок,
+        выравнивание до 8 байт, затем узлы (float32, little-endian).
+        """
+        header = json.dumps({
+            "tile_deg": self.tile_deg,
+            "base_step": self.base_step,
+            "k": self.k,
+            "max_radius_km": self.max_radius_km,
+            "version": self.version,
+            "calibration": self.calibration,
+            "tiles": [[key, first, n] for key, (first, n) in sorted(self.tiles.items())],
+        }).encode('utf-8')
+        prefix = len(GRID_FILE_MAGIC) + 4 + len(header)
+        padding = b' ' * (-prefix % 8)
+        data = self.data if isinstance(self.data, array) else array('f', self.data)
+        if sys.byteorder == 'big':
+            data = array('f', data)
+            data.byteswap()
+        with open(path, 'wb') as f:
+            f.write(GRID_FILE_MAGIC)
+            f.write(struct.pack('<I', len(header) + len(padding)))
+            f.write(header + padding)
+            f.write(data.tobytes())
+
+    @staticmethod
+    def _read_header(f, path):
+        if f.read(len(GRID_FILE_MAGIC)) != GRID_FILE_MAGIC:
+            raise ValueError(f"{path}: не файл сетки поправок")
+        (size,) = struct.unpack('<I', f.read(4))
+        return json.loads(f.read(size).decode('utf-8'))
+
+    @classmethod
+    def is_current(cls, path, model, k=IDW_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM):
+        """
+        True — файл сетки есть и построен по этой модели с теми же k и
+        радиусом; иначе сетку нужно перестроить.
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = cls._read_header(f, path)
+        except (OSError, ValueError):
+            return False
+        return (header.get('calibration') == model.fingerprint()
+                and header['k'] == k and header['max_radius_km'] == max_radius_km)
+
+    @classmethod
+    def load(cls, path, model=None, mmap=True):
+        """
+        Открывает сетку из файла. С NumPy и mmap=True узлы не читаются
+        в память целиком, а отображаются (numpy.memmap).
+        model — модель для точек вне сетки; сетку, построенную по другой
+        калибровке, load не открывает (ValueError).
+        """
+        with open(path, 'rb') as f:
+            header = cls._read_header(f, path)
+            calibration = header.get('calibration')
+            if model is not None and calibration != model.fingerprint():
+                raise ValueError(f"{path}: сетка построена по другой калибровке")
+            offset = f.tell()
+            if not (HAS_NUMPY and mmap):
+                data = array('f')
+                data.frombytes(f.read())
+                if sys.byteorder == 'big':
+                    data.byteswap()
+
+        if HAS_NUMPY and mmap:
+            import numpy as np
+            data = np.memmap(path, dtype='<f4', mode='r', offset=offset)
+
+        tiles = {key: (first, n) for key, first, n in header['tiles']}
+        return cls(tiles, data, header['tile_deg'], header['base_step'],
+                   header['k'], header['max_radius_km'], header['version'], model,
+                   calibration)
@@ -0,0 +1,221 @@
+"""
+Метрики горячих путей: гистограммы времени выполнения и выборочное
+профилирование cProfile, включаемое во время работы.
+
+    from gootoya.metrics import registry
+    with registry.timer('convert_seconds'):
+        ...
+    registry.observe('clipboard_detect_seconds', latency)
+
+Гистограммы отдаются в JSON (to_json) и в текстовом формате Prometheus
+(to_prometheus).
+"""
+import bisect
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Границы корзин гистограмм (сек.)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Префикс имён метрик в формате Prometheus
+METRICS_PREFIX = "gootoya_"
+
+# Доля профилируемых участков по умолчанию и размер отчёта профилировщика
+PROFILE_SAMPLE_RATE = 0.1
+PROFILE_REPORT_LIMIT = 30
+
+# Описания известных метрик (для # HELP)
+DESCRIPTIONS = {
+    "clipboard_detect_seconds": "Задержка обнаружения изменения буфера обмена",
+    "parse_seconds": "Разбор координат из текста",
+    "convert_seconds": "Конвертация одной точки",
+    "clipboard_write_seconds": "Запись результата в буфер обмена",
+    "geocode_seconds": "Геокодинг точки (кэш или провайдер)",
+    "geocode_queue_wait_seconds": "Ожидание точки в очереди геокодинга",
+    "config_save_seconds": "Сохранение снимка calibration.json",
+    "journal_append_seconds": "Запись в журнал калибровки",
+    "grid_build_seconds": "Построение сетки поправок",
+    "fit_build_seconds": "Построение районных аппроксимаций",
+    "quality_seconds": "Анализ качества калибровки",
+}
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, суммой и максимумом."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя — выше всех границ
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (линейно внутри корзины)."""
+        with self._lock:
+            counts, total, maximum = list(self.counts), self.count, self.max
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(counts):
+            upper = self.buckets[i] if i < len(self.buckets) else maximum
+            if count and seen + count >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / count, maximum)
+            seen += count
+            lower = upper
+        return maximum
+
+    def snapshot(self):
+        with self._lock:
+            count, total, maximum = self.count, self.sum, self.max
+            counts = list(self.counts)
+        cumulative = []
+        running = 0
+        for bound, c in zip(self.buckets, counts):
+            running += c
+            cumulative.append((bound, running))
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "avg_ms": round(total / count * 1000, 3) if count else 0.0,
+            "max_ms": round(maximum * 1000, 3),
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p90_ms": round(self.quantile(0.9) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "buckets": cumulative,
+        }
+
+
+class SamplingProfiler:
+    """
+    Выборочное профилирование: когда включено, доля rate замеряемых участков
+    выполняется под cProfile. Одновременно профилируется один участок —
+    остальные в это время пропускаются, а не ждут.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.rate = PROFILE_SAMPLE_RATE
+        self.samples = 0
+        self.started = None
+        self._profile = None
+        self._busy = threading.Lock()
+
+    def start(self, rate=PROFILE_SAMPLE_RATE):
+        """Включает профилирование с чистой статистикой."""
+        self.rate = max(0.0, min(1.0, rate))
+        self.samples = 0
+        self.started = time.time()
+        self._profile = cProfile.Profile()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    @contextmanager
+    def sample(self):
+        profile = self._profile
+        if (not self.enabled or profile is None or random.random() >= self.rate
+                or not self._busy.acquire(blocking=False)):
+            yield
+            return
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                self.samples += 1
+        finally:
+            self._busy.release()
+
+    def report(self, sort='cumulative', limit=PROFILE_REPORT_LIMIT):
+        """Текстовый отчёт pstats по накопленным выборкам."""
+        if self._profile is None or not self.samples:
+            return "Нет данных профилирования"
+        out = io.StringIO()
+        with self._busy:
+            pstats.Stats(self._profile, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def stats(self):
+        return {"enabled": self.enabled, "rate": self.rate, "samples": self.samples,
+                "started": self.started}
+
+
+class Metrics:
+    """Набор именованных гистограмм и профилировщик."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.profiler = SamplingProfiler()
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        hist = self.histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(name, Histogram())
+        return hist
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def _items(self):
+        with self._lock:
+            return sorted(self.histograms.items())
+
+    @contextmanager
+    def timer(self, name):
+        """Замеряет время блока в гистограмму name (и профилирует его выборочно)."""
+        start = time.perf_counter()
+        try:
+            with self.profiler.sample():
+                yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def to_json(self):
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "histograms": {name: hist.snapshot() for name, hist in self._items()},
+            "profiler": self.profiler.stats(),
+        }
+
+    def to_prometheus(self):
+        """Текст в формате Prometheus exposition (histogram)."""
+        lines = []
+        for name, hist in self._items():
+            full = METRICS_PREFIX + name
+            data = hist.snapshot()
+            lines.append(f"# HELP {full} {DESCRIPTIONS.get(name, name)}")
+            lines.append(f"# TYPE {full} histogram")
+            for bound, count in data["buckets"]:
+                lines.append(f'{full}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{full}_bucket{{le="+Inf"}} {data["count"]}')
+            lines.append(f"{full}_sum {data['sum']}")
+            lines.append(f"{full}_count {data['count']}")
+        return "\n".join(lines) + "\n"
+
+
+# Общий набор метрик процесса
+registry = Metrics()
@@ -0,0 +1,196 @@
+"""
+Анализ качества калибровки.
+
+Для каждой точки считается ошибка скользящего контроля (leave-one-out):
+насколько IDW по остальным точкам промахивается мимо её координат Yandex.
+Точки с ошибкой сильно выше типичной помечаются как выбросы; если пара
+после перестановки google/yandex согласуется с соседями гораздо лучше,
+причина — «перепутаны местами». Отдельно ищутся дубликаты (точки Google
+ближе QUALITY_DUPLICATE_M) и строится сводка по районам (см. fit.find_clusters).
+
+    from gootoya.quality import analyze
+    report = analyze(training_data)
+"""
+import math
+import time
+
+from .core import (
+    IDW_MAX_RADIUS_KM, KM_PER_DEGREE, CalibrationModel, convert_coords_pairs, get_distance,
+    leave_one_out,
+)
+from .fit import find_clusters
+from .storage import point_id
+
+# Скользящий контроль по k ближайшим точкам (локальная IDW — почти O(N log N))
+QUALITY_NEIGHBORS = 16
+
+# Выброс: ошибка больше медианы + QUALITY_OUTLIER_MADS робастных σ (1.4826·MAD)
+# и не меньше QUALITY_OUTLIER_MIN_M метров
+QUALITY_OUTLIER_MADS = 5.0
+QUALITY_OUTLIER_MIN_M = 3.0
+
+# «Перепутаны местами»: после перестановки ошибка меньше хотя бы во столько раз
+QUALITY_SWAP_RATIO = 3.0
+
+# Точки Google ближе этого расстояния (м) считаются дубликатами
+QUALITY_DUPLICATE_M = 1.0
+
+M_PER_DEGREE = KM_PER_DEGREE * 1000
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _rms(values):
+    return math.sqrt(sum(v * v for v in values) / len(values)) if values else 0.0
+
+
+def _stats(errors):
+    return {
+        "rms_m": round(_rms(errors), 4),
+        "median_m": round(_percentile(errors, 0.5), 4),
+        "p90_m": round(_percentile(errors, 0.9), 4),
+        "max_m": round(max(errors), 4) if errors else 0.0,
+    }
+
+
+def find_duplicates(model, max_m=QUALITY_DUPLICATE_M):
+    """
+    Пары точек, чьи координаты Google ближе max_m метров: (i, j, расстояние, м).
+    Точки раскладываются по ячейкам размером max_m, сравниваются соседние ячейки.
+    """
+    cell = max(max_m, 1e-3) / M_PER_DEGREE
+    cells = {}
+    for i, (lat, lon) in enumerate(zip(model.glat, model.glon)):
+        cells.setdefault((math.floor(lat / cell), math.floor(lon / cell)), []).append(i)
+
+    pairs = []
+    for (ci, cj), members in cells.items():
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                others = cells.get((ci + di, cj + dj))
+                if not others:
+                    continue
+                for i in members:
+                    for j in others:
+                        if j <= i:
+                            continue
+                        dist = get_distance(model.glat[i], model.glon[i],
+                                            model.glat[j], model.glon[j]) * M_PER_DEGREE
+                        if dist <= max_m:
+                            pairs.append((i, j, dist))
+    return sorted(pairs)
+
+
+def analyze(points, k=QUALITY_NEIGHBORS, max_radius_km=IDW_MAX_RADIUS_KM):
+    """
+    Анализ калибровочного набора (точки {"google", "yandex", ...}).
+    Возвращает словарь: summary — общая сводка, points — ошибка и пометки
+    каждой точки (в исходном порядке), regions — сводка по районам,
+    duplicates — пары близких точек. Повторы одной пары (тот же id)
+    анализируются один раз и считаются в summary["repeated"].
+    """
+    start = time.perf_counter()
+    points = list(points)
+    parsed = []
+    ids = []
+    ids_seen = set()
+    pairs = []
+    repeated = 0
+    for point in points:
+        try:
+            g = tuple(map(float, point["google"].split(", ")))
+            y = tuple(map(float, point["yandex"].split(", ")))
+        except Exception:
+            continue
+        pid = point.get("id") or point_id(point)
+        if pid in ids_seen:
+            repeated += 1
+            continue
+        ids_seen.add(pid)
+        parsed.append(point)
+        ids.append(pid)
+        pairs.append((g, y))
+    model = CalibrationModel(pairs)
+
+    def measure(indices, predictions):
+        for i, (plat, plon) in zip(indices, predictions):
+            glat, glon, ylat, ylon = model.glat[i], model.glon[i], model.ylat[i], model.ylon[i]
+            errors[i] = get_distance(plat, plon, ylat, ylon) * M_PER_DEGREE
+            # Если пара перепутана, настоящая Google — это ylat/ylon, и смещение
+            # соседей, приложенное к ней, должно дать записанную «google»
+            swap_errors[i] = get_distance(ylat + plat - glat, ylon + plon - glon,
+                                          glat, glon) * M_PER_DEGREE
+
+    errors = [0.0] * len(model)
+    swap_errors = [0.0] * len(model)
+    measure(range(len(model)), leave_one_out(model, None, k, max_radius_km))
+
+    median = _percentile(errors, 0.5)
+    mad = _percentile([abs(e - median) for e in errors], 0.5)
+    threshold = max(median + QUALITY_OUTLIER_MADS * 1.4826 * mad, QUALITY_OUTLIER_MIN_M)
+
+    # Второй проход: подозрительные точки проверяются по набору без них всех,
+    # чтобы один плохой сосед не делал выбросами окружающие точки
+    flagged = [i for i, error in enumerate(errors) if error > threshold]
+    if flagged and len(flagged) < len(model) / 2:
+        skip = set(flagged)
+        clean = CalibrationModel([pair for i, pair in enumerate(pairs) if i not in skip])
+        measure(flagged, convert_coords_pairs([pairs[i][0] for i in flagged], clean,
+                                              k, max_radius_km))
+
+    result_points = []
+    for point, pid, error, swap_error in zip(parsed, ids, errors, swap_errors):
+        reason = None
+        if len(parsed) > 1 and error > threshold:
+            reason = "swapped" if swap_error * QUALITY_SWAP_RATIO < error else "error"
+        result_points.append({
+            "id": pid,
+            "google": point["google"],
+            "yandex": point["yandex"],
+            "location": point.get("location", ""),
+            "error_m": round(error, 4),
+            "swap_error_m": round(swap_error, 4),
+            "outlier": reason is not None,
+            "reason": reason,
+        })
+
+    regions = []
+    for members in find_clusters(model):
+        lats = [model.glat[i] for i in members]
+        lons = [model.glon[i] for i in members]
+        region = {
+            "center": [round(sum(lats) / len(lats), 6), round(sum(lons) / len(lons), 6)],
+            "bbox": [round(min(lats), 6), round(max(lats), 6), round(min(lons), 6), round(max(lons), 6)],
+            "points": len(members),
+            "outliers": sum(result_points[i]["outlier"] for i in members),
+        }
+        region.update(_stats([errors[i] for i in members]))
+        regions.append(region)
+    regions.sort(key=lambda r: -r["points"])
+
+    duplicates = [{
+        "ids": [result_points[i]["id"], result_points[j]["id"]],
+        "distance_m": round(dist, 4),
+        "yandex_diff_m": round(get_distance(model.ylat[i], model.ylon[i],
+                                            model.ylat[j], model.ylon[j]) * M_PER_DEGREE, 4),
+    } for i, j, dist in find_duplicates(model)]
+
+    summary = {
+        "points": len(parsed),
+        "skipped": len(points) - len(parsed) - repeated,
+        "repeated": repeated,
+        "neighbors": k,
+        "max_radius_km": max_radius_km,
+        "outlier_threshold_m": round(threshold, 4),
+        "outliers": sum(p["outlier"] for p in result_points),
+        "swapped": sum(p["reason"] == "swapped" for p in result_points),
+        "duplicates": len(duplicates),
+        "regions": len(regions),
+    }
+    summary.update(_stats(errors))
+    summary["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return {"summary": summary, "points": result_points, "regions": regions,
+            "duplicates": duplicates}
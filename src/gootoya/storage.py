@@ -0,0 +1,223 @@
+"""
+Хранилище калибровочных точек: снимок calibration.json + журнал изменений.
+
+Каждое изменение (добавление, удаление, местоположение) дописывается одной
+строкой JSON в журнал <calibration.json>.journal — стоимость не зависит от
+размера набора. Периодически журнал сворачивается в новый снимок; снимок
+и журнал записываются атомарно (временный файл + os.replace).
+
+Первая строка журнала хранит хэш снимка, к которому он относится: если
+снимок уже перезаписан (сбой между записью снимка и журнала или ручная
+правка файла), устаревший журнал не применяется.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from .core import coord_re
+from .metrics import registry as metrics
+
+# Свернуть журнал в снимок после стольких записей
+JOURNAL_COMPACT_OPS = 1000
+
+
+def atomic_write(path, data):
+    """Атомарно записывает bytes в файл: временный файл, fsync, os.replace."""
+    path = str(path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def normalize_coords(text):
+    """Каноническая запись 'lat, lon' (без лишних нулей и пробелов)."""
+    m = coord_re.search(text or '')
+    if not m:
+        return (text or '').strip()
+    return f"{float(m.group(1))!r}, {float(m.group(2))!r}"
+
+
+def point_id(point):
+    """
+    Стабильный идентификатор точки — хэш нормализованной пары (google, yandex).
+    Одинаковые пары в разной записи получают один id.
+    """
+    key = f"{normalize_coords(point.get('google'))}|{normalize_coords(point.get('yandex'))}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def public_point(point):
+    """Точка в формате calibration.json (без служебного id)."""
+    return {k: v for k, v in point.items() if k != 'id'}
+
+
+class PointIndex:
+    """Хэш-индекс точек по id: поиск, проверка дубликата и удаление за O(1)."""
+
+    def __init__(self, points=()):
+        self._by_id = {}
+        for point in points:
+            self.add(point)
+
+    @classmethod
+    def unique(cls, points):
+        """
+        Индекс по точкам без повторов пары: из одинаковых остаётся первая.
+        Возвращает (индекс, оставшиеся точки).
+        """
+        index = cls()
+        return index, [point for point in points if index.add(point)]
+
+    def add(self, point):
+        """
+        Назначает точке id и индексирует её. False — такая пара уже есть
+        (точка при этом не изменяется).
+        """
+        pid = point.get('id') or point_id(point)
+        if pid in self._by_id:
+            return False
+        point['id'] = pid
+        self._by_id[pid] = point
+        return True
+
+    def replace(self, point):
+        """Заменяет проиндексированную точку её новой версией (тот же id)."""
+        self._by_id[point['id']] = point
+
+    def copy(self):
+        """Копия индекса (для следующего снимка калибровки)."""
+        index = PointIndex()
+        index._by_id = dict(self._by_id)
+        return index
+
+    def remove(self, pid):
+        """Удаляет точку из индекса, возвращает её или None."""
+        return self._by_id.pop(pid, None)
+
+    def get(self, pid):
+        return self._by_id.get(pid)
+
+    def __contains__(self, pid):
+        return pid in self._by_id
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+class CalibrationStore:
+    """Снимок в формате calibration.json и журнал изменений к нему."""
+
+    def __init__(self, path, compact_ops=JOURNAL_COMPACT_OPS):
+        self.path = str(path)
+        self.journal_path = f"{self.path}.journal"
+        self.compact_ops = compact_ops
+        self.journal_ops = 0
+        self._digest = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @staticmethod
+    def _dump(points):
+        return json.dumps([public_point(p) for p in points],
+                          indent=4, ensure_ascii=False).encode('utf-8')
+
+    def load(self):
+        """Читает снимок и применяет к нему журнал. Возвращает список точек."""
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            self._digest = hashlib.sha1(raw).hexdigest()
+            points = json.loads(raw.decode('utf-8'))
+            self.journal_ops = self._replay(points)
+            return points
+
+    def _replay(self, points):
+        if not os.path.exists(self.journal_path):
+            return 0
+
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        if not lines:
+            return 0
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            header = {}
+        if header.get('base') != self._digest:
+            print("Журнал калибровки относится к другому снимку и не применяется")
+            return 0
+
+        index = {}
+        for i, point in enumerate(points):
+            index.setdefault(point_id(point), []).append(i)
+        removed = set()
+
+        applied = 0
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Недописанная при сбое строка — последняя, дальше ничего нет
+                print("Пропущена повреждённая запись журнала калибровки")
+                continue
+
+            op = entry.get('op')
+            if op == 'add':
+                for point in entry['points']:
+                    index.setdefault(point_id(point), []).append(len(points))
+                    points.append(point)
+            elif op == 'remove':
+                for pid in entry['ids']:
+                    removed.update(index.pop(pid, []))
+            elif op == 'update':
+                for item in entry['points']:
+                    for i in index.get(point_id(item), []):
+                        points[i]['location'] = item.get('location', '')
+            applied += 1
+
+        if removed:
+            points[:] = [p for i, p in enumerate(points) if i not in removed]
+        return applied
+
+    def _append(self, entry):
+        with self._lock, metrics.timer('journal_append_seconds'):
+            new_journal = not os.path.exists(self.journal_path)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                if new_journal:
+                    f.write(json.dumps({"base": self._digest}) + "\n")
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.journal_ops += 1
+            return self.journal_ops >= self.compact_ops
+
+    def append_added(self, points):
+        """Журналирует добавленные точки. True — пора сворачивать журнал."""
+        return self._append({"op": "add", "points": [public_point(p) for p in points]})
+
+    def append_removed(self, points):
+        """Журналирует удаление точек (по id)."""
+        return self._append({"op": "remove", "ids": [p.get('id') or point_id(p) for p in points]})
+
+    def append_updated(self, points):
+        """Журналирует изменение местоположения точек."""
+        return self._append({"op": "update", "points": [
+            {"google": p.get('google', ''), "yandex": p.get('yandex', ''),
+             "location": p.get('location', '')} for p in points]})
+
+    def compact(self, points):
+        """Записывает полный снимок и начинает пустой журнал."""
+        with self._lock, metrics.timer('config_save_seconds'):
+            raw = self._dump(points)
+            atomic_write(self.path, raw)
+            self._digest = hashlib.sha1(raw).hexdigest()
+            atomic_write(self.journal_path,
+                         (json.dumps({"base": self._digest}) + "\n").encode('utf-8'))
+            self.journal_ops = 0
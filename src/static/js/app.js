@@ -7,8 +7,10 @@ document.addEventListener('DOMContentLoaded', function () {
 
         startBtn: document.getElementById('startBtn'),
         stopBtn: document.getElementById('stopBtn'),
+        convertAllToggle: document.getElementById('convertAllToggle'),
         foundCoords: document.getElementById('foundCoords'),
         resultCoords: document.getElementById('resultCoords'),
+        conversionStats: document.getElementById('conversionStats'),
 
         calibrationToggle: document.getElementById('calibrationToggle'),
         calibrationContent: document.getElementById('calibrationContent'),
@@ -36,9 +38,45 @@ document.addEventListener('DOMContentLoaded', function () {
     let isMonitoring = false;
     let isCalibrating = false;
 
+    // Серверный режим (src/wsgi.py): буфера обмена и изменения калибровки нет
+    const serverMode = document.body.dataset.serverMode === '1';
+
+    // Таблица калибровки (см. раздел ТАБЛИЦА КАЛИБРОВКИ)
+    // Точек на странице при полной загрузке набора
+    const CALIB_PAGE_SIZE = 2000;
+    // Запас строк сверху и снизу видимой области
+    const CALIB_OVERSCAN = 20;
+    // Задержка перегруппировки после событий 'location' (мс)
+    const CALIB_REBUILD_DELAY = 300;
+
+    const calibContainer = elements.calibTableBody.closest('.table-container');
+    const calib = {
+        points: new Map(),      // id → точка
+        version: null,          // версия снимка, с которой совпадает points
+        groups: [],             // группы по местоположению (см. groupPoints)
+        rows: [],               // плоский список видимых строк: заголовки групп и точки
+        offsets: [0],           // offsets[i] — верх строки i, последний — высота всех строк
+        collapsed: new Set(),   // ключи свёрнутых групп
+        selected: new Set(),    // id выделенных точек
+        rendered: new Map(),    // ключ строки → tr
+        rowHeight: 33,          // высоты строк уточняются по первой отрисовке
+        headerHeight: 37,
+        syncing: null,
+        pending: false,
+        rebuildTimer: null,
+        frame: null
+    };
+
+    const topSpacer = createSpacer();
+    const bottomSpacer = createSpacer();
+
     // === ИНИЦИАЛИЗАЦИЯ ===
     fetchCalibrationData();
-    startPolling();
+    if (serverMode) {
+        applyServerMode();
+    } else {
+        startEvents();
+    }
 
     // === ОБРАБОТЧИКИ СОБЫТИЙ ===
 
@@ -82,6 +120,21 @@ document.addEventListener('DOMContentLoaded', function () {
         } catch (e) { console.error(e); }
     });
 
+    // Автоматическая конвертация - замена всех пар в тексте
+    elements.convertAllToggle.addEventListener('change', async () => {
+        try {
+            const response = await fetch('/api/monitoring/options', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ convert_all: elements.convertAllToggle.checked })
+            });
+            const data = await response.json();
+            if (data.success) {
+                elements.convertAllToggle.checked = data.convert_all;
+            }
+        } catch (e) { console.error(e); }
+    });
+
     // Автоматическая конвертация - Стоп
     elements.stopBtn.addEventListener('click', async () => {
         try {
@@ -151,52 +204,118 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // === ФУНКЦИИ ===
 
+    // Серверные события (SSE): изменения приходят сразу, без опроса.
+    // Если EventSource недоступен или соединение закрыто — опрос /api/status.
+    function startEvents() {
+        if (!window.EventSource) {
+            startPolling();
+            return;
+        }
+
+        const source = new EventSource('/api/events');
+        const on = (name, handler) => source.addEventListener(name, e => handler(JSON.parse(e.data)));
+
+        on('status', applyStatus);
+        on('conversion', data => applyConversion(data.found, data.result, data.stats));
+        on('calibration', data => applyCalibrationMessage(data.message));
+        on('points_added', () => fetchCalibrationData());
+        on('points_removed', () => fetchCalibrationData());
+        on('points_reloaded', () => fetchCalibrationData());
+        on('location', updateRowLocation);
+
+        source.onopen = () => {
+            if (pollingInterval) {
+                clearInterval(pollingInterval);
+                pollingInterval = null;
+            }
+        };
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) startPolling();
+        };
+    }
+
+    // Калибровка у серверных воркеров только для чтения, событий нет —
+    // кнопки настольного режима отключаются, статус не опрашивается
+    function applyServerMode() {
+        [elements.startBtn, elements.stopBtn, elements.convertAllToggle,
+         elements.calibStartBtn, elements.calibStopBtn,
+         elements.deleteSelectedBtn, elements.saveBtn, elements.loadBtn,
+         elements.updateLocationsBtn].forEach(btn => {
+            btn.disabled = true;
+            btn.title = 'Недоступно в серверном режиме';
+        });
+        elements.statusText.textContent = 'Сервер';
+    }
+
     function startPolling() {
         if (pollingInterval) clearInterval(pollingInterval);
         pollingInterval = setInterval(async () => {
             try {
                 const response = await fetch('/api/status');
-                const data = await response.json();
+                applyStatus(await response.json());
+            } catch (e) {
+                // Ошибка опроса (сервер может быть недоступен при закрытии)
+            }
+        }, 1000);
+    }
 
-                // Обновляем статус
-                if (data.status !== (isMonitoring ? (isCalibrating ? 'calibrating' : 'working') : 'stopped')) {
-                    // Синхронизация статуса с сервером при первой загрузке или расхождениях
-                    // (Упрощенно обновляем UI по данным сервера)
-                    updateStatusUI(data.status);
-                }
+    function applyStatus(data) {
+        // Обновляем статус
+        if (data.status !== (isMonitoring ? (isCalibrating ? 'calibrating' : 'working') : 'stopped')) {
+            // Синхронизация статуса с сервером при первой загрузке или расхождениях
+            // (Упрощенно обновляем UI по данным сервера)
+            updateStatusUI(data.status);
+        }
 
-                // Обновляем поля авто-конвертации
-                if (data.last_found && elements.foundCoords.value !== data.last_found) {
-                    elements.foundCoords.value = data.last_found;
-                }
-                if (data.last_result && elements.resultCoords.value !== data.last_result) {
-                    elements.resultCoords.value = data.last_result;
-                    // Анимация обновления
-                    elements.resultCoords.parentElement.classList.add('pulse-animation');
-                    setTimeout(() => elements.resultCoords.parentElement.classList.remove('pulse-animation'), 1000);
-                }
+        // Обновляем поля авто-конвертации
+        elements.convertAllToggle.checked = !!data.convert_all_pairs;
+        applyConversion(data.last_found, data.last_result, data.last_stats);
 
-                // Обновляем статус калибровки
-                if (data.calibration_status) {
-                    const statusLabel = document.querySelector('.status-badge');
-                    if (data.calibration_message) {
-                        window.lastCalibrationMessage = data.calibration_message;
-                        // Форсируем обновление текста если уже в режиме калибровки
-                        if (isCalibrating) {
-                            elements.statusText.textContent = data.calibration_message;
-                        }
-                    }
-                }
+        // Обновляем статус калибровки
+        if (data.calibration_status) {
+            applyCalibrationMessage(data.calibration_message);
+        }
 
-                // Если количество точек изменилось на сервере, обновляем таблицу
-                if (data.points_count !== parseInt(elements.pointsCount.textContent)) {
-                    fetchCalibrationData();
-                }
+        // Если количество точек изменилось на сервере, обновляем таблицу
+        if (data.points_count !== parseInt(elements.pointsCount.textContent)) {
+            fetchCalibrationData();
+        }
+    }
 
-            } catch (e) {
-                // Ошибка опроса (сервер может быть недоступен при закрытии)
+    function applyConversion(found, result, stats) {
+        applyConversionStats(stats);
+        if (found && elements.foundCoords.value !== found) {
+            elements.foundCoords.value = found;
+        }
+        if (result && elements.resultCoords.value !== result) {
+            elements.resultCoords.value = result;
+            // Анимация обновления
+            elements.resultCoords.parentElement.classList.add('pulse-animation');
+            setTimeout(() => elements.resultCoords.parentElement.classList.remove('pulse-animation'), 1000);
+        }
+    }
+
+    // Статистика конвертации текста с несколькими парами координат
+    function applyConversionStats(stats) {
+        if (!stats) {
+            elements.conversionStats.hidden = true;
+            return;
+        }
+        const ms = (stats.seconds * 1000).toFixed(1);
+        const speed = stats.pts_per_s ? ` · ${stats.pts_per_s.toLocaleString('ru-RU')} пар/с` : '';
+        elements.conversionStats.textContent =
+            `Пар: ${stats.count.toLocaleString('ru-RU')} · символов: ${stats.chars.toLocaleString('ru-RU')} · ${ms} мс${speed}`;
+        elements.conversionStats.hidden = false;
+    }
+
+    function applyCalibrationMessage(message) {
+        if (message) {
+            window.lastCalibrationMessage = message;
+            // Форсируем обновление текста если уже в режиме калибровки
+            if (isCalibrating) {
+                elements.statusText.textContent = message;
             }
-        }, 1000);
+        }
     }
 
     function updateStatusUI(status) {
@@ -241,21 +360,119 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
-    async function fetchCalibrationData() {
-        try {
-            const response = await fetch('/api/calibration/data');
-            const data = await response.json();
-            renderTable(data);
-        } catch (e) { console.error(e); }
+    // === ТАБЛИЦА КАЛИБРОВКИ ===
+    // Клиент держит копию набора (id → точка) и версию снимка сервера: после
+    // изменений запрашивается только дельта (?since=версия), а если она
+    // недоступна — весь набор постранично. В DOM только видимые строки
+    // (виртуальная прокрутка), место остальных занимают строки-распорки.
+
+    function createSpacer() {
+        const tr = document.createElement('tr');
+        tr.className = 'spacer';
+        tr.innerHTML = '<td colspan="5"></td>';
+        return tr;
+    }
+
+    // Синхронизация с сервером. Вызовы во время синхронизации не теряются:
+    // они схлопываются в один повтор после её окончания.
+    function fetchCalibrationData() {
+        if (calib.syncing) {
+            calib.pending = true;
+            return calib.syncing;
+        }
+        calib.syncing = (async () => {
+            try {
+                do {
+                    calib.pending = false;
+                    await syncCalibration();
+                } while (calib.pending);
+            } catch (e) {
+                console.error(e);
+            } finally {
+                calib.syncing = null;
+            }
+        })();
+        return calib.syncing;
+    }
+
+    async function syncCalibration() {
+        if (calib.version !== null) {
+            const response = await fetch(`/api/calibration/data?since=${calib.version}`);
+            const delta = await response.json();
+            if (delta.success && !delta.full) {
+                if (delta.version !== calib.version) {
+                    delta.removed.forEach(id => {
+                        calib.points.delete(id);
+                        calib.selected.delete(id);
+                    });
+                    delta.points.forEach(point => calib.points.set(point.id, point));
+                    calib.version = delta.version;
+                    rebuildRows();
+                }
+                return;
+            }
+        }
+        await loadAllPages();
+    }
+
+    // Полная загрузка: все страницы одной версии; если она успела
+    // устареть (409) — загрузка начинается заново с текущей
+    async function loadAllPages() {
+        for (;;) {
+            const points = new Map();
+            let version = null;
+            let offset = 0;
+            while (offset !== null) {
+                let url = `/api/calibration/data?offset=${offset}&limit=${CALIB_PAGE_SIZE}`;
+                if (version !== null) url += `&version=${version}`;
+                const response = await fetch(url);
+                if (response.status === 409) break;
+                const page = await response.json();
+                version = page.version;
+                page.points.forEach(point => points.set(point.id, point));
+                offset = page.next;
+            }
+            if (offset !== null) continue;
+
+            calib.points = points;
+            calib.version = version;
+            calib.selected.forEach(id => {
+                if (!points.has(id)) calib.selected.delete(id);
+            });
+            rebuildRows();
+            return;
+        }
     }
 
-    function renderTable(data) {
-        elements.pointsCount.textContent = data.length;
-        elements.calibTableBody.innerHTML = '';
+    // Местоположение точки определено — правим копию, группы пересобираются с задержкой
+    function updateRowLocation(point) {
+        const current = calib.points.get(point.id);
+        if (!current || current.location === point.location) return;
+        calib.points.set(point.id, Object.assign({}, current, { location: point.location }));
+        clearTimeout(calib.rebuildTimer);
+        calib.rebuildTimer = setTimeout(rebuildRows, CALIB_REBUILD_DELAY);
+    }
 
-        // Группировка
+    // Хелперы для координат
+    const getLat = str => {
+        const parts = str.split(',');
+        return parts.length > 0 ? parseFloat(parts[0]) : 0;
+    };
+    const getLon = str => {
+        const parts = str.split(',');
+        return parts.length > 1 ? parseFloat(parts[1]) : 0;
+    };
+
+    const createYandexLink = (coordsStr) => {
+        const lat = getLat(coordsStr);
+        const lon = getLon(coordsStr);
+        return `https://yandex.ru/maps?l=sat%2Cskl&ll=${lon}%2C${lat}&mode=whatshere&whatshere%5Bpoint%5D=${lon}%2C${lat}&whatshere%5Bzoom%5D=19&z=19`;
+    };
+
+    // Группировка и сортировка точек (только данные, без DOM)
+    function groupPoints() {
         const groups = {};
-        data.forEach(item => {
+        calib.points.forEach(item => {
             const loc = item.location || 'Неизвестно';
             if (!groups[loc]) groups[loc] = [];
             groups[loc].push(item);
@@ -267,7 +484,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
         Object.keys(groups).forEach(city => {
             if (groups[city].length >= 2 && city !== 'Неизвестно' && city !== 'Город не найден') {
-                groupedCities.push({ city: city, items: groups[city] });
+                groupedCities.push({ key: 'city:' + city, city: city, items: groups[city] });
             } else {
                 singleItems.push(...groups[city]);
             }
@@ -284,114 +501,199 @@ document.addEventListener('DOMContentLoaded', function () {
                 const locB = b.location || 'яяя';
                 return locA.localeCompare(locB);
             });
-            groupedCities.push({ city: 'Остальные', items: singleItems, isOthers: true });
+            groupedCities.push({ key: 'others', city: 'Остальные', items: singleItems, isOthers: true });
         }
 
-        // Хелперы для координат
-        const getLat = str => {
-            const parts = str.split(',');
-            return parts.length > 0 ? parseFloat(parts[0]) : 0;
-        };
-        const getLon = str => {
-            const parts = str.split(',');
-            return parts.length > 1 ? parseFloat(parts[1]) : 0;
-        };
-
         // Внутри группы сортировка по широте (по возрастанию)
         groupedCities.forEach(group => {
             if (!group.isOthers) {
                 group.items.sort((a, b) => getLat(a.yandex) - getLat(b.yandex));
             }
         });
+        return groupedCities;
+    }
 
-        const createYandexLink = (coordsStr) => {
-            const lat = getLat(coordsStr);
-            const lon = getLon(coordsStr);
-            return `https://yandex.ru/maps?l=sat%2Cskl&ll=${lon}%2C${lat}&mode=whatshere&whatshere%5Bpoint%5D=${lon}%2C${lat}&whatshere%5Bzoom%5D=19&z=19`;
-        };
-
-        let visualIndex = 1;
+    function rebuildRows() {
+        clearTimeout(calib.rebuildTimer);
+        elements.pointsCount.textContent = calib.points.size;
+        calib.groups = groupPoints();
+        flattenRows();
+    }
 
-        // Рендер групп
-        groupedCities.forEach(group => {
-            // Уникальный ID для группы
-            const groupId = 'group-' + Math.random().toString(36).substr(2, 9);
-
-            // Заголовок группы
-            const headerTr = document.createElement('tr');
-            headerTr.className = 'group-header';
-            headerTr.dataset.groupId = groupId;
-            // Добавляем стрелочку для индикации
-            headerTr.innerHTML = `<td colspan="5">
-                <span style="display: inline-block; transition: transform 0.2s; margin-right: 8px;">▼</span>
-                ${group.city} (${group.items.length})
-            </td>`;
+    // Плоский список строк с учётом свёрнутых групп; номер точки сквозной
+    function flattenRows() {
+        const rows = [];
+        let index = 1;
+        calib.groups.forEach(group => {
+            const collapsed = calib.collapsed.has(group.key);
+            rows.push({ type: 'group', key: 'g:' + group.key, group: group, collapsed: collapsed });
+            group.items.forEach(point => {
+                if (!collapsed) rows.push({ type: 'point', key: 'p:' + point.id, point: point, index: index });
+                index++;
+            });
+        });
+        calib.rows = rows;
+        layoutRows();
+    }
 
-            // Обработчик сворачивания
-            headerTr.addEventListener('click', () => {
-                const rows = document.querySelectorAll(`.group-row-${groupId}`);
-                const isHidden = rows[0].classList.contains('group-hidden');
+    function layoutRows() {
+        const offsets = new Array(calib.rows.length + 1);
+        let top = 0;
+        calib.rows.forEach((row, i) => {
+            offsets[i] = top;
+            top += row.type === 'group' ? calib.headerHeight : calib.rowHeight;
+        });
+        offsets[calib.rows.length] = top;
+        calib.offsets = offsets;
+        renderWindow();
+    }
 
-                rows.forEach(r => r.classList.toggle('group-hidden'));
+    function scheduleRender() {
+        if (!calib.frame) calib.frame = requestAnimationFrame(renderWindow);
+    }
 
-                // Вращаем стрелочку
-                const arrow = headerTr.querySelector('span');
-                arrow.style.transform = isHidden ? 'rotate(0deg)' : 'rotate(-90deg)';
-            });
+    // Первая строка, нижняя граница которой ниже y
+    function rowAt(y) {
+        let lo = 0;
+        let hi = calib.rows.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (calib.offsets[mid + 1] <= y) lo = mid + 1;
+            else hi = mid;
+        }
+        return lo;
+    }
 
-            elements.calibTableBody.appendChild(headerTr);
+    // Отрисовка видимого окна: имеющиеся tr переиспользуются и
+    // исправляются только при изменении их данных
+    function renderWindow() {
+        if (calib.frame) {
+            cancelAnimationFrame(calib.frame);
+            calib.frame = null;
+        }
+        const head = elements.calibTableBody.parentElement.tHead;
+        const top = calibContainer.scrollTop - (head ? head.offsetHeight : 0);
+        const start = Math.max(0, rowAt(top) - CALIB_OVERSCAN);
+        const end = Math.min(calib.rows.length, rowAt(top + calibContainer.clientHeight) + 1 + CALIB_OVERSCAN);
+
+        const visible = [];
+        const rendered = new Map();
+        for (let i = start; i < end; i++) {
+            const row = calib.rows[i];
+            const tr = calib.rendered.get(row.key) || createRow(row);
+            patchRow(tr, row);
+            rendered.set(row.key, tr);
+            visible.push(tr);
+        }
+        calib.rendered = rendered;
 
-            // Элементы группы
-            group.items.forEach(row => renderRow(row, groupId));
-        });
+        topSpacer.firstChild.style.height = calib.offsets[start] + 'px';
+        bottomSpacer.firstChild.style.height =
+            (calib.offsets[calib.rows.length] - calib.offsets[end]) + 'px';
+        elements.calibTableBody.replaceChildren(topSpacer, ...visible, bottomSpacer);
+        measureRows();
+    }
 
-        // function renderRow(row, groupId = '') - теперь принимает ID группы
-        function renderRow(row, groupId) {
-            const tr = document.createElement('tr');
-            if (groupId) {
-                tr.classList.add(`group-row-${groupId}`); // Связываем с заголовком
+    // Реальные высоты строк (после первой отрисовки или смены стилей)
+    function measureRows() {
+        let changed = false;
+        for (const tr of calib.rendered.values()) {
+            const height = tr.getBoundingClientRect().height;
+            if (!height) break; // таблица скрыта — измерим при показе
+            const field = tr.classList.contains('group-header') ? 'headerHeight' : 'rowHeight';
+            if (Math.abs(calib[field] - height) > 0.5) {
+                calib[field] = height;
+                changed = true;
             }
+        }
+        if (changed) layoutRows();
+    }
 
-            const location = row.location || 'Загрузка...';
-            const link = createYandexLink(row.yandex);
-
-            tr.innerHTML = `
-                <td>${visualIndex++}</td>
-                <td>${row.google}</td>
-                <td>
-                    <a href="${link}" target="_blank" class="coord-link" style="color: inherit; border-bottom: 1px dashed rgba(255,255,255,0.3); text-decoration: none;">
-                        ${row.yandex}
-                    </a>
-                </td>
-                <td class="location-cell">${location}</td>
-                <td>
-                    <button class="btn-delete-row" type="button" title="Удалить">
-                        <svg viewBox="0 0 24 24" fill="none"><path d="M6 19c0 1.1.9 2 2 2h8c1.1 0 2-.9 2-2V7H6v12zM19 4h-3.5l-1-1h-5l-1 1H5v2h14V4z" fill="currentColor"/></svg>
-                    </button>
-                </td>
-            `;
-
-            // Клик по ряду для выделения
-            tr.addEventListener('click', (e) => {
-                // Игнорируем клик, если он был по ссылке или кнопке
-                if (!e.target.closest('button') && !e.target.closest('a')) {
-                    tr.classList.toggle('selected');
-                }
-            });
-
-            // Клик по кнопке удаления
-            const delBtn = tr.querySelector('.btn-delete-row');
-            delBtn.addEventListener('click', (e) => {
-                e.stopPropagation(); // Чтобы не выделять ряд при удалении
-                deletePointByRow(tr);
-            });
+    function createRow(row) {
+        const tr = document.createElement('tr');
+        tr.dataset.key = row.key;
+        if (row.type === 'group') {
+            tr.className = 'group-header';
+            // Стрелочка для индикации сворачивания
+            tr.innerHTML = `<td colspan="5">
+                <span style="display: inline-block; transition: transform 0.2s; margin-right: 8px;">▼</span>
+                <span class="group-title"></span>
+            </td>`;
+        } else {
+            tr.dataset.id = row.point.id;
+        }
+        return tr;
+    }
 
-            elements.calibTableBody.appendChild(tr);
+    function patchRow(tr, row) {
+        if (row.type === 'group') {
+            const title = `${row.group.city} (${row.group.items.length})`;
+            const titleEl = tr.querySelector('.group-title');
+            if (titleEl.textContent !== title) titleEl.textContent = title;
+            tr.firstElementChild.firstElementChild.style.transform =
+                row.collapsed ? 'rotate(-90deg)' : 'rotate(0deg)';
+            return;
         }
+
+        tr.classList.toggle('selected', calib.selected.has(row.point.id));
+        if (tr._point === row.point && tr._index === row.index) return;
+        tr._point = row.point;
+        tr._index = row.index;
+
+        const point = row.point;
+        const location = point.location || 'Загрузка...';
+        const link = createYandexLink(point.yandex);
+
+        tr.innerHTML = `
+            <td>${row.index}</td>
+            <td title="${point.google}">${point.google}</td>
+            <td title="${point.yandex}">
+                <a href="${link}" target="_blank" class="coord-link" style="color: inherit; border-bottom: 1px dashed rgba(255,255,255,0.3); text-decoration: none;">
+                    ${point.yandex}
+                </a>
+            </td>
+            <td class="location-cell" title="${location}">${location}</td>
+            <td>
+                <button class="btn-delete-row" type="button" title="Удалить">
+                    <svg viewBox="0 0 24 24" fill="none"><path d="M6 19c0 1.1.9 2 2 2h8c1.1 0 2-.9 2-2V7H6v12zM19 4h-3.5l-1-1h-5l-1 1H5v2h14V4z" fill="currentColor"/></svg>
+                </button>
+            </td>
+        `;
     }
 
+    // Один обработчик на всю таблицу: сворачивание групп, выделение, удаление
+    elements.calibTableBody.addEventListener('click', (e) => {
+        const tr = e.target.closest('tr');
+        if (!tr || !tr.dataset.key) return;
+
+        if (tr.classList.contains('group-header')) {
+            const key = tr.dataset.key.slice(2);
+            if (!calib.collapsed.delete(key)) calib.collapsed.add(key);
+            flattenRows();
+            return;
+        }
+
+        // Клик по кнопке удаления
+        if (e.target.closest('.btn-delete-row')) {
+            deletePointByRow(tr);
+            return;
+        }
+
+        // Клик по ряду для выделения (игнорируем ссылки и кнопки)
+        if (!e.target.closest('button') && !e.target.closest('a')) {
+            const id = tr.dataset.id;
+            if (!calib.selected.delete(id)) calib.selected.add(id);
+            tr.classList.toggle('selected', calib.selected.has(id));
+        }
+    });
+
+    calibContainer.addEventListener('scroll', scheduleRender, { passive: true });
+    // Секция разворачивается и меняет размер — окно и высоты строк пересчитываются
+    if (window.ResizeObserver) new ResizeObserver(scheduleRender).observe(calibContainer);
+
     // Удаление конкретной строки
     async function deletePointByRow(tr) {
+        calib.selected.add(tr.dataset.id);
         tr.classList.add('selected');
         await deleteSelectedPoints();
     }
@@ -403,29 +705,26 @@ document.addEventListener('DOMContentLoaded', function () {
     };
 
     async function deleteSelectedPoints() {
-        const selectedRows = document.querySelectorAll('#calibTableBody tr.selected');
-        if (selectedRows.length === 0) {
+        const pointsToDelete = [...calib.selected].filter(id => calib.points.has(id));
+        if (pointsToDelete.length === 0) {
             showToast('Выберите точки для удаления', 'warning');
             return;
         }
 
-        const pointsToDelete = [];
-        selectedRows.forEach(row => {
-            pointsToDelete.push({
-                google: row.children[1].textContent.trim(),
-                yandex: row.children[2].textContent.trim()
-            });
-        });
-
+        // Удаление по id точки (индекс на сервере — O(1) на точку)
         try {
             const response = await fetch('/api/calibration/data', {
                 method: 'DELETE',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(pointsToDelete)
             });
-            if ((await response.json()).success) {
+            const res = await response.json();
+            if (res.success) {
+                pointsToDelete.forEach(id => calib.selected.delete(id));
                 fetchCalibrationData();
-                showToast(`Удалено точек: ${pointsToDelete.length}`, 'success');
+                showToast(`Удалено точек: ${res.count}`, 'success');
+            } else {
+                showToast(res.error || 'Ошибка удаления', 'error');
             }
         } catch (e) {
             showToast('Ошибка удаления', 'error');
@@ -495,7 +794,8 @@ document.addEventListener('DOMContentLoaded', function () {
                 const res = await response.json();
 
                 if (res.success) {
-                    showToast(`Импортировано точек: ${res.count}`, 'success');
+                    const skipped = res.duplicates ? `, пропущено дубликатов: ${res.duplicates}` : '';
+                    showToast(`Импортировано точек: ${res.count}${skipped}`, 'success');
                     fetchCalibrationData();
                 } else {
                     showToast('Ошибка импорта: ' + res.error, 'error');
@@ -515,11 +815,14 @@ document.addEventListener('DOMContentLoaded', function () {
             const data = await response.json();
             if (data.success) {
                 showToast('Обновление местоположений запущено...', 'info');
-                // Периодически обновляем таблицу чтобы видеть прогресс
-                const interval = setInterval(() => {
-                    fetchCalibrationData();
-                }, 2000);
-                setTimeout(() => clearInterval(interval), 60000);
+                fetchCalibrationData();
+                // Результаты приходят событиями 'location'; без SSE — периодически обновляем таблицу
+                if (pollingInterval) {
+                    const interval = setInterval(() => {
+                        fetchCalibrationData();
+                    }, 2000);
+                    setTimeout(() => clearInterval(interval), 60000);
+                }
             }
         } catch (e) {
             showToast('Ошибка сети', 'error');
@@ -0,0 +1,94 @@
+"""
+Точка входа WSGI для серверного режима: конвертер для нескольких
+пользователей в локальной сети вместо отладочного сервера Werkzeug.
+
+    # Linux/macOS: несколько процессов-воркеров, калибровка загружается
+    # один раз до fork и доступна воркерам только для чтения
+    gunicorn -w 4 -k gthread --threads 8 --preload -b 0.0.0.0:5002 --chdir src wsgi:app
+
+    # Windows (и везде): один процесс, пул потоков
+    cd src && waitress-serve --threads 16 --listen 0.0.0.0:5002 --call wsgi:create_app
+
+    # Без дополнительных пакетов: waitress, если установлен, иначе Werkzeug с потоками
+    python src/wsgi.py --host 0.0.0.0 --port 5002
+
+В серверном режиме нет мониторинга буфера обмена и фонового геокодинга,
+изменение калибровки через API отключено — точки добавляются в настольном
+приложении, после чего сервер перезапускается. GOOTOYA_PREBUILD=grid,fit
+заранее строит ускоренные конвертеры пакетного режима (общие для воркеров).
+"""
+import argparse
+import os
+import sys
+
+# До импорта app: флаг читается при загрузке модуля
+os.environ['GOOTOYA_SERVER'] = '1'
+
+import app as desktop_app  # noqa: E402
+from app import FAST_CONVERTERS, app, init_app  # noqa: E402
+from gootoya.core import HAS_NUMPY  # noqa: E402
+
+# Ускоренные конвертеры, которые строятся при запуске (через запятую: grid,fit)
+PREBUILD = [mode.strip() for mode in os.environ.get('GOOTOYA_PREBUILD', '').split(',')
+            if mode.strip()]
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5002
+DEFAULT_THREADS = 16
+
+
+def warm_up():
+    """
+    Загружает калибровку и строит модель (прямую и обратную), их массивы,
+    индексы и конвертеры PREBUILD в текущем процессе. С gunicorn --preload
+    это происходит до fork: воркеры получают готовые структуры в общих
+    страницах памяти и не тратят время на построение при первых запросах.
+    """
+    init_app()
+    model = desktop_app.state.get_model()
+    # Обратная модель (Yandex → Google) — со своим индексом по точкам Yandex
+    for directed in (model, model.inverse()):
+        if HAS_NUMPY:
+            directed.as_numpy()
+        directed.get_index()
+    for mode in PREBUILD:
+        if mode not in FAST_CONVERTERS:
+            raise ValueError(f"GOOTOYA_PREBUILD: неизвестный режим {mode!r}")
+        desktop_app.state.get_converter(mode, model)
+    return model
+
+
+def create_app():
+    """Фабрика приложения (waitress-serve --call wsgi:create_app); модель уже построена."""
+    return app
+
+
+warm_up()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Серверный режим конвертера")
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help="адрес (0.0.0.0 — доступ из локальной сети)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help="потоков обработки запросов")
+    args = parser.parse_args(argv)
+
+    model = desktop_app.state.get_model()
+    print(f"Серверный режим: http://{args.host}:{args.port}, "
+          f"калибровочных точек {len(model)}, потоков {args.threads}")
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress не установлен (pip install -r config/requirements-server.txt), "
+              "используется сервер Werkzeug с потоками", file=sys.stderr)
+        from werkzeug.serving import run_simple
+        run_simple(args.host, args.port, app, threaded=True)
+        return 0
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())